@@ -1,15 +1,11 @@
 import streamlit as st
 from dotenv import load_dotenv
-import os
-import groq
 from youtube_transcript_api import YouTubeTranscriptApi
+from utils.llm_gateway import llm_gateway
+from utils.youtube import fn_extract_video_id
 
 # Load environment variables
 load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-
-# Initialize Groq client
-groq_client = groq.Client(api_key=groq_api_key)
 
 # Prompt template
 SUMMARY_PROMPT = """
@@ -22,11 +18,8 @@ bullet form within 250 words. Please provide the summary of the text given here:
 def extract_transcript_details(youtube_video_url: str) -> str:
     try:
         # Extract video ID
-        if "v=" in youtube_video_url:
-            video_id = youtube_video_url.split("v=")[1].split("&")[0]
-        elif "youtu.be/" in youtube_video_url:
-            video_id = youtube_video_url.split("youtu.be/")[1].split("?")[0]
-        else:
+        video_id = fn_extract_video_id(youtube_video_url)
+        if video_id is None:
             raise ValueError("Invalid YouTube URL format")
 
         # Initialize API instance
@@ -45,7 +38,7 @@ def fn_generate_summary(transcript_text: str, base_prompt: str) -> str:
     """
     Generates a summary using the Groq API.
     """
-    response = groq_client.chat.completions.create(
+    response = llm_gateway.complete(
         model="llama-3.1-8b-instant",
         messages=[
             {"role": "system", "content": base_prompt},
@@ -65,12 +58,7 @@ youtube_link = st.text_input("Enter YouTube Video Link:")
 
 if youtube_link:
     # Extract and show thumbnail
-    if "v=" in youtube_link:
-        video_id = youtube_link.split("v=")[1].split("&")[0]
-    elif "youtu.be/" in youtube_link:
-        video_id = youtube_link.split("youtu.be/")[1].split("?")[0]
-    else:
-        video_id = None
+    video_id = fn_extract_video_id(youtube_link)
 
     if video_id:
         st.image(f"http://img.youtube.com/vi/{video_id}/0.jpg", use_container_width=True)
@@ -0,0 +1,114 @@
+#bench_audio_prep.py
+"""
+Compares the legacy 44.1 kHz stereo extraction with the 16 kHz mono audio
+preparation stage, including the load Whisper performs afterwards.
+
+Run from the backend directory (requires ffmpeg):
+
+    python -m benchmarks.bench_audio_prep --minutes 10 --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from utils.processing import AUDIO_OUTPUT_ARGS, WHISPER_SAMPLE_RATE, fn_load_audio_array
+
+LEGACY_OUTPUT_ARGS = ["-vn", "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "2"]
+
+
+def fn_make_source(path, seconds):
+    """
+    Writes a synthetic stereo AAC file of the given length to `path`.
+    """
+    subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-y",
+            "-f", "lavfi", "-i", f"anoisesrc=color=pink:sample_rate=44100:duration={seconds}",
+            "-ac", "2", "-c:a", "aac", "-b:a", "128k",
+            path,
+        ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+    )
+
+
+def fn_legacy_load(wav_path):
+    """
+    Mirrors whisper.audio.load_audio: decode and resample the WAV with ffmpeg.
+    """
+    output = subprocess.run(
+        ["ffmpeg", "-nostdin", "-i", wav_path, "-f", "s16le", "-ac", "1", "-ar", str(WHISPER_SAMPLE_RATE), "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+    ).stdout
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+def fn_run_variant(source, wav_path, output_args, load):
+    start = time.perf_counter()
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-y", "-i", source, *output_args, wav_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+    )
+    extracted = time.perf_counter()
+    samples = load(wav_path)
+    loaded = time.perf_counter()
+    return {
+        "extract_seconds": extracted - start,
+        "load_seconds": loaded - extracted,
+        "total_seconds": loaded - start,
+        "wav_bytes": os.path.getsize(wav_path),
+        "samples": int(samples.shape[0]),
+    }
+
+
+def fn_best_of(runs):
+    best = min(runs, key=lambda r: r["total_seconds"])
+    return dict(best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the synthetic audio")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the best one is reported")
+    parser.add_argument("--output", help="Optional path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    seconds = args.minutes * 60
+    per_hour = 3600 / seconds
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, "source.m4a")
+        fn_make_source(source, seconds)
+
+        results = {}
+        for name, output_args, load in (
+            ("legacy_44k_stereo", LEGACY_OUTPUT_ARGS, fn_legacy_load),
+            ("whisper_16k_mono", AUDIO_OUTPUT_ARGS, fn_load_audio_array),
+        ):
+            wav_path = os.path.join(work_dir, f"{name}.wav")
+            runs = [fn_run_variant(source, wav_path, output_args, load) for _ in range(args.repeat)]
+            best = fn_best_of(runs)
+            best["wav_mb_per_hour"] = best["wav_bytes"] * per_hour / 1e6
+            best["seconds_per_hour"] = best["total_seconds"] * per_hour
+            results[name] = best
+
+    legacy, current = results["legacy_44k_stereo"], results["whisper_16k_mono"]
+    report = {
+        "audio_minutes": args.minutes,
+        "variants": results,
+        "disk_saving_ratio": legacy["wav_bytes"] / current["wav_bytes"],
+        "wall_time_saving_seconds_per_hour": legacy["seconds_per_hour"] - current["seconds_per_hour"],
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#bench_fingerprint.py
+"""
+Measures the audio fingerprint index on a synthetic corpus.
+
+Indexes `--corpus` synthetic speech-like recordings, then looks up
+re-encoded copies (gain change, low-pass filter, added noise, a few seconds
+trimmed at both ends) and recordings that were never indexed. Every
+`--silent-every`-th recording, indexed or unseen, is mostly digital silence
+(`--silent-share`), like a lecture with long pauses or a muted screencast.
+Reports the fingerprint and lookup times, the share of copies found (recall)
+and the share of unseen recordings wrongly matched (false-positive rate,
+overall and for the silence-heavy ones) for each `--max-ber` threshold.
+Run from the backend directory:
+
+    python -m benchmarks.bench_fingerprint --corpus 200 --seconds 120
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.fingerprint import FingerprintIndex, fn_audio_fingerprint
+
+SAMPLE_RATE = 16000
+
+
+def fn_synthetic_speech(seconds, rng):
+    """
+    Returns speech-like audio: a few drifting formant tones gated at a syllable rate, over faint noise.
+    """
+    n = int(seconds * SAMPLE_RATE)
+    segment = SAMPLE_RATE // 4
+    n_segments = n // segment + 1
+    audio = np.zeros(n, dtype=np.float64)
+    for low, high in ((250, 900), (900, 2200), (2200, 3500)):
+        frequency = np.repeat(rng.uniform(low, high, n_segments), segment)[:n]
+        audio += np.sin(2 * np.pi * np.cumsum(frequency) / SAMPLE_RATE) * rng.uniform(0.2, 1.0)
+    syllables = np.repeat(rng.uniform(0, 1, n_segments) > 0.3, segment)[:n]
+    envelope = np.convolve(syllables.astype(np.float64), np.hanning(800) / 400, mode="same")
+    audio = audio * envelope + rng.normal(0, 0.01, n)
+    return (audio / np.abs(audio).max() * 0.5).astype(np.float32)
+
+
+def fn_silence_heavy(samples, rng, silent_share):
+    """
+    Returns a copy of `samples` with about `silent_share` of its seconds replaced by digital silence.
+    """
+    seconds = len(samples) // SAMPLE_RATE + 1
+    silent = np.repeat(rng.uniform(0, 1, seconds) < silent_share, SAMPLE_RATE)[:len(samples)]
+    return np.where(silent, 0, samples).astype(np.float32)
+
+
+def fn_reencode(samples, rng, max_trim_seconds):
+    """
+    Imitates a re-encoded, trimmed re-upload of `samples`.
+    """
+    trim_start = int(rng.uniform(0, max_trim_seconds) * SAMPLE_RATE)
+    trim_end = int(rng.uniform(0, max_trim_seconds) * SAMPLE_RATE)
+    copy = samples[trim_start:len(samples) - trim_end].astype(np.float64) * rng.uniform(0.5, 1.5)
+    # Gentle low-pass, roughly what a low-bitrate codec does to the top of the spectrum.
+    filtered = np.convolve(copy, [0.25, 0.5, 0.25], mode="same")
+    noise = rng.normal(0, np.std(filtered) / 10 ** (25 / 20), len(filtered))
+    # Codecs keep digital silence silent.
+    return np.where(filtered != 0, filtered + noise, 0).astype(np.float32)
+
+
+def fn_percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=100, help="Recordings in the index")
+    parser.add_argument("--queries", type=int, default=50, help="Re-encoded copies and unseen recordings looked up, each")
+    parser.add_argument("--seconds", type=float, default=120, help="Length of each recording")
+    parser.add_argument("--max-trim-seconds", type=float, default=3)
+    parser.add_argument("--silent-every", type=int, default=4, help="Make every n-th recording silence-heavy (0: none)")
+    parser.add_argument("--silent-share", type=float, default=0.8, help="Share of silence in silence-heavy recordings")
+    parser.add_argument("--max-ber", nargs="+", type=float, default=[0.15, 0.2, 0.25, 0.3, 0.35])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Index with the loosest threshold; each lookup's bit error rate is then checked against every threshold.
+        index = FingerprintIndex(db_path=os.path.join(tmp, "fingerprints.sqlite3"), max_ber=max(args.max_ber))
+
+        def fn_recording(i):
+            samples = fn_synthetic_speech(args.seconds, rng)
+            if args.silent_every and i % args.silent_every == 0:
+                return fn_silence_heavy(samples, rng, args.silent_share), True
+            return samples, False
+
+        corpus, fingerprint_seconds = [], []
+        for i in range(args.corpus):
+            samples, _ = fn_recording(i)
+            start = time.perf_counter()
+            hashes, voiced = fn_audio_fingerprint(samples)
+            fingerprint_seconds.append(time.perf_counter() - start)
+            index.add(hashes, voiced, f"recording-{i}", "base")
+            corpus.append(samples)
+
+        lookups, copies, unseen, unseen_silent = [], [], [], []
+        for i in range(args.queries):
+            original = int(rng.integers(len(corpus)))
+            samples, silence_heavy = fn_recording(i)
+            for expected, samples, results in (
+                (f"recording-{original}", fn_reencode(corpus[original], rng, args.max_trim_seconds), copies),
+                (None, samples, unseen_silent if silence_heavy else unseen),
+            ):
+                hashes, voiced = fn_audio_fingerprint(samples)
+                start = time.perf_counter()
+                match = index.lookup(hashes, voiced, "base")
+                lookups.append(time.perf_counter() - start)
+                results.append((expected, match))
+
+    report = {
+        "corpus": args.corpus,
+        "seconds_per_recording": args.seconds,
+        "fingerprint_ms_per_audio_minute": 1000 * float(np.mean(fingerprint_seconds)) / (args.seconds / 60),
+        "lookup_p50_ms": 1000 * fn_percentile(lookups, 50),
+        "lookup_p95_ms": 1000 * fn_percentile(lookups, 95),
+        "thresholds": [],
+    }
+    for max_ber in sorted(args.max_ber):
+        found = sum(
+            1 for expected, match in copies
+            if match and match["bit_error_rate"] <= max_ber and match["cache_key"] == expected
+        )
+        false_positives = [
+            sum(1 for _, match in results if match and match["bit_error_rate"] <= max_ber)
+            for results in (unseen, unseen_silent)
+        ]
+        report["thresholds"].append({
+            "max_ber": max_ber,
+            "recall": found / len(copies),
+            "false_positive_rate": sum(false_positives) / (len(unseen) + len(unseen_silent)),
+            "silence_heavy_false_positive_rate": false_positives[1] / len(unseen_silent) if unseen_silent else None,
+        })
+    report["copy_ber_p50"] = fn_percentile([m["bit_error_rate"] for _, m in copies if m], 50)
+    report["copy_ber_max"] = max((m["bit_error_rate"] for _, m in copies if m), default=None)
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
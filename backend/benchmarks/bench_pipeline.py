@@ -0,0 +1,321 @@
+#bench_pipeline.py
+"""
+Offline end-to-end benchmark of the FastAPI app.
+
+Runs the app under uvicorn in this process with a fake Groq server, a stub
+yt-dlp extractor that serves synthetic audio, and a stub Whisper model (or the
+real "tiny" model with --whisper tiny), then drives /upload_file/,
+/youtube_link/, /youtube_link/stream and /verify_answers at the requested
+concurrency.
+
+Reports p50/p95/p99 latency (plus time to first question for the streaming
+endpoint), requests/sec and peak RSS of the worker, and
+writes the results as JSON so runs can be compared between commits.
+Requires ffmpeg for the upload and YouTube paths. Run from the backend directory:
+
+    python -m benchmarks.bench_pipeline --requests 60 --concurrency 8 --audio-seconds 30 120
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<older-commit>.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def fn_synthetic_wav(seconds, seed=0):
+    """
+    Returns the bytes of a 16 kHz mono WAV with speech-like bursts of tone and noise.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 0.7 * t) > -0.3).astype(np.float32)
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    pcm = (np.clip(signal * envelope, -1, 1) * 32767).astype(np.int16)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def fn_make_unique(wav_bytes, n):
+    """
+    Changes a few samples so every request has a different content hash (and misses the caches).
+    """
+    data = bytearray(wav_bytes)
+    data[44:52] = n.to_bytes(8, "little")
+    return bytes(data)
+
+
+class StubWhisperModel:
+    """
+    Pretends to transcribe at a fixed real-time factor.
+    """
+
+    def __init__(self, real_time_factor):
+        self.real_time_factor = real_time_factor
+
+    def transcribe(self, audio, **kwargs):
+        seconds = len(audio) / SAMPLE_RATE
+        time.sleep(seconds * self.real_time_factor)
+        words = max(1, int(seconds * 2.5))
+        segments = [
+            {"start": float(i), "end": float(i + 1), "text": f" Sentence {i} of the synthetic lecture."}
+            for i in range(0, int(seconds), 5)
+        ]
+        return {
+            "text": " ".join(["word"] * words) + ".",
+            "language": "en",
+            "segments": segments,
+        }
+
+
+class StubYoutubeDL:
+    """
+    Replacement for yt_dlp.YoutubeDL that "downloads" synthetic audio.
+    The length comes from the `len` query parameter of the URL.
+    """
+
+    fixtures = {}
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True):
+        query = parse_qs(urlparse(url).query)
+        seconds = float(query.get("len", ["30"])[0])
+        video_id = query.get("v", ["bench"])[0]
+        path = self.opts["outtmpl"] % {"ext": "wav", "id": video_id}
+        with open(path, "wb") as f:
+            f.write(fn_make_unique(self.fixtures[seconds], hash(video_id) & 0xFFFFFFFF))
+        return {"id": video_id, "ext": "wav", "requested_downloads": [{"filepath": path}]}
+
+    def prepare_filename(self, info):
+        return self.opts["outtmpl"] % {"ext": info["ext"], "id": info["id"]}
+
+
+def fn_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fn_percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def fn_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def fn_start_app(args, groq_url, cache_dir):
+    """
+    Configures the backend for an offline run, installs the stubs and starts uvicorn.
+    """
+    os.environ.update({
+        "GROQ_BASE_URL": groq_url,
+        "GROQ_API_KEY": "fake-key",
+        "CACHE_DB_PATH": os.path.join(cache_dir, "cache.sqlite3"),
+        "YOUTUBE_CAPTIONS_ENABLED": "0",
+        "WHISPER_WARMUP_ON_STARTUP": "0",
+        "WHISPER_PROCESS_WORKERS": "0",
+        "WHISPER_MODEL": "tiny",
+    })
+
+    import uvicorn
+    import main
+    import controllers.quiz_generation_controller as controller
+    from utils.whisper_registry import whisper_registry
+
+    controller.yt_dlp.YoutubeDL = StubYoutubeDL
+    if args.whisper == "stub":
+        stub_model = StubWhisperModel(args.whisper_rtf)
+        whisper_registry.get = lambda size=None: stub_model
+
+    port = fn_free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def fn_drive(base_url, args, fixtures):
+    import httpx
+
+    latencies = {name: [] for name in args.endpoints}
+    errors = {name: 0 for name in args.endpoints}
+    first_question = {name: [] for name in args.endpoints}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(client, n):
+        endpoint = args.endpoints[n % len(args.endpoints)]
+        seconds = args.audio_seconds[n % len(args.audio_seconds)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if endpoint == "upload_file":
+                    files = {"file": (f"bench{n}.wav", fn_make_unique(fixtures[seconds], n), "audio/wav")}
+                    response = await client.post("/upload_file/", files=files, data={"difficulty": "medium"})
+                elif endpoint == "youtube_link":
+                    url = f"https://www.youtube.com/watch?v=bench{n}x{seconds:g}&len={seconds:g}"
+                    response = await client.post("/youtube_link/", data={"youtube_url": url, "difficulty": "medium"})
+                elif endpoint == "youtube_link_stream":
+                    url = f"https://www.youtube.com/watch?v=bench{n}x{seconds:g}&len={seconds:g}"
+                    form = {"youtube_url": url, "difficulty": "medium"}
+                    first = None
+                    async with client.stream("POST", "/youtube_link/stream?format=ndjson", data=form) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            event = json.loads(line)["event"]
+                            if event == "question" and first is None:
+                                first = time.perf_counter() - start
+                            elif event == "error":
+                                raise RuntimeError(line)
+                    if first is not None:
+                        first_question[endpoint].append(first)
+                else:
+                    from benchmarks.fake_groq_server import FAKE_QUIZ
+                    answers = {str(i): i % 4 for i in range(len(FAKE_QUIZ))}
+                    response = await client.post("/verify_answers", json={"quiz": FAKE_QUIZ, "user_answers": answers})
+                response.raise_for_status()
+                latencies[endpoint].append(time.perf_counter() - start)
+            except Exception as e:
+                errors[endpoint] += 1
+                print(f"{endpoint} request {n} failed: {e!r}", file=sys.stderr)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, n) for n in range(args.requests)))
+        elapsed = time.perf_counter() - start
+    return latencies, first_question, errors, elapsed
+
+
+def fn_report(latencies, first_question, errors, elapsed, args):
+    endpoints = {}
+    for name, values in latencies.items():
+        endpoints[name] = {
+            "requests": len(values) + errors[name],
+            "errors": errors[name],
+            "p50_seconds": fn_percentile(values, 50),
+            "p95_seconds": fn_percentile(values, 95),
+            "p99_seconds": fn_percentile(values, 99),
+            "mean_seconds": float(np.mean(values)) if values else None,
+        }
+        if first_question[name]:
+            endpoints[name]["first_question_p50_seconds"] = fn_percentile(first_question[name], 50)
+            endpoints[name]["first_question_p95_seconds"] = fn_percentile(first_question[name], 95)
+    completed = sum(len(v) for v in latencies.values())
+    return {
+        "commit": fn_git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "elapsed_seconds": elapsed,
+        "requests_per_second": completed / elapsed if elapsed else None,
+        # ru_maxrss is reported in KiB on Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "endpoints": endpoints,
+    }
+
+
+def fn_compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50_seconds", "p95_seconds", "p99_seconds", "first_question_p50_seconds"):
+            if current.get(metric) is None or not previous.get(metric):
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric] * 100
+            print(f"  {name:14s} {metric:12s} {previous[metric]:8.3f}s -> {current[metric]:8.3f}s ({change:+.1f}%)")
+    if baseline.get("requests_per_second") and report["requests_per_second"]:
+        print(f"  requests/sec {baseline['requests_per_second']:.2f} -> {report['requests_per_second']:.2f}")
+    print(f"  peak RSS MB  {baseline.get('peak_rss_mb', 0):.0f} -> {report['peak_rss_mb']:.0f}")
+    if baseline.get("startup") and report.get("startup"):
+        print(f"  import main  {baseline['startup']['import_seconds']:.3f}s -> {report['startup']['import_seconds']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--endpoints", nargs="+", default=["upload_file", "youtube_link", "verify_answers"],
+                        choices=["upload_file", "youtube_link", "youtube_link_stream", "verify_answers"])
+    parser.add_argument("--audio-seconds", nargs="+", type=float, default=[30, 120],
+                        help="Lengths of the synthetic audio fixtures, used round-robin")
+    parser.add_argument("--groq-latency", type=float, default=0.5, help="Seconds the fake Groq server waits")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0, help="Fraction of fake Groq calls answered 429")
+    parser.add_argument("--whisper", choices=["stub", "tiny"], default="stub")
+    parser.add_argument("--whisper-rtf", type=float, default=0.05, help="Real-time factor of the stub Whisper model")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    if set(args.endpoints) & {"upload_file", "youtube_link", "youtube_link_stream"} and shutil.which("ffmpeg") is None:
+        parser.error("ffmpeg is required for the upload_file and youtube_link endpoints")
+
+    from benchmarks.bench_startup import fn_profile_imports
+    from benchmarks.fake_groq_server import fn_start_fake_groq
+
+    fixtures = {seconds: fn_synthetic_wav(seconds, seed=int(seconds)) for seconds in args.audio_seconds}
+    StubYoutubeDL.fixtures = fixtures
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        groq_server, groq_url = fn_start_fake_groq(latency=args.groq_latency, error_rate=args.groq_error_rate)
+        server, base_url = fn_start_app(args, groq_url, cache_dir)
+        try:
+            latencies, first_question, errors, elapsed = asyncio.run(fn_drive(base_url, args, fixtures))
+        finally:
+            server.should_exit = True
+            groq_server.shutdown()
+
+    report = fn_report(latencies, first_question, errors, elapsed, args)
+    report["startup"] = fn_profile_imports()
+    print(json.dumps(report, indent=2))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        fn_compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#bench_startup.py
+"""
+Import-time profile and startup budget of an API worker.
+
+Imports `main` in fresh interpreters with `python -X importtime`, reports the
+slowest top-level packages, checks that none of the heavy dependencies
+(Whisper, torch, yt-dlp, deep_translator, groq, ...) were imported, and
+optionally measures the time from spawning uvicorn to the first 200 from
+/health. Exits with status 1 when the budget is exceeded, so it can gate CI.
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup --budget-seconds 1.0 --serve
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["whisper", "torch", "yt_dlp", "deep_translator", "youtube_transcript_api", "groq", "httpx"]
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def fn_worker_env():
+    env = dict(os.environ)
+    env.setdefault("WHISPER_WARMUP_ON_STARTUP", "0")
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def fn_parse_importtime(stderr, top=10):
+    """
+    Sums `-X importtime` self times per top-level package.
+
+    Returns:
+        List[Tuple[str, float]]: The `top` slowest packages with their seconds.
+    """
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <indented module name>"
+        self_us, _, name = line.split(":", 1)[1].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def fn_profile_imports(repeat=3):
+    """
+    Imports `main` `repeat` times in fresh interpreters.
+
+    Returns:
+        Dict: "import_seconds" (median), "runs", "heavy_modules_loaded" and "slowest_packages".
+    """
+    runs, loaded, slowest = [], set(), []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _IMPORT_SNIPPET],
+            cwd=BACKEND_DIR, env=fn_worker_env(), capture_output=True, text=True, check=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        runs.append(result["seconds"])
+        loaded.update(result["loaded"])
+        slowest = fn_parse_importtime(completed.stderr)
+    runs.sort()
+    return {
+        "import_seconds": runs[len(runs) // 2],
+        "runs": runs,
+        "heavy_modules_loaded": sorted(loaded),
+        "slowest_packages": [{"package": name, "seconds": round(seconds, 4)} for name, seconds in slowest],
+    }
+
+
+def fn_time_to_health(timeout=30):
+    """
+    Spawns a uvicorn worker and returns the seconds until /health answers 200.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=fn_worker_env(),
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-seconds", type=float, default=1.0, help="Largest accepted median import time of main")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--serve", action="store_true", help="Also measure uvicorn spawn to first /health response")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    report = fn_profile_imports(args.repeat)
+    if args.serve:
+        report["health_seconds"] = fn_time_to_health()
+    report["budget_seconds"] = args.budget_seconds
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["import_seconds"] > args.budget_seconds:
+        failures.append(f"importing main took {report['import_seconds']:.3f}s, budget is {args.budget_seconds}s")
+    if report["heavy_modules_loaded"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(report['heavy_modules_loaded'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
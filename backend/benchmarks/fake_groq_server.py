@@ -0,0 +1,153 @@
+#fake_groq_server.py
+"""
+Minimal stand-in for Groq's OpenAI-compatible chat completions endpoint.
+
+Answers POST /openai/v1/chat/completions after a configurable latency with a
+summary or a quiz depending on the system prompt. Requests with "stream": true
+get the same content as server-sent chunks spread over that latency. Point the
+backend at it with GROQ_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m benchmarks.fake_groq_server --port 8765 --latency 0.8
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_SUMMARY = [{"Summary": "- The video introduces the topic.\n- It explains the key ideas.\n- It ends with a recap."}]
+FAKE_QUIZ = [
+    {
+        "question": f"Which statement about point {i + 1} is correct?",
+        "options": ["Statement A", "Statement B", "Statement C", "Statement D"],
+        "correctAnswer": i % 4,
+        "explanation": f"Point {i + 1} is described in the video.",
+    }
+    for i in range(5)
+]
+
+
+def fn_make_handler(latency, jitter, error_rate, fail_first=0):
+    # Requests still to be answered with 429 before error_rate applies, shared by all handler threads.
+    failures = {"left": fail_first}
+    failures_lock = threading.Lock()
+
+    class FakeGroqHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+
+            request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+            delay = max(0.0, latency + random.uniform(-jitter, jitter))
+            streaming = request.get("stream", False)
+            # Streamed responses start after a tenth of the latency and spread the rest over the chunks.
+            time.sleep(delay * 0.1 if streaming else delay)
+
+            with failures_lock:
+                fail = failures["left"] > 0
+                failures["left"] -= int(fail)
+            if fail or random.random() < error_rate:
+                self._send(429, {"error": {"message": "rate limited"}}, {"retry-after": "0.2"})
+                return
+
+            system = " ".join(m.get("content", "") for m in request.get("messages", []) if m.get("role") == "system")
+            content = json.dumps(FAKE_QUIZ if "quiz" in system.lower() else FAKE_SUMMARY)
+            prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+            if streaming:
+                self._stream(request, content, prompt_tokens, delay * 0.9)
+                return
+            self._send(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": prompt_tokens + len(content) // 4,
+                },
+            })
+
+        def _stream(self, request, content, prompt_tokens, duration, chunk_chars=16):
+            self.send_response(200)
+            self.send_header("content-type", "text/event-stream")
+            self.send_header("connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)]
+            for index, piece in enumerate(pieces):
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                if index == len(pieces) - 1:
+                    chunk["choices"][0]["finish_reason"] = "stop"
+                    chunk["x_groq"] = {"usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(content) // 4,
+                        "total_tokens": prompt_tokens + len(content) // 4,
+                    }}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(duration / len(pieces))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return FakeGroqHandler
+
+
+def fn_start_fake_groq(port=0, latency=0.5, jitter=0.1, error_rate=0.0, fail_first=0):
+    """
+    Starts the fake server on a background thread. The first `fail_first`
+    requests are answered with 429, e.g. to test retries deterministically.
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The server and its base URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), fn_make_handler(latency, jitter, error_rate, fail_first))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with 429")
+    args = parser.parse_args()
+
+    server, url = fn_start_fake_groq(args.port, args.latency, args.jitter, args.error_rate, args.fail_first)
+    print(f"Fake Groq listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
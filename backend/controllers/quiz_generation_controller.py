@@ -1,77 +1,363 @@
 #quiz_generation_controller.py
 import tempfile
-from deep_translator import GoogleTranslator
-import yt_dlp  
 
 from utils.processing import fn_generate_quiz
+from utils.processing import fn_stream_quiz
 from utils.processing import fn_generate_summary
 from utils.processing import fn_transcribe_audio
+from utils.processing import fn_transcribe_segments
+from utils.processing import fn_load_audio_array
+from utils.processing import WHISPER_SAMPLE_RATE
 from utils.processing import fn_extract_audio
+from utils.processing import fn_save_stream
+from utils.processing import fn_extract_audio_from_stream
+from utils.processing import fn_hash_text
+from utils.processing import GROQ_MODEL
+from utils.processing import UPLOAD_MAX_BYTES
+from utils.cache import transcript_cache, fn_youtube_cache_key, fn_upload_cache_key
+from utils.cache import generation_cache, fn_generation_cache_key
+from utils.whisper_registry import DEFAULT_WHISPER_MODEL
+from utils.workers import fn_run_in_process_pool, fn_map_in_process_pool
+from utils.transcription_queue import TRANSCRIPTION_BACKEND, fn_queue_transcribe, fn_queue_map_segments
+from utils.segmenter import fn_split_audio, SegmentStitcher
+from utils.tokens import fn_count_tokens, fn_chunk_text, fn_prompt_token_limit
+from utils.translation import fn_translate_text
+from utils.pipeline import Stage, fn_run_dag
+from utils.metrics import fn_time_stage, fn_observe_stage, whisper_real_time_factor, audio_seconds_transcribed
+from utils.metrics import quiz_invalid_questions
+from models.quiz_generation_model import QuizQuestion
+from pydantic import ValidationError
+from utils.youtube import fn_extract_video_id
+from utils.captions import caption_provider as default_caption_provider, YOUTUBE_CAPTIONS_ENABLED
+from utils.singleflight import SingleFlight
+from utils.jobs import QueueFullError
+from utils.quiz_store import fn_store_quiz
+from utils.artifact_store import fn_store_artifacts, fn_get_artifacts
+from utils.question_bank import question_bank, question_bank_requests, QUESTION_BANK_ENABLED, QUESTION_BANK_TARGET_SIZE, QUESTION_BANK_TOP_UP_AFTER_SERVES
+from utils.fingerprint import fingerprint_index, fingerprint_lookups, fn_audio_fingerprint, AUDIO_FINGERPRINT_ENABLED
+from utils.lazy import fn_lazy_import
+from utils.workspace import workspace_manager, current_workspace, fn_scratch_dir, fn_check_workspace_quota, WorkspaceQuotaError
 
 import os
+import copy
 import json
+import random
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+yt_dlp = fn_lazy_import("yt_dlp")
+
+# Audio longer than this is split at silences and transcribed chunk by chunk.
+TRANSCRIBE_CHUNK_MIN_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_MIN_SECONDS", "600"))
+
+# Pipe uploads straight into ffmpeg while they arrive and keep only the audio, instead of writing the video to disk.
+UPLOAD_PIPE_TO_FFMPEG = os.getenv("UPLOAD_PIPE_TO_FFMPEG", "0") == "1"
+
+# Tokens reserved for the prompt instructions around the transcript.
+PROMPT_OVERHEAD_TOKENS = 500
+# Chunk summaries requested from Groq at the same time during map-reduce.
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+# Map-reduce rounds before whatever is left is truncated to one prompt; each round shrinks the text ~10x.
+SUMMARY_MAX_REDUCE_ROUNDS = 3
+
+# Bump these whenever the prompt text changes so cached generations are not reused.
+SUMMARY_PROMPT_VERSION = "v1"
+QUIZ_PROMPT_VERSION = "v3"
+
+QUIZ_QUESTION_COUNT = 5
+# Rounds of regenerating only the questions that failed validation.
+QUIZ_REPAIR_ATTEMPTS = int(os.getenv("QUIZ_REPAIR_ATTEMPTS", "2"))
+
+# By default the quiz is generated from the transcript alone, concurrently with the
+# summary. Set to 1 to always feed the finished summary into the quiz prompt.
+QUIZ_WAITS_FOR_SUMMARY = os.getenv("QUIZ_WAITS_FOR_SUMMARY", "0") == "1"
+
+# Identical YouTube requests in flight at the same time share one pipeline run.
+youtube_flights = SingleFlight("youtube_pipeline")
+
+# Videos accepted in one batch request, after expanding playlists.
+BATCH_MAX_VIDEOS = int(os.getenv("BATCH_MAX_VIDEOS", "50"))
+# Videos processed at once across all batch requests of this worker.
+BATCH_VIDEO_CONCURRENCY = int(os.getenv("BATCH_VIDEO_CONCURRENCY", "2"))
+# Batch videos allowed to wait for the batch pool; a batch that does not fit is refused.
+BATCH_QUEUE_DEPTH = int(os.getenv("BATCH_QUEUE_DEPTH", "100"))
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_VIDEO_CONCURRENCY, thread_name_prefix="batch-video")
+_batch_lock = threading.Lock()
+_batch_pending = 0
+
+# Background Groq calls filling thin question banks, kept few so they never crowd out requests.
+QUESTION_BANK_TOP_UP_WORKERS = int(os.getenv("QUESTION_BANK_TOP_UP_WORKERS", "1"))
+# Top-ups queued or running at once; further ones are skipped until the queue drains.
+QUESTION_BANK_TOP_UP_MAX_PENDING = int(os.getenv("QUESTION_BANK_TOP_UP_MAX_PENDING", "16"))
+_top_up_pool = ThreadPoolExecutor(max_workers=QUESTION_BANK_TOP_UP_WORKERS, thread_name_prefix="question-bank")
+_top_ups_lock = threading.Lock()
+_top_ups_running = set()
+# Banks where a top-up produced only duplicates (the video has no new questions to give),
+# with the time they were marked; retried after a day, at most 10000 remembered.
+_top_ups_exhausted = OrderedDict()
+_TOP_UPS_EXHAUSTED_TTL_SECONDS = 24 * 3600
+_TOP_UPS_EXHAUSTED_MAX = 10000
 
 def fn_download_youtube_video(youtube_url):
     """
-    Downloads the audio from a YouTube URL and saves it as a WAV file.
+    Downloads the audio from a YouTube URL and converts it to a 16 kHz mono WAV file
+    with the same extraction stage used for uploads.
+    The download goes to its own directory in the current workspace, so concurrent
+    requests never share a path; the directory is removed before returning.
     Returns path to WAV file or raises a RuntimeError with a clean message.
     """
-    temp_dir = tempfile.gettempdir()
-    outtmpl = temp_dir + '/youtube_audio.%(ext)s'
+    download_dir = tempfile.mkdtemp(prefix="youtube_", dir=fn_scratch_dir())
+    outtmpl = os.path.join(download_dir, 'youtube_audio.%(ext)s')
     cookies_path = "/etc/secrets/YTDLP_COOKIES"
 
     ydl_opts = {
         'format': 'bestaudio/best',
         'outtmpl': outtmpl,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-            'preferredquality': '192',
-        }],
         'quiet': True,
     }
     if os.path.exists(cookies_path):
         ydl_opts['cookies'] = cookies_path
+    workspace = current_workspace.get()
+    if workspace:
+        ydl_opts['max_filesize'] = workspace.remaining_bytes()
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(youtube_url, download=True)
-            generated = ydl.prepare_filename(info)
-
-            # Replace with .wav (post-processor output)
-            if '.' in generated:
-                audio_path = generated.rsplit('.', 1)[0] + '.wav'
-            else:
-                audio_path = generated + '.wav'
-
-        return audio_path
-    except yt_dlp.utils.DownloadError as e:
-        raise RuntimeError(f"Failed to download video: {str(e)}") from e
-    except Exception as e:
-        raise RuntimeError(f"Unexpected error while processing YouTube URL: {str(e)}") from e
+        try:
+            with fn_time_stage("download"), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(youtube_url, download=True)
+                downloads = info.get('requested_downloads') or [{}]
+                downloaded_path = downloads[0].get('filepath') or ydl.prepare_filename(info)
+        except yt_dlp.utils.DownloadError as e:
+            raise RuntimeError(f"Failed to download video: {str(e)}") from e
+        except Exception as e:
+            raise RuntimeError(f"Unexpected error while processing YouTube URL: {str(e)}") from e
+
+        if not os.path.exists(downloaded_path):
+            raise RuntimeError("Failed to download video: no file was written (it may exceed the disk quota)")
+        fn_check_workspace_quota()
+        try:
+            return help_fn_extract_audio(downloaded_path)
+        except WorkspaceQuotaError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to extract audio from YouTube download: {str(e)}") from e
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+def fn_new_temp_path(suffix):
+    """
+    Reserves a unique path in the current workspace (or the system temp dir) and returns it.
+    """
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=fn_scratch_dir())
+    temp_file.close()
+    return temp_file.name
+
 
 def help_fn_extract_audio(video_path):
     """
-    Extracts audio from a video file and saves as a WAV in the system temp dir.
-    Returns the path to the audio file.
+    Extracts audio from a video file and saves as a WAV in the current workspace.
+    Returns the path to the audio file. The WAV is removed if extraction fails
+    or pushes the workspace over its disk quota.
     """
-    temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-    temp_audio_path = temp_audio.name
-    temp_audio.close()
-    return fn_extract_audio(video_path, temp_audio_path)
+    temp_audio_path = fn_new_temp_path(".wav")
+    try:
+        with fn_time_stage("extract_audio"):
+            fn_extract_audio(video_path, temp_audio_path)
+        fn_check_workspace_quota()
+        return temp_audio_path
+    except BaseException:
+        os.unlink(temp_audio_path)
+        raise
 
 
-def help_fn_transcribe_audio(audio_path):
+def help_fn_transcribe_audio(audio_path, model_size=DEFAULT_WHISPER_MODEL, on_segment=None, samples=None):
     """
     Transcribes audio using OpenAI's Whisper model.
+    Runs on the transcription workers when TRANSCRIPTION_BACKEND is "queue",
+    otherwise on the Whisper process pool when WHISPER_PROCESS_WORKERS is set.
+
+    Audio longer than TRANSCRIBE_CHUNK_MIN_SECONDS is split at silences and the
+    chunks are transcribed in parallel; `on_segment` is then called with each
+    list of stitched, timestamped segments as soon as they are final.
 
     Args:
         audio_path: The file path to the audio file.
+        samples: The audio already loaded as 16 kHz mono samples, if available.
+
+    Returns:
+        A tuple containing the transcript text and the detected language.
+    """
+    if samples is None:
+        samples = fn_load_audio_array(audio_path)
+    audio_seconds = len(samples) / WHISPER_SAMPLE_RATE
+    start = time.perf_counter()
+    transcript, detected_lang = _transcribe_samples(samples, model_size, on_segment)
+    elapsed = time.perf_counter() - start
+
+    fn_observe_stage("transcribe", elapsed)
+    audio_seconds_transcribed.inc(audio_seconds)
+    if audio_seconds > 0:
+        whisper_real_time_factor.observe(elapsed / audio_seconds)
+    return transcript, detected_lang
+
+
+def _transcribe_samples(samples, model_size, on_segment):
+    queued = TRANSCRIPTION_BACKEND == "queue"
+    if len(samples) < TRANSCRIBE_CHUNK_MIN_SECONDS * WHISPER_SAMPLE_RATE:
+        if queued:
+            return fn_queue_transcribe(samples, model_size, WHISPER_SAMPLE_RATE)
+        return fn_run_in_process_pool(fn_transcribe_audio, samples, model_size)
+
+    chunks = fn_split_audio(samples, WHISPER_SAMPLE_RATE)
+    stitcher = SegmentStitcher(chunks, WHISPER_SAMPLE_RATE)
+    if queued:
+        results = fn_queue_map_segments([chunk["samples"] for chunk in chunks], model_size, WHISPER_SAMPLE_RATE)
+    else:
+        results = fn_map_in_process_pool(fn_transcribe_segments, [(chunk["samples"], model_size) for chunk in chunks])
+    for index, result in results:
+        released = stitcher.add(index, result)
+        if released and on_segment:
+            on_segment(released)
+
+    return stitcher.text(), stitcher.language()
+
+
+def _fn_no_stage(stage):
+    pass
+
+
+def help_fn_transcribe_youtube(youtube_url, model_size=DEFAULT_WHISPER_MODEL, on_stage=_fn_no_stage, on_segment=None):
+    """
+    Returns the transcript of a YouTube video, using the transcript cache when possible.
+    On a cache hit the download, audio extraction and transcription are skipped.
+
+    Returns:
+        A tuple containing the transcript text and the detected language.
+    """
+    video_id = fn_extract_video_id(youtube_url)
+    cache_key = fn_youtube_cache_key(video_id, model_size) if video_id else None
+
+    if cache_key:
+        cached = transcript_cache.get(cache_key)
+        if cached:
+            return cached["transcript"], cached["language"]
+
+    on_stage("download")
+    audio_path = fn_download_youtube_video(youtube_url)
+    try:
+        on_stage("transcribe")
+        transcript, detected_lang = help_fn_transcribe_audio(audio_path, model_size, on_segment)
+    finally:
+        if audio_path and os.path.exists(audio_path):
+            os.unlink(audio_path)
+
+    if cache_key:
+        transcript_cache.set(cache_key, {"transcript": transcript, "language": detected_lang})
+    return transcript, detected_lang
+
+
+def help_fn_get_youtube_transcript(youtube_url, target_lang, caption_provider=None, on_stage=_fn_no_stage, on_segment=None):
+    """
+    Returns the transcript of a YouTube video, trying existing captions in the
+    target language first (manual before auto-generated) and falling back to
+    download + Whisper only when none exist.
+
+    Args:
+        youtube_url: The YouTube URL.
+        target_lang: The language the quiz will be generated in.
+        caption_provider: Object with a `fetch(video_id, languages)` method.
+            Defaults to the YouTube caption API.
+
+    Returns:
+        A tuple of (transcript, language, source) where source is
+        "captions_manual", "captions_auto" or "whisper".
+    """
+    caption_provider = caption_provider or default_caption_provider
+    video_id = fn_extract_video_id(youtube_url)
+
+    if YOUTUBE_CAPTIONS_ENABLED and video_id:
+        on_stage("captions")
+        with fn_time_stage("captions"):
+            captions = caption_provider.fetch(video_id, [target_lang])
+        if captions:
+            return captions["text"], captions["language"], captions["source"]
+
+    transcript, detected_lang = help_fn_transcribe_youtube(youtube_url, on_stage=on_stage, on_segment=on_segment)
+    return transcript, detected_lang, "whisper"
+
+
+def help_fn_transcribe_video_file(video_path, digest, model_size=DEFAULT_WHISPER_MODEL, on_stage=_fn_no_stage, on_segment=None):
+    """
+    Returns the transcript of a video already on disk, keyed in the cache by `digest`.
+    Audio extraction and transcription only run on a cache miss.
+
+    Args:
+        video_path: Path of the saved video, or of its 16 kHz ".wav" audio when it was spooled through ffmpeg.
+        digest: SHA-256 hex digest of the video bytes.
+
+    Returns:
+        A tuple containing the transcript text and the detected language.
+    """
+    cache_key = fn_upload_cache_key(digest, model_size)
+    cached = transcript_cache.get(cache_key)
+    if cached:
+        return cached["transcript"], cached["language"]
+
+    audio_path = None
+    try:
+        if video_path.endswith(".wav"):
+            audio_path = video_path
+        else:
+            on_stage("extract_audio")
+            audio_path = help_fn_extract_audio(video_path)
+        transcript, detected_lang = help_fn_transcribe_new_audio(audio_path, cache_key, model_size, on_stage, on_segment)
+    finally:
+        if audio_path and os.path.exists(audio_path):
+            os.unlink(audio_path)
+
+    transcript_cache.set(cache_key, {"transcript": transcript, "language": detected_lang})
+    return transcript, detected_lang
+
+
+def help_fn_transcribe_new_audio(audio_path, cache_key, model_size=DEFAULT_WHISPER_MODEL, on_stage=_fn_no_stage, on_segment=None):
+    """
+    Transcribes the extracted audio of an upload whose bytes were not seen before.
+
+    Re-encoded or slightly trimmed copies of an earlier upload have different
+    bytes but the same audio fingerprint; for those the earlier transcript is
+    reused instead of running Whisper again. New recordings are fingerprinted
+    and indexed under `cache_key` once transcribed.
+
+    Args:
+        audio_path: Path of the extracted 16 kHz mono audio.
+        cache_key: Transcript cache key of this upload.
 
     Returns:
         A tuple containing the transcript text and the detected language.
     """
-    return fn_transcribe_audio(audio_path)
+    samples = fn_load_audio_array(audio_path)
+    fingerprint = None
+    if AUDIO_FINGERPRINT_ENABLED:
+        with fn_time_stage("fingerprint"):
+            fingerprint = fn_audio_fingerprint(samples, WHISPER_SAMPLE_RATE)
+            match = fingerprint_index.lookup(*fingerprint, model_size)
+        cached = transcript_cache.get(match["cache_key"]) if match else None
+        fingerprint_lookups.inc(result="hit" if cached else "miss")
+        if cached:
+            print(f"Reusing transcript of {match['cache_key']} (fingerprint bit error rate {match['bit_error_rate']:.2f})")
+            return cached["transcript"], cached["language"]
+        if match:
+            # The matched transcript has expired from the cache, so its fingerprint is useless.
+            fingerprint_index.delete(match["cache_key"])
+
+    on_stage("transcribe")
+    transcript, detected_lang = help_fn_transcribe_audio(audio_path, model_size, on_segment, samples=samples)
+    if fingerprint is not None:
+        fingerprint_index.add(*fingerprint, cache_key, model_size)
+    return transcript, detected_lang
 
 
 def fn_translate_transcript(text, source_lang, target_lang):
@@ -87,10 +373,84 @@ def fn_translate_transcript(text, source_lang, target_lang):
         The translated text. Returns original text if source and target are the same.
     """
     if source_lang != target_lang:
-        return GoogleTranslator(source=source_lang, target=target_lang).translate(text)
-    return text  
+        return fn_translate_text(text, source_lang, target_lang)
+    return text
+
+def help_fn_generate_summary_groq(transcript, target_lang="en"):
+    """
+    Generates the bullet summary of a transcript, memoized per (transcript, language).
+    """
+    cache_key = fn_generation_cache_key(
+        "summary", fn_hash_text(transcript), SUMMARY_PROMPT_VERSION, GROQ_MODEL, target_lang
+    )
+    return generation_cache.get_or_generate(cache_key, lambda: _generate_map_reduce_summary(transcript))
+
+
+def _generate_map_reduce_summary(text):
+    """
+    Summarizes text that may exceed the model's prompt limit.
+
+    Text that fits is summarized in one call. Longer text is split into
+    token-bounded chunks that are summarized concurrently (map); the chunk
+    summaries are then summarized again (reduce) until they fit one prompt.
+    After SUMMARY_MAX_REDUCE_ROUNDS rounds, or as soon as a round does not
+    shrink the text, what is left is truncated to one prompt.
+    """
+    budget = fn_prompt_token_limit(GROQ_MODEL) - PROMPT_OVERHEAD_TOKENS
+    tokens = fn_count_tokens(text)
+    for _ in range(SUMMARY_MAX_REDUCE_ROUNDS):
+        if tokens <= budget:
+            break
+        chunks = fn_chunk_text(text, budget)
+        with ThreadPoolExecutor(max_workers=SUMMARY_MAP_CONCURRENCY) as pool:
+            partial_summaries = list(pool.map(_generate_summary, chunks))
+
+        bullets = [
+            item.get("Summary", "")
+            for partial in partial_summaries if isinstance(partial, list)
+            for item in partial if isinstance(item, dict)
+        ]
+        reduced = "\n".join(b for b in bullets if b)
+        if not reduced:
+            return []
+        reduced_tokens = fn_count_tokens(reduced)
+        shrunk = reduced_tokens < tokens
+        # Keep the reduced text even when it did not shrink: it still covers the whole input.
+        text, tokens = reduced, reduced_tokens
+        if not shrunk:
+            break
+
+    if tokens > budget:
+        print(f"Summary input still has {tokens} tokens after map-reduce, keeping the first {budget}")
+        text = fn_chunk_text(text, budget)[0]
+    return _generate_summary(text)
+
+
+def fn_fit_transcript_for_quiz(transcript, summary):
+    """
+    Returns the transcript text to put in the quiz prompt.
+
+    When transcript and summary do not fit the prompt limit together, the
+    transcript is replaced by evenly spaced chunks, starting at a random
+    offset so repeated generations see different parts of the video.
+    """
+    budget = fn_prompt_token_limit(GROQ_MODEL) - PROMPT_OVERHEAD_TOKENS - fn_count_tokens(json.dumps(summary))
+    if fn_count_tokens(transcript) <= budget:
+        return transcript
+
+    chunk_tokens = max(200, budget // 4)
+    chunks = fn_chunk_text(transcript, chunk_tokens)
+    count = max(1, budget // chunk_tokens)
+    if count >= len(chunks):
+        return " ".join(chunks)
+
+    step = len(chunks) / count
+    offset = random.random() * step
+    sampled = [chunks[int(offset + i * step)] for i in range(count)]
+    return "\n...\n".join(sampled)
+
 
-def help_fn_generate_summary_groq(transcript):
+def _generate_summary(transcript):
     var_prompt = f"""
     Based on the following transcript generate summary in bullet points.
     TRANSCRIPT:
@@ -104,50 +464,592 @@ def help_fn_generate_summary_groq(transcript):
     """
     return fn_generate_summary(var_prompt)
 
-def help_fn_generate_quiz(transcript, summary, difficulty):
+def _quiz_cache_key(transcript, summary, difficulty, target_lang):
+    template_version = QUIZ_PROMPT_VERSION if summary is None else QUIZ_PROMPT_VERSION + "+summary"
+    return fn_generation_cache_key(
+        "quiz", fn_hash_text(transcript), template_version, GROQ_MODEL, target_lang, difficulty
+    )
+
+
+def fn_question_bank_key(transcript, target_lang):
+    return f"{QUIZ_PROMPT_VERSION}:{GROQ_MODEL}:{fn_hash_text(transcript)}:{target_lang}"
+
+
+def help_fn_generate_quiz(transcript, summary, difficulty, target_lang="en"):
     """
-    This helper function is used to generate a quiz using Groq API
+    This helper function is used to generate a quiz using Groq API.
+    `summary` may be None, in which case the quiz is based on the transcript alone.
+
+    Quizzes are served from the video's question bank when it holds enough
+    questions of this difficulty, see help_fn_serve_from_bank. Without the bank
+    (QUESTION_BANK_ENABLED=0) they are memoized per (transcript, difficulty, language).
     """
-    var_prompt = f"""
-    Based on the following transcript and summary, generate exactly 5 multiple-choice quiz questions with 4 options each.
-    The difficulty level should be: {difficulty}.
+    if QUESTION_BANK_ENABLED:
+        return help_fn_serve_from_bank(transcript, summary, difficulty, target_lang)
+    return generation_cache.get_or_generate(
+        _quiz_cache_key(transcript, summary, difficulty, target_lang),
+        lambda: _generate_quiz(transcript, summary, difficulty),
+    )
 
-    TRANSCRIPT:
-    {transcript}
 
+def help_fn_stream_quiz(transcript, summary, difficulty, target_lang, on_question):
+    """
+    Same as help_fn_generate_quiz, but streams the Groq completion and calls
+    `on_question` with each question as soon as it is complete.
+    A cached or banked quiz is replayed question by question.
+    """
+    if QUESTION_BANK_ENABLED:
+        return help_fn_serve_from_bank(transcript, summary, difficulty, target_lang, on_question)
+
+    streamed = []
+
+    def on_streamed(question):
+        streamed.append(question)
+        on_question(question)
+
+    quiz = generation_cache.get_or_generate(
+        _quiz_cache_key(transcript, summary, difficulty, target_lang),
+        lambda: _generate_quiz(transcript, summary, difficulty, on_streamed),
+    )
+    for question in quiz[len(streamed):]:
+        on_question(question)
+    return quiz
+
+
+def help_fn_serve_from_bank(transcript, summary, difficulty, target_lang, on_question=None):
+    """
+    Samples QUIZ_QUESTION_COUNT questions of `difficulty` from the video's
+    question bank, a local lookup without any Groq call. When the bank holds
+    too few, a new quiz is generated (and streamed to `on_question`, if given)
+    and its questions are banked. Once every banked question has been served
+    QUESTION_BANK_TOP_UP_AFTER_SERVES times, the bank is topped up in the
+    background, up to QUESTION_BANK_TARGET_SIZE questions.
+    """
+    bank_key = fn_question_bank_key(transcript, target_lang)
+    quiz = question_bank.sample(bank_key, difficulty, QUIZ_QUESTION_COUNT)
+    question_bank_requests.inc(result="hit" if quiz else "miss")
+    if quiz is None:
+        quiz = _generate_quiz(transcript, summary, difficulty, on_question, question_bank.questions(bank_key, difficulty))
+        # The quiz is served right away, so it counts towards the least-served order and the top-up trigger.
+        question_bank.add(bank_key, difficulty, quiz, served=1)
+    elif on_question:
+        for question in quiz:
+            on_question(question)
+
+    _fn_schedule_top_up(bank_key, transcript, summary, difficulty)
+    return quiz
+
+
+def _fn_schedule_top_up(bank_key, transcript, summary, difficulty):
+    key = (bank_key, difficulty)
+    with _top_ups_lock:
+        now = time.time()
+        while _top_ups_exhausted and next(iter(_top_ups_exhausted.values())) < now - _TOP_UPS_EXHAUSTED_TTL_SECONDS:
+            _top_ups_exhausted.popitem(last=False)
+        if key in _top_ups_running or key in _top_ups_exhausted:
+            return
+        if len(_top_ups_running) >= QUESTION_BANK_TOP_UP_MAX_PENDING:
+            return
+        # Only banks whose questions are all being repeated need more; a video asked for once never does.
+        if question_bank.least_served(bank_key, difficulty) < QUESTION_BANK_TOP_UP_AFTER_SERVES:
+            return
+        if question_bank.count(bank_key, difficulty) >= QUESTION_BANK_TARGET_SIZE:
+            return
+        _top_ups_running.add(key)
+
+    def top_up():
+        try:
+            existing = question_bank.questions(bank_key, difficulty)
+            added = question_bank.add(bank_key, difficulty, _generate_quiz(transcript, summary, difficulty, existing=existing))
+            if not added:
+                with _top_ups_lock:
+                    _top_ups_exhausted[key] = time.time()
+                    while len(_top_ups_exhausted) > _TOP_UPS_EXHAUSTED_MAX:
+                        _top_ups_exhausted.popitem(last=False)
+        except Exception as e:
+            print(f"Question bank top-up failed: {e!r}")
+        finally:
+            with _top_ups_lock:
+                _top_ups_running.discard(key)
+
+    _top_up_pool.submit(top_up)
+
+
+def _generate_quiz(transcript, summary, difficulty, on_question=None, existing=()):
+    """
+    Generates QUIZ_QUESTION_COUNT questions, validated against QuizQuestion.
+
+    Invalid or missing questions are regenerated on their own, up to
+    QUIZ_REPAIR_ATTEMPTS times, instead of failing the whole quiz. When
+    `on_question` is given the quiz is streamed and only valid questions are
+    passed to it. May return fewer questions if every repair attempt fails.
+    The model is asked not to repeat the `existing` questions.
+    """
+    transcript = fn_fit_transcript_for_quiz(transcript, summary)
+    questions = []
+
+    def accept(candidates):
+        for candidate in candidates:
+            if len(questions) >= QUIZ_QUESTION_COUNT:
+                return
+            question = fn_validate_question(candidate)
+            if question is None:
+                continue
+            questions.append(question)
+            if on_question:
+                on_question(question)
+
+    prompt = _quiz_prompt(transcript, summary, difficulty, QUIZ_QUESTION_COUNT, existing)
+    if on_question:
+        fn_stream_quiz(prompt, lambda candidate: accept([candidate]))
+    else:
+        accept(fn_generate_quiz(prompt))
+
+    for _ in range(QUIZ_REPAIR_ATTEMPTS):
+        missing = QUIZ_QUESTION_COUNT - len(questions)
+        if missing <= 0:
+            break
+        print(f"Regenerating {missing} invalid or missing quiz questions")
+        asked = list(existing) + [question["question"] for question in questions]
+        accept(fn_generate_quiz(_quiz_prompt(transcript, summary, difficulty, missing, asked)))
+
+    return questions
+
+
+def fn_validate_question(candidate):
+    """
+    Returns the question normalized by the QuizQuestion schema, or None if it is invalid.
+    """
+    try:
+        return QuizQuestion.model_validate(candidate).model_dump()
+    except ValidationError as e:
+        quiz_invalid_questions.inc()
+        print(f"Rejected quiz question {candidate!r}: {e}")
+        return None
+
+
+def _quiz_prompt(transcript, summary, difficulty, count, existing=()):
+    sources = "transcript" if summary is None else "transcript and summary"
+    summary_section = "" if summary is None else f"""
     SUMMARY:
     {summary}
+"""
+    existing_section = "" if not existing else """
+    Do not repeat any of these questions:
+    """ + "\n    ".join(f"- {question}" for question in existing) + "\n"
+    return f"""
+    Based on the following {sources}, generate exactly {count} multiple-choice quiz questions with 4 options each.
+    The difficulty level should be: {difficulty}.
+
+    TRANSCRIPT:
+    {transcript}
+    {summary_section}{existing_section}
 
     Output must be a valid JSON array, strictly like this format Do not give anything extra additional information.
+    "correctAnswer" is the 0-based index of the correct option in "options".
     [
         {{
             "question": "What is ...?",
             "options": ["Option A", "Option B", "Option C", "Option D"],
-            "correctAnswer": 1,  // 0-based index of the correct option
+            "correctAnswer": 1,
             "explanation": "Why this answer is correct."
         }}
     ]    """
-    response = fn_generate_quiz(var_prompt)
 
-    if isinstance(response, str):
-        var_response = json.loads(response)
-    else:
-        var_response = response
 
-    return var_response
+def fn_quiz_needs_summary(transcript):
+    """
+    The quiz can skip waiting for the summary when the whole transcript fits its prompt.
+    Longer transcripts are sampled, so the map-reduce summary is needed for coverage.
+    """
+    if QUIZ_WAITS_FOR_SUMMARY:
+        return True
+    return fn_count_tokens(transcript) > fn_prompt_token_limit(GROQ_MODEL) - PROMPT_OVERHEAD_TOKENS
 
 
+def help_fn_build_quiz(transcript, detected_lang, target_lang, difficulty, on_stage=_fn_no_stage, clock_start=None,
+                       on_question=None, on_summary=None, **artifacts):
+    """
+    Runs the stages shared by every pipeline once a transcript is available as a DAG:
+    translate, then summary and quiz concurrently (the quiz only waits for the
+    summary when the transcript is too long for its prompt).
 
+    When `on_question` is given the quiz is streamed and each question is passed
+    to it as soon as it is generated; `on_summary` receives the finished summary.
+    `artifacts` are passed on to help_fn_build_quizzes.
 
+    Returns:
+        A dict matching QuizResponse, including per-stage timings.
+    """
+    result = help_fn_build_quizzes(
+        transcript, detected_lang, target_lang, [difficulty], on_stage, clock_start, on_question, on_summary, **artifacts
+    )
+    result["quiz"] = result.pop("quizzes")[difficulty]
+    result["quiz_id"] = result.pop("quiz_ids")[difficulty]
+    return result
 
 
+def help_fn_build_quizzes(transcript, detected_lang, target_lang, difficulties, on_stage=_fn_no_stage, clock_start=None,
+                          on_question=None, on_summary=None, transcript_source=None, translation=None, summary=None):
+    """
+    Same DAG as help_fn_build_quiz with one quiz stage per difficulty, so every
+    difficulty reuses a single translation and summary. With several
+    difficulties the quiz stages are named "quiz:<difficulty>".
 
+    A `translation` and `summary` from an earlier run (see fn_regenerate_quiz)
+    replace the output of their stages. The transcript, translation and
+    summary are kept in the artifact store, and every quiz in the quiz store
+    so answers can be verified by ID.
 
+    Returns:
+        A dict with "transcript", "summary", "quizzes" ({difficulty: quiz}),
+        "quiz_ids" ({difficulty: quiz ID}), "artifact_id", "transcript_source" and "timings".
+    """
+    def translate_stage():
+        if translation is not None:
+            return translation
+        return fn_translate_transcript(transcript, detected_lang, target_lang)
 
+    def summary_stage(translate):
+        summary_ = summary or help_fn_generate_summary_groq(translate, target_lang)
+        if on_summary:
+            on_summary(summary_)
+        return summary_
 
+    def quiz_stage(difficulty):
+        def run(translate, summary=None):
+            if on_question:
+                return help_fn_stream_quiz(translate, summary, difficulty, target_lang, on_question)
+            return help_fn_generate_quiz(translate, summary, difficulty, target_lang)
+        return run
 
+    quiz_inputs = ["translate", "summary"] if fn_quiz_needs_summary(transcript) else ["translate"]
+    quiz_stages = {
+        difficulty: "quiz" if len(difficulties) == 1 else f"quiz:{difficulty}" for difficulty in difficulties
+    }
+    stages = [
+        Stage("translate", translate_stage),
+        Stage("summary", summary_stage, ["translate"]),
+    ] + [Stage(name, quiz_stage(difficulty), quiz_inputs) for difficulty, name in quiz_stages.items()]
+    results, timings = fn_run_dag(stages, on_stage=on_stage, max_workers=len(stages), clock_start=clock_start)
+    for name, timing in timings.items():
+        fn_observe_stage(name.split(":")[0], timing["duration"])
+    quizzes = {difficulty: results[name] for difficulty, name in quiz_stages.items()}
+    return {
+        "transcript": results["translate"],
+        "summary": results["summary"],
+        "quizzes": quizzes,
+        "quiz_ids": {difficulty: fn_store_quiz(quiz) for difficulty, quiz in quizzes.items()},
+        "artifact_id": fn_store_artifacts(
+            transcript, detected_lang, target_lang, results["translate"], results["summary"], transcript_source
+        ),
+        "transcript_source": transcript_source,
+        "timings": timings,
+    }
 
 
+def fn_stage_timing(start, clock_start):
+    end = time.perf_counter()
+    return {
+        "start": round(start - clock_start, 3),
+        "end": round(end - clock_start, 3),
+        "duration": round(end - start, 3),
+    }
+
+
+def fn_run_youtube_pipeline(youtube_url, target_lang, difficulty, on_stage=_fn_no_stage, on_segment=None, caption_provider=None,
+                            on_question=None, on_summary=None):
+    """
+    Runs the full captions-or-(download -> transcribe) -> translate -> summarize -> quiz
+    pipeline for a YouTube URL.
+
+    Concurrent calls for the same video ID, target language and difficulty are
+    coalesced: the first one runs the pipeline, the others wait for it, receive
+    a copy of its result and see its remaining stage updates. The quiz is always
+    generated as a stream so any caller can pass `on_question`; callers joining
+    late first receive the questions and summary already produced.
+    """
+    video_id = fn_extract_video_id(youtube_url)
+    if video_id is None or caption_provider is not None:
+        return _run_youtube_pipeline(
+            youtube_url, target_lang, difficulty, on_stage, on_segment, caption_provider, on_question, on_summary
+        )
+
+    result, coalesced = youtube_flights.do(
+        (video_id, target_lang, difficulty),
+        lambda **callbacks: _run_youtube_pipeline(youtube_url, target_lang, difficulty, **callbacks),
+        replay=("on_question", "on_summary"),
+        on_stage=on_stage,
+        on_segment=on_segment,
+        on_question=on_question,
+        on_summary=on_summary,
+    )
+    return copy.deepcopy(result) if coalesced else result
+
+
+def _run_youtube_pipeline(youtube_url, target_lang, difficulty, on_stage, on_segment, caption_provider=None,
+                          on_question=None, on_summary=None):
+    clock_start = time.perf_counter()
+    with workspace_manager.workspace():
+        transcript, detected_lang, source = help_fn_get_youtube_transcript(
+            youtube_url, target_lang, caption_provider, on_stage, on_segment
+        )
+    transcript_timing = fn_stage_timing(clock_start, clock_start)
+
+    result = help_fn_build_quiz(
+        transcript, detected_lang, target_lang, difficulty, on_stage, clock_start, on_question, on_summary,
+        transcript_source=source,
+    )
+    result["timings"]["transcript"] = transcript_timing
+    return result
+
+
+def fn_run_video_file_pipeline(video_path, digest, target_lang, difficulty, on_stage=_fn_no_stage, on_segment=None, workspace=None,
+                               on_question=None, on_summary=None):
+    """
+    Runs the full extract -> transcribe -> translate -> summarize -> quiz pipeline for an
+    upload spooled to `video_path` by fn_spool_upload. `workspace` is the workspace the
+    upload was spooled into; it (or the spooled file, without one) is removed once the
+    transcript is available.
+    """
+    clock_start = time.perf_counter()
+    try:
+        with workspace_manager.workspace(workspace):
+            transcript, detected_lang = help_fn_transcribe_video_file(video_path, digest, on_stage=on_stage, on_segment=on_segment)
+    finally:
+        if os.path.exists(video_path):
+            os.unlink(video_path)
+    transcript_timing = fn_stage_timing(clock_start, clock_start)
+
+    result = help_fn_build_quiz(
+        transcript, detected_lang, target_lang, difficulty, on_stage, clock_start, on_question, on_summary,
+        transcript_source="whisper",
+    )
+    result["timings"]["transcript"] = transcript_timing
+    return result
+
+
+def fn_regenerate_quiz(artifact_id, target_lang, difficulty, on_stage=_fn_no_stage, on_question=None, on_summary=None):
+    """
+    Builds a new quiz from the artifacts of an earlier run instead of the video.
+
+    Download, audio extraction and transcription are always skipped. When the
+    run already produced `target_lang`, its translation and summary are reused
+    too and only the quiz is generated, a single Groq call; otherwise the
+    transcript is translated and the summary and quiz generated from it.
+
+    Returns:
+        A dict matching QuizResponse, or None if the artifacts are unknown or expired.
+    """
+    artifacts = fn_get_artifacts(artifact_id)
+    if artifacts is None:
+        return None
+    stored = artifacts["translations"].get(target_lang, {})
+    return help_fn_build_quiz(
+        artifacts["transcript"], artifacts["language"], target_lang, difficulty, on_stage,
+        on_question=on_question, on_summary=on_summary, transcript_source=artifacts["transcript_source"],
+        translation=stored.get("transcript"), summary=stored.get("summary") or None,
+    )
+
+
+def fn_spool_upload(fileobj):
+    """
+    Streams an upload into a new workspace so it can be processed after the request body is gone.
+    With UPLOAD_PIPE_TO_FFMPEG the upload is piped through ffmpeg and only its audio is kept.
+    Whoever runs the pipeline releases the workspace when it finishes.
+
+    Returns:
+        Tuple[Workspace, str, str]: The workspace, the video (or audio) path and the SHA-256 digest of the upload.
+    """
+    workspace = workspace_manager.create()
+    max_bytes = min(UPLOAD_MAX_BYTES, workspace.quota_bytes)
+    try:
+        if UPLOAD_PIPE_TO_FFMPEG:
+            video_path, digest = fn_extract_audio_from_stream(fileobj, workspace.new_path(".wav"), max_bytes=max_bytes)
+        else:
+            video_path = workspace.new_path(".mp4")
+            digest = fn_save_stream(fileobj, video_path, max_bytes=max_bytes)
+    except BaseException:
+        workspace_manager.release(workspace)
+        raise
+    return workspace, video_path, digest
+
+
+def _fn_stream_callbacks(emit):
+    """
+    Maps the pipeline callbacks onto `emit(event, data)` events.
+    """
+    counter = {"index": 0}
+
+    def on_question(question):
+        emit("question", {"index": counter["index"], "question": question})
+        counter["index"] += 1
+
+    return {
+        "on_stage": lambda stage: emit("stage", {"stage": stage}),
+        "on_segment": lambda segments: emit("segments", {"segments": segments}),
+        "on_question": on_question,
+        "on_summary": lambda summary: emit("summary", {"summary": summary}),
+    }
+
+
+def fn_stream_youtube_pipeline(youtube_url, target_lang, difficulty, emit):
+    """
+    Runs the YouTube pipeline and reports it through `emit(event, data)`:
+    "stage" and "segments" updates, each quiz "question" as soon as Groq
+    finishes it, the "summary", then the complete "result".
+    """
+    result = fn_run_youtube_pipeline(youtube_url, target_lang, difficulty, **_fn_stream_callbacks(emit))
+    emit("result", result)
+
+
+def fn_stream_video_file_pipeline(video_path, digest, target_lang, difficulty, emit, workspace=None):
+    """
+    Same as fn_stream_youtube_pipeline for an upload spooled with fn_spool_upload.
+    """
+    result = fn_run_video_file_pipeline(
+        video_path, digest, target_lang, difficulty, workspace=workspace, **_fn_stream_callbacks(emit)
+    )
+    emit("result", result)
+
+
+def fn_expand_playlist(playlist_url):
+    """
+    Lists the videos of a YouTube playlist without downloading anything.
+
+    Returns:
+        List[str]: Watch URLs of the playlist entries, in playlist order.
+    """
+    ydl_opts = {'extract_flat': 'in_playlist', 'skip_download': True, 'quiet': True}
+    cookies_path = "/etc/secrets/YTDLP_COOKIES"
+    if os.path.exists(cookies_path):
+        ydl_opts['cookies'] = cookies_path
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(playlist_url, download=False)
+    except Exception as e:
+        raise ValueError(f"Failed to read playlist: {str(e)}") from e
+
+    urls = []
+    for entry in info.get('entries') or []:
+        if entry and entry.get('id'):
+            urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
+    return urls
+
+
+def fn_collect_batch_urls(urls, playlist_url=None):
+    """
+    Returns the videos of a batch: the given URLs followed by the playlist entries,
+    without duplicates (compared by video ID).
+
+    Raises:
+        ValueError: If a URL is not a YouTube video, or the batch is empty or larger than BATCH_MAX_VIDEOS.
+    """
+    candidates = list(urls) + (fn_expand_playlist(playlist_url) if playlist_url else [])
+    videos, seen = [], set()
+    for url in candidates:
+        video_id = fn_extract_video_id(url)
+        if video_id is None:
+            raise ValueError(f"Not a YouTube video URL: {url}")
+        if video_id not in seen:
+            seen.add(video_id)
+            videos.append(url)
+
+    if not videos:
+        raise ValueError("The batch contains no videos")
+    if len(videos) > BATCH_MAX_VIDEOS:
+        raise ValueError(f"The batch contains {len(videos)} videos, the limit is {BATCH_MAX_VIDEOS}")
+    return videos
+
+
+def fn_run_video_quizzes(youtube_url, target_lang, difficulties):
+    """
+    Transcribes one video once and generates a quiz for every difficulty from a
+    single translation and summary.
+
+    Concurrent calls for the same video ID, target language and difficulties
+    (e.g. overlapping batches) are coalesced like fn_run_youtube_pipeline.
+
+    Returns:
+        A dict with "transcript", "summary", "quizzes", "quiz_ids", "artifact_id", "transcript_source" and "timings".
+    """
+    video_id = fn_extract_video_id(youtube_url)
+    if video_id is None:
+        return _run_video_quizzes(youtube_url, target_lang, difficulties)
+
+    result, coalesced = youtube_flights.do(
+        ("quizzes", video_id, target_lang, tuple(sorted(difficulties))),
+        lambda: _run_video_quizzes(youtube_url, target_lang, difficulties),
+    )
+    return copy.deepcopy(result) if coalesced else result
+
+
+def _run_video_quizzes(youtube_url, target_lang, difficulties):
+    clock_start = time.perf_counter()
+    with workspace_manager.workspace():
+        transcript, detected_lang, source = help_fn_get_youtube_transcript(youtube_url, target_lang)
+    transcript_timing = fn_stage_timing(clock_start, clock_start)
+
+    result = help_fn_build_quizzes(
+        transcript, detected_lang, target_lang, difficulties, clock_start=clock_start, transcript_source=source
+    )
+    result["timings"]["transcript"] = transcript_timing
+    return result
+
+
+def _fn_release_batch_item(future):
+    global _batch_pending
+    with _batch_lock:
+        _batch_pending -= 1
+
+
+def fn_submit_batch(urls, target_lang, difficulties):
+    """
+    Queues fn_run_video_quizzes for every video on the shared batch pool.
+
+    Args:
+        urls (List[str]): Video URLs.
+        target_lang (str): Target language.
+        difficulties (List[str]): Difficulties to generate for each video.
+
+    Returns:
+        dict: The submitted batch, to pass to fn_stream_batch.
+
+    Raises:
+        QueueFullError: If the videos would not fit in the pool and its queue.
+    """
+    global _batch_pending
+    with _batch_lock:
+        if _batch_pending + len(urls) > BATCH_VIDEO_CONCURRENCY + BATCH_QUEUE_DEPTH:
+            raise QueueFullError("Batch queue is full, please retry later.")
+        _batch_pending += len(urls)
+    futures = {}
+    for index, url in enumerate(urls):
+        future = _batch_pool.submit(fn_run_video_quizzes, url, target_lang, difficulties)
+        future.add_done_callback(_fn_release_batch_item)
+        futures[future] = (index, url)
+    return {"urls": urls, "difficulties": difficulties, "futures": futures}
+
+
+def fn_stream_batch(batch, emit):
+    """
+    Reports a batch queued by fn_submit_batch through `emit(event, data)`: a "batch"
+    event, one "item" (or "item_error") event per video as soon as it finishes, then "done".
+    """
+    urls, futures = batch["urls"], batch["futures"]
+    emit("batch", {"videos": urls, "difficulties": batch["difficulties"]})
+    failed = 0
+    for future in as_completed(futures):
+        index, url = futures[future]
+        item = {"index": index, "url": url, "video_id": fn_extract_video_id(url)}
+        try:
+            emit("item", dict(item, **future.result()))
+        except Exception as e:
+            failed += 1
+            print(f"Batch item {url} failed: {e}")
+            emit("item_error", dict(item, detail=str(e)))
+    emit("done", {"completed": len(urls) - failed, "failed": failed})
 
 
 
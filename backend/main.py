@@ -1,8 +1,25 @@
 # main.py
 
-from fastapi import FastAPI
+import os
+import threading
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from routes.quiz_generation_route import router
+from routes.job_route import router as job_router
+from utils.whisper_registry import whisper_registry, WHISPER_WARMUP_ON_STARTUP
+from utils.workers import fn_shutdown_pools, fn_start_process_pool
+from utils.workspace import workspace_manager
+from utils.metrics import fn_render_metrics, fn_format_server_timing, request_timings
+from utils.lazy import fn_loaded_modules
+from utils.transcription_queue import TRANSCRIPTION_BACKEND
+
+# Always add the Server-Timing header; otherwise only when the request sends "X-Timing: 1".
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "0") == "1"
+
+STARTED_AT = time.time()
 
 app = FastAPI()
 
@@ -15,5 +32,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def fn_add_server_timing(request: Request, call_next):
+    """
+    Collects the stage timings of this request and reports them in a Server-Timing header.
+    """
+    timings = {}
+    token = request_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    if timings and (SERVER_TIMING_HEADER or request.headers.get("x-timing") == "1"):
+        response.headers["Server-Timing"] = fn_format_server_timing(timings)
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def fn_metrics():
+    """
+    Exposes pipeline metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(fn_render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+def fn_health():
+    """
+    Liveness check that never imports Whisper, torch or yt-dlp; reports which
+    heavy modules and Whisper models this worker has loaded so far.
+    """
+    return {
+        "status": "ok",
+        "uptime_seconds": round(time.time() - STARTED_AT, 1),
+        "modules_loaded": fn_loaded_modules(),
+        "whisper_models": whisper_registry.loaded_models(),
+    }
+
+
 # Include the quiz generation router
 app.include_router(router)
+app.include_router(job_router)
+
+
+@app.on_event("startup")
+def fn_sweep_workspaces():
+    """
+    Removes scratch files left behind by crashed or restarted workers.
+    """
+    workspace_manager.sweep_orphans()
+
+
+@app.on_event("startup")
+def fn_warm_up_models():
+    """
+    Loads the configured Whisper models so the first request is not a cold start.
+    Runs in the background so the worker serves light endpoints and /health
+    right away. Disable with WHISPER_WARMUP_ON_STARTUP=0.
+    Skipped when transcription runs on separate workers (TRANSCRIPTION_BACKEND=queue).
+    With WHISPER_PROCESS_WORKERS the process pool is started instead and each of its
+    workers loads the models, so Whisper never loads into this process.
+    """
+    if not WHISPER_WARMUP_ON_STARTUP or TRANSCRIPTION_BACKEND == "queue":
+        return
+    if not fn_start_process_pool():
+        threading.Thread(target=whisper_registry.warm_up, name="whisper-warmup", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def fn_stop_workers():
+    fn_shutdown_pools()
+    workspace_manager.release_all()
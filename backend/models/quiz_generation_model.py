@@ -1,5 +1,5 @@
 #quiz_generation_model.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Literal, Optional, List, Dict
 from fastapi import Form
 
@@ -12,10 +12,63 @@ class QuizRequest(BaseModel):
     
 
 
+class QuizQuestion(BaseModel):
+    question: str = Field(min_length=1)
+    options: List[str] = Field(min_length=4, max_length=4)
+    correctAnswer: int  # 0-based index into options
+    explanation: str = "No explanation provided."
+
+    @field_validator("correctAnswer", mode="before")
+    @classmethod
+    def fn_letter_to_index(cls, value):
+        # Models sometimes answer with the option letter instead of its index.
+        if isinstance(value, str) and value.strip().upper() in ("A", "B", "C", "D"):
+            return "ABCD".index(value.strip().upper())
+        return value
+
+    @model_validator(mode="after")
+    def fn_check_answer_in_range(self):
+        if not 0 <= self.correctAnswer < len(self.options):
+            raise ValueError(f"correctAnswer {self.correctAnswer} is not an index of the {len(self.options)} options")
+        return self
+
 class QuizResponse(BaseModel):
     transcript: str
     summary: List[Dict[str, str]]
     quiz: List[Dict]
+    transcript_source: Optional[Literal["captions_manual", "captions_auto", "whisper"]] = None
+    timings: Optional[Dict[str, Dict[str, float]]] = None  # { "summary": { "start": 1.2, "end": 3.4, "duration": 2.2 } }
+    quiz_id: Optional[str] = None  # verify answers with /quizzes/{quiz_id}/verify instead of re-sending the quiz
+    artifact_id: Optional[str] = None  # regenerate with /artifacts/{artifact_id}/quiz without re-processing the video
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "completed", "failed"]
+    stage: Optional[str] = None
+    result: Optional[QuizResponse] = None
+    error: Optional[str] = None
+    partial_transcript: List[Dict] = []  # [{ "start": 0.0, "end": 4.2, "text": "..." }] while transcribing
+
+class BatchRequest(BaseModel):
+    urls: List[str] = []  # YouTube video URLs
+    playlist_url: Optional[str] = None  # expanded to its videos, after `urls`
+    difficulties: List[Literal["basic", "medium", "hard"]] = ["medium"]
+    target_lang: str = "en"
+
+class UploadForm(BaseModel):
+    """
+    Form fields sent with an uploaded video; the file itself is streamed separately.
+    """
+    target_lang: str = "en"
+    difficulty: Literal["basic", "medium", "hard"] = "medium"
+
+class RegenerateQuizRequest(BaseModel):
+    difficulty: Literal["basic", "medium", "hard"] = "medium"
+    target_lang: str = "en"  # a language not produced before is translated from the stored transcript
 
 class VerifyRequest(BaseModel):
     quiz: List[Dict]   # the original quiz returned
@@ -25,3 +78,16 @@ class VerifyRequest(BaseModel):
 class VerifyResponse(BaseModel):
     results: List[Dict[str, str]]  # [{ "question": "...", "your_answer": "...", "correct_answer": "...", "is_correct": True/False }]
     score: float
+
+
+class StoredVerifyRequest(BaseModel):
+    user_answers: Dict[str, int]  # {question_index: chosen_option}
+
+
+class Submission(BaseModel):
+    student_id: str
+    answers: List[Optional[int]]  # chosen option per question, null when unanswered
+
+
+class BulkVerifyRequest(BaseModel):
+    submissions: List[Submission]
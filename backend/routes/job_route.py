@@ -0,0 +1,86 @@
+#job_route.py
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from controllers.quiz_generation_controller import (
+    fn_run_youtube_pipeline,
+    fn_run_video_file_pipeline,
+)
+from routes.quiz_generation_route import fn_receive_upload_form
+from models.quiz_generation_model import JobSubmitResponse, JobStatusResponse
+from utils.jobs import job_manager, QueueFullError
+from utils.workspace import workspace_manager
+
+router = APIRouter(prefix="/jobs")
+
+SSE_POLL_INTERVAL_SECONDS = 0.5
+
+
+def _fn_submit(fn, *args, **kwargs):
+    try:
+        job_id = job_manager.submit(fn, *args, **kwargs)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+
+@router.post("/youtube_link/", response_model=JobSubmitResponse, status_code=202)
+async def fn_submit_youtube_job(youtube_url: str = Form(...), target_lang: str = Form("en"), difficulty: Literal["basic", "medium", "hard"] = Form("medium")):
+    """
+    Queues the YouTube pipeline and returns a job ID immediately.
+    """
+    return _fn_submit(fn_run_youtube_pipeline, youtube_url, target_lang, difficulty)
+
+
+@router.post("/upload_file/", response_model=JobSubmitResponse, status_code=202)
+async def fn_submit_upload_job(request: Request):
+    """
+    Queues the upload pipeline and returns a job ID as soon as the upload is received
+    (multipart fields `file`, `target_lang`, `difficulty`).
+    """
+    if job_manager.queue_depth() >= job_manager.max_workers + job_manager.max_queue:
+        raise HTTPException(status_code=429, detail="Job queue is full, please retry later.", headers={"Retry-After": "10"})
+
+    form, (workspace, video_path, digest) = await fn_receive_upload_form(request)
+    try:
+        return _fn_submit(fn_run_video_file_pipeline, video_path, digest, form.target_lang, form.difficulty, workspace=workspace)
+    except HTTPException:
+        workspace_manager.release(workspace)
+        raise
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def fn_get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatusResponse(**job)
+
+
+@router.get("/{job_id}/events")
+async def fn_stream_job_events(job_id: str):
+    """
+    Streams job status changes as Server-Sent Events until the job finishes.
+    """
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        last_version = -1
+        while True:
+            job = job_manager.get(job_id)
+            if job is None:
+                yield "event: error\ndata: {\"detail\": \"Job expired\"}\n\n"
+                return
+            if job["version"] != last_version:
+                last_version = job["version"]
+                payload = JobStatusResponse(**job).model_dump_json()
+                yield f"event: {job['status']}\ndata: {payload}\n\n"
+            if job["status"] in ("completed", "failed"):
+                return
+            await asyncio.sleep(SSE_POLL_INTERVAL_SECONDS)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -1,102 +1,281 @@
 #quiz_generation_route.py
-from fastapi import APIRouter, File, UploadFile, Form
+import asyncio
+
+from fastapi import APIRouter, Form, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import Literal
 from controllers.quiz_generation_controller import (
-    fn_download_youtube_video,
-    help_fn_extract_audio,
-    help_fn_transcribe_audio,
-    fn_translate_transcript,
-    help_fn_generate_quiz,
-    help_fn_generate_summary_groq,
+    fn_run_youtube_pipeline,
+    fn_run_video_file_pipeline,
+    fn_stream_youtube_pipeline,
+    fn_stream_video_file_pipeline,
+    fn_spool_upload,
+    fn_collect_batch_urls,
+    fn_submit_batch,
+    fn_stream_batch,
+    fn_regenerate_quiz,
     # fn_parse_quiz
 )
-from utils.processing import fn_verify_answers
-from models.quiz_generation_model import VerifyRequest
+from utils.processing import fn_verify_answers, fn_score_submissions, UploadTooLargeError
+from utils.quiz_store import fn_get_stored_quiz
+from utils.artifact_store import fn_get_artifacts
+from utils.upload_stream import fn_receive_upload, UploadFormError
+from utils.workspace import workspace_manager, WorkspaceQuotaError
+from utils.transcription_queue import TranscriptionError
+from utils.jobs import job_manager, QueueFullError
+from utils.events import fn_iter_events, fn_format_event
+from models.quiz_generation_model import VerifyRequest, BatchRequest, StoredVerifyRequest, BulkVerifyRequest, RegenerateQuizRequest, UploadForm
 
 from models.quiz_generation_model import QuizResponse
-import tempfile
-import os
 router = APIRouter()
 
+
+async def fn_receive_upload_form(request):
+    """
+    Spools the video of an upload form (fields `file`, `target_lang`, `difficulty`) into
+    a new workspace while the body arrives, see fn_receive_upload.
+
+    Returns:
+        Tuple[UploadForm, Tuple[Workspace, str, str]]: The form fields and what fn_spool_upload returned.
+    """
+    try:
+        return await fn_receive_upload(
+            request, fn_spool_upload, UploadForm, release=lambda spooled: workspace_manager.release(spooled[0])
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WorkspaceQuotaError as e:
+        raise HTTPException(status_code=507, detail=str(e), headers={"Retry-After": "30"})
+
+
+async def _fn_run_job(fn, *args, **kwargs):
+    # The pipelines are blocking (ffmpeg, Whisper, Groq): run them on the bounded job pool,
+    # not the shared threadpool that every other endpoint needs.
+    try:
+        future = job_manager.run(fn, *args, **kwargs)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+    return await asyncio.wrap_future(future)
+
+
 @router.post("/upload_file/", response_model=QuizResponse)
-async def fn_upload_file_(
-    file: UploadFile = File(...),
-    target_lang: str = Form("en"),
-    difficulty: Literal["basic", "medium", "hard"] = Form("medium")
-):
-    video_path, audio_path = None, None
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        temp_video.write(await file.read())
-        video_path = temp_video.name
-
-    audio_path = help_fn_extract_audio(video_path)
-    transcript, detected_lang = help_fn_transcribe_audio(audio_path)
-    final_transcript = fn_translate_transcript(transcript, detected_lang, target_lang)
-    summary = help_fn_generate_summary_groq(final_transcript)
-    quiz = help_fn_generate_quiz(final_transcript, summary, difficulty)
-
-    if video_path and os.path.exists(video_path):
-        os.unlink(video_path)
-    if audio_path and os.path.exists(audio_path):
-        os.unlink(audio_path)
-
-    return QuizResponse(
-        transcript=final_transcript,
-        summary=summary,
-        quiz=quiz
-    )
+async def fn_upload_file_(request: Request):
+    """
+    Generates a quiz from an uploaded video (multipart fields `file`, `target_lang`, `difficulty`).
+    """
+    if job_manager.queue_depth() >= job_manager.max_workers + job_manager.max_queue:
+        raise HTTPException(status_code=429, detail="Job queue is full, please retry later.", headers={"Retry-After": "10"})
+
+    form, (workspace, video_path, digest) = await fn_receive_upload_form(request)
+    try:
+        result = await _fn_run_job(
+            fn_run_video_file_pipeline, video_path, digest, form.target_lang, form.difficulty, workspace=workspace
+        )
+    except HTTPException:
+        workspace_manager.release(workspace)
+        raise
+    except WorkspaceQuotaError as e:
+        raise HTTPException(status_code=507, detail=str(e), headers={"Retry-After": "30"})
+    except TranscriptionError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return QuizResponse(**result)
             
             
             
 @router.post("/youtube_link/", response_model=QuizResponse)
 async def fn_youtube_link(youtube_url: str = Form(...), target_lang: str = Form("en"), difficulty: Literal["basic", "medium", "hard"] = Form("medium")):
-    audio_path = fn_download_youtube_video(youtube_url)
-    transcript, detected_lang = help_fn_transcribe_audio(audio_path)
-    final_transcript = fn_translate_transcript(transcript, detected_lang, target_lang)
-    summary = help_fn_generate_summary_groq(final_transcript)
-    quiz = help_fn_generate_quiz(final_transcript, summary, difficulty)
-
-    if audio_path and os.path.exists(audio_path):
-        os.unlink(audio_path)
-
-    return QuizResponse(
-        transcript=final_transcript,
-        summary=summary,
-        quiz=quiz
+    try:
+        result = await _fn_run_job(fn_run_youtube_pipeline, youtube_url, target_lang, difficulty)
+    except WorkspaceQuotaError as e:
+        raise HTTPException(status_code=507, detail=str(e), headers={"Retry-After": "30"})
+    except TranscriptionError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return QuizResponse(**result)
+
+def _fn_event_response(events, fmt):
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "text/event-stream"
+
+    async def body():
+        async for event, data in events:
+            yield fn_format_event(event, data, fmt)
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-@router.post("/verify_answers")
-async def verify_user_answers(request: VerifyRequest):
+
+@router.post("/youtube_link/stream")
+async def fn_stream_youtube_link(
+    youtube_url: str = Form(...),
+    target_lang: str = Form("en"),
+    difficulty: Literal["basic", "medium", "hard"] = Form("medium"),
+    format: Literal["sse", "ndjson"] = Query("sse"),
+):
     """
-    Verifies the user's answers against the original quiz.
-    Ensures the response matches frontend expectations.
+    Streams the YouTube pipeline as Server-Sent Events (or NDJSON with ?format=ndjson):
+    stage updates, each quiz question as soon as it is generated, the summary and
+    finally the complete QuizResponse as the "result" event.
+    """
+    events = fn_iter_events(fn_stream_youtube_pipeline, youtube_url, target_lang, difficulty)
+    return _fn_event_response(events, format)
+
+
+@router.post("/upload_file/stream")
+async def fn_stream_upload_file(request: Request, format: Literal["sse", "ndjson"] = Query("sse")):
     """
-    quiz = request.quiz
-    user_answers = request.user_answers or {}
+    Same as /youtube_link/stream for an uploaded video (multipart fields `file`, `target_lang`, `difficulty`).
+    The upload is spooled to disk first because the request body is closed once streaming starts.
+    """
+    form, (workspace, video_path, digest) = await fn_receive_upload_form(request)
+    events = fn_iter_events(
+        fn_stream_video_file_pipeline, video_path, digest, form.target_lang, form.difficulty, workspace=workspace
+    )
+    return _fn_event_response(events, format)
 
+
+@router.post("/batch")
+async def fn_batch(request: BatchRequest, format: Literal["sse", "ndjson"] = Query("sse")):
+    """
+    Generates quizzes for many videos and difficulties in one request.
+
+    Each video is transcribed and summarized once and gets one quiz per
+    difficulty. Results stream back as an "item" event per video, in the
+    order the videos finish, followed by a "done" event.
+    """
+    difficulties = list(dict.fromkeys(request.difficulties))
+    if not difficulties:
+        raise HTTPException(status_code=400, detail="At least one difficulty is required")
+    try:
+        urls = await run_in_threadpool(fn_collect_batch_urls, request.urls, request.playlist_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        batch = fn_submit_batch(urls, request.target_lang, difficulties)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+
+    events = fn_iter_events(fn_stream_batch, batch)
+    return _fn_event_response(events, format)
+
+
+def _fn_parse_user_answers(user_answers):
     # Convert keys to integers safely (frontend might send string keys)
     user_answers_int = {}
-    for k, v in user_answers.items():
+    for k, v in (user_answers or {}).items():
         try:
             user_answers_int[int(k)] = v
         except ValueError:
             continue  # skip invalid keys
+    return user_answers_int
+
+
+@router.post("/verify_answers")
+async def verify_user_answers(request: VerifyRequest):
+    """
+    Verifies the user's answers against the original quiz.
+    Ensures the response matches frontend expectations.
+    """
+    return fn_verify_answers(request.quiz, _fn_parse_user_answers(request.user_answers))
+
+
+def _fn_stored_quiz_or_404(quiz_id):
+    stored = fn_get_stored_quiz(quiz_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Quiz not found or expired")
+    return stored
 
-    # Use your existing utility function
-    results = fn_verify_answers(quiz, user_answers_int)
 
-    # Ensure details array is always present and complete
-    if "details" not in results or not isinstance(results["details"], list):
-        results["details"] = []
+@router.get("/artifacts/{artifact_id}")
+async def fn_get_artifacts_(artifact_id: str):
+    artifacts = fn_get_artifacts(artifact_id)
+    if artifacts is None:
+        raise HTTPException(status_code=404, detail="Artifacts not found or expired")
+    return {
+        "artifact_id": artifact_id,
+        "language": artifacts["language"],
+        "transcript_source": artifacts["transcript_source"],
+        "target_langs": sorted(artifacts["translations"]),
+    }
+
+
+@router.post("/artifacts/{artifact_id}/quiz", response_model=QuizResponse)
+async def fn_regenerate_quiz_(artifact_id: str, request: RegenerateQuizRequest):
+    """
+    Generates a quiz for another difficulty or language from the stored
+    transcript and summary of an earlier run, without touching the video.
+    """
+    result = await run_in_threadpool(fn_regenerate_quiz, artifact_id, request.target_lang, request.difficulty)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Artifacts not found or expired, generate the quiz from the video again")
+    return QuizResponse(**result)
+
+
+@router.get("/quizzes/{quiz_id}")
+async def fn_get_quiz(quiz_id: str):
+    return {"quiz_id": quiz_id, "quiz": _fn_stored_quiz_or_404(quiz_id)["quiz"]}
+
+
+@router.post("/quizzes/{quiz_id}/verify")
+async def fn_verify_stored_quiz(quiz_id: str, request: StoredVerifyRequest):
+    """
+    Same as /verify_answers for a stored quiz, without re-sending the quiz.
+    """
+    quiz = _fn_stored_quiz_or_404(quiz_id)["quiz"]
+    return fn_verify_answers(quiz, _fn_parse_user_answers(request.user_answers))
+
+
+@router.post("/quizzes/{quiz_id}/verify_bulk")
+async def fn_verify_bulk(quiz_id: str, request: BulkVerifyRequest):
+    """
+    Scores a whole class against a stored quiz in one vectorized pass.
+
+    Each submission lists the chosen option per question (null when unanswered).
+    Returns the score of every student and, per question, the percentage of
+    correct answers and how often each option was chosen.
+    """
+    stored = _fn_stored_quiz_or_404(quiz_id)
+    total = len(stored["answer_key"])
+    for submission in request.submissions:
+        if len(submission.answers) > total:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Submission of {submission.student_id} has {len(submission.answers)} answers, the quiz has {total} questions",
+            )
 
-    # Optional: Fill in missing explanations or answers if backend data is incomplete
-    for idx, detail in enumerate(results["details"]):
-        detail.setdefault("question", quiz[idx].get("question", f"Question {idx + 1}"))
-        detail.setdefault("userAnswer", None)
-        detail.setdefault("correctAnswer", quiz[idx]["options"][quiz[idx]["correctAnswer"]])
-        detail.setdefault("explanation", quiz[idx].get("explanation", "No explanation provided."))
-        detail.setdefault("isCorrect", False)
+    answers = [
+        [-1 if a is None else a for a in submission.answers] + [-1] * (total - len(submission.answers))
+        for submission in request.submissions
+    ]
+    scored = await run_in_threadpool(fn_score_submissions, stored["answer_key"], stored["option_counts"], answers)
 
-    return results
-    
\ No newline at end of file
+    students = [
+        {
+            "student_id": submission.student_id,
+            "score": int(score),
+            "percentage": round(int(score) / total * 100) if total else 0,
+        }
+        for submission, score in zip(request.submissions, scored["scores"])
+    ]
+    questions = [
+        {
+            "index": index,
+            "correctAnswer": stored["answer_key"][index],
+            "percentCorrect": round(float(scored["percent_correct"][index]), 1),
+            "optionCounts": scored["option_counts"][index][:stored["option_counts"][index]].tolist(),
+            "unanswered": int(scored["unanswered"][index]),
+        }
+        for index in range(total)
+    ]
+    return {
+        "quiz_id": quiz_id,
+        "total": total,
+        "students": students,
+        "questions": questions,
+        "meanScore": round(float(scored["scores"].mean()), 2) if students else 0,
+    }
@@ -0,0 +1,7 @@
+#conftest.py
+
+import os
+import tempfile
+
+# The caches open CACHE_DB_PATH when first used; point them at a throwaway database before any test imports them.
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="quiz-tests-"), "cache.sqlite3")
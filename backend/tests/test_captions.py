@@ -0,0 +1,65 @@
+#test_captions.py
+
+import pytest
+
+import controllers.quiz_generation_controller as controller
+
+
+class StubCaptionProvider:
+    """
+    Caption provider returning fixed captions (or None) and recording its calls.
+    """
+
+    def __init__(self, captions=None):
+        self.captions = captions
+        self.calls = []
+
+    def fetch(self, video_id, languages):
+        self.calls.append((video_id, languages))
+        return self.captions
+
+
+@pytest.fixture
+def whisper_calls(monkeypatch):
+    calls = []
+
+    def fake_transcribe(youtube_url, on_stage=None, on_segment=None):
+        calls.append(youtube_url)
+        return "transcribed by whisper", "en"
+
+    monkeypatch.setattr(controller, "help_fn_transcribe_youtube", fake_transcribe)
+    return calls
+
+
+def test_captions_are_used_without_transcribing(whisper_calls):
+    provider = StubCaptionProvider({"text": "caption text", "language": "fr", "source": "captions_manual"})
+
+    transcript, language, source = controller.help_fn_get_youtube_transcript(
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "fr", caption_provider=provider
+    )
+
+    assert (transcript, language, source) == ("caption text", "fr", "captions_manual")
+    assert provider.calls == [("dQw4w9WgXcQ", ["fr"])]
+    assert whisper_calls == []
+
+
+def test_missing_captions_fall_back_to_whisper(whisper_calls):
+    provider = StubCaptionProvider(None)
+
+    transcript, language, source = controller.help_fn_get_youtube_transcript(
+        "https://youtu.be/dQw4w9WgXcQ", "de", caption_provider=provider
+    )
+
+    assert (transcript, language, source) == ("transcribed by whisper", "en", "whisper")
+    assert provider.calls == [("dQw4w9WgXcQ", ["de"])]
+    assert whisper_calls == ["https://youtu.be/dQw4w9WgXcQ"]
+
+
+def test_urls_without_video_id_skip_captions(whisper_calls):
+    provider = StubCaptionProvider({"text": "unused", "language": "en", "source": "captions_auto"})
+
+    _, _, source = controller.help_fn_get_youtube_transcript("https://example.com/video", "en", caption_provider=provider)
+
+    assert source == "whisper"
+    assert provider.calls == []
+
@@ -0,0 +1,115 @@
+#test_llm_gateway.py
+
+import asyncio
+import json
+import threading
+import time
+import types
+
+import groq
+import pytest
+
+from benchmarks.fake_groq_server import FAKE_QUIZ, FAKE_SUMMARY, fn_start_fake_groq
+from utils.llm_gateway import LLMGateway, fn_parse_retry_delay
+
+SUMMARY_MESSAGES = [{"role": "system", "content": "Summarize the transcript."}, {"role": "user", "content": "text"}]
+QUIZ_MESSAGES = [{"role": "system", "content": "Write a quiz."}, {"role": "user", "content": "text"}]
+
+
+@pytest.fixture
+def fake_groq():
+    servers = []
+
+    def start(**kwargs):
+        server, url = fn_start_fake_groq(jitter=0.0, **kwargs)
+        servers.append(server)
+        return url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_complete_returns_response_and_records_usage(fake_groq):
+    gateway = LLMGateway(api_key="test", base_url=fake_groq(latency=0.0))
+
+    response = gateway.complete(QUIZ_MESSAGES, "fake-model")
+
+    assert json.loads(response.choices[0].message.content) == FAKE_QUIZ
+    stats = gateway.stats()
+    assert (stats["calls"], stats["errors"], stats["retries"]) == (1, 0, 0)
+    assert stats["completion_tokens"] > 0
+
+
+def test_rate_limited_calls_are_retried(fake_groq):
+    gateway = LLMGateway(api_key="test", base_url=fake_groq(latency=0.0, fail_first=2), max_retries=3)
+
+    response = gateway.complete(SUMMARY_MESSAGES, "fake-model")
+
+    assert json.loads(response.choices[0].message.content) == FAKE_SUMMARY
+    assert gateway.stats()["retries"] == 2
+
+
+def test_retries_give_up_after_max_retries(fake_groq):
+    gateway = LLMGateway(api_key="test", base_url=fake_groq(latency=0.0, error_rate=1.0), max_retries=2)
+
+    with pytest.raises(groq.RateLimitError):
+        gateway.complete(SUMMARY_MESSAGES, "fake-model")
+
+    stats = gateway.stats()
+    assert (stats["retries"], stats["errors"]) == (2, 1)
+
+
+def test_slow_responses_time_out_and_are_retried(fake_groq):
+    gateway = LLMGateway(api_key="test", base_url=fake_groq(latency=1.0), timeout=0.2, max_retries=1)
+
+    start = time.perf_counter()
+    with pytest.raises((groq.APITimeoutError, asyncio.TimeoutError)):
+        gateway.complete(SUMMARY_MESSAGES, "fake-model")
+
+    assert time.perf_counter() - start < 1.5
+    assert gateway.stats()["retries"] == 1
+
+
+def test_stream_yields_the_whole_completion(fake_groq):
+    gateway = LLMGateway(api_key="test", base_url=fake_groq(latency=0.1, fail_first=1), max_retries=1)
+
+    text = "".join(gateway.stream(QUIZ_MESSAGES, "fake-model"))
+
+    assert json.loads(text) == FAKE_QUIZ
+    assert gateway.stats()["retries"] == 1
+
+
+def test_backoff_does_not_hold_a_concurrency_slot():
+    gateway = LLMGateway(api_key="test", max_concurrency=1, max_retries=2)
+    gateway._ensure_started()
+
+    async def create(model, messages, **params):
+        if model == "failing":
+            raise asyncio.TimeoutError()
+        return types.SimpleNamespace(usage=None)
+
+    gateway._client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+    errors = []
+
+    def failing():
+        try:
+            gateway.complete(SUMMARY_MESSAGES, "failing")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=failing)
+    thread.start()
+    time.sleep(0.05)  # the failing call is now backing off
+    start = time.perf_counter()
+    gateway.complete(SUMMARY_MESSAGES, "healthy")
+    assert time.perf_counter() - start < 0.2
+    thread.join()
+    assert len(errors) == 1 and isinstance(errors[0], asyncio.TimeoutError)
+
+
+def test_parse_retry_delay():
+    assert fn_parse_retry_delay({"retry-after": "3"}) == 3.0
+    assert fn_parse_retry_delay({"x-ratelimit-reset-requests": "2m59.5s", "x-ratelimit-reset-tokens": "7.66s"}) == 179.5
+    assert fn_parse_retry_delay({}) is None
@@ -0,0 +1,80 @@
+#test_translation.py
+
+import threading
+import uuid
+
+from utils.translation import TRANSLATION_BATCH_CHARS, fn_batch_sentences, fn_translate_text
+
+
+class StubTranslator:
+    """
+    Offline translator that tags each batch with the target language and records the batches it saw.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def translate(self, text, source, target):
+        with self._lock:
+            self.batches.append(text)
+        return f"[{target}] {text}"
+
+
+def _sentences(count):
+    # A unique marker per call keeps the shared translation cache from answering across tests.
+    marker = uuid.uuid4().hex[:8]
+    return [f"Sentence {i} of {marker} talks about topic number {i}." for i in range(count)]
+
+
+def test_short_text_is_one_batch():
+    translator = StubTranslator()
+    text = " ".join(_sentences(3))
+
+    assert fn_translate_text(text, "en", "fr", backend=translator) == f"[fr] {text}"
+    assert translator.batches == [text]
+
+
+def test_long_text_is_split_at_sentences_and_reassembled_in_order():
+    translator = StubTranslator()
+    sentences = _sentences(400)
+    text = " ".join(sentences)
+
+    translated = fn_translate_text(text, "en", "de", backend=translator)
+
+    assert len(translator.batches) > 1
+    assert all(len(batch) <= TRANSLATION_BATCH_CHARS for batch in translator.batches)
+    batches = fn_batch_sentences(text)
+    assert sorted(translator.batches) == sorted(batches)
+    assert " ".join(batches) == text
+    assert translated == " ".join(f"[de] {batch}" for batch in batches)
+
+
+def test_overlong_sentence_is_cut_between_words():
+    sentence = " ".join(["word"] * 300)
+
+    batches = fn_batch_sentences(sentence, max_chars=100)
+
+    assert all(len(batch) <= 100 for batch in batches)
+    assert " ".join(batches).split() == sentence.split()
+
+
+def test_repeated_translations_are_served_from_the_cache():
+    translator = StubTranslator()
+    text = " ".join(_sentences(400))
+
+    first = fn_translate_text(text, "en", "es", backend=translator)
+    translated_batches = len(translator.batches)
+    second = fn_translate_text(text, "en", "es", backend=translator)
+
+    assert second == first
+    assert len(translator.batches) == translated_batches
+
+
+def test_cache_is_keyed_by_language_pair():
+    translator = StubTranslator()
+    text = " ".join(_sentences(2))
+
+    fn_translate_text(text, "en", "es", backend=translator)
+    assert fn_translate_text(text, "en", "it", backend=translator) == f"[it] {text}"
+    assert len(translator.batches) == 2
@@ -0,0 +1,130 @@
+#transcription_worker.py
+"""
+Transcription worker service.
+
+Runs Whisper outside the API processes: each worker process keeps its models
+warm, claims jobs from the SQLite transcription queue in priority order
+(short clips before long lectures) and decodes bursts of short clips in
+batches. Start it next to the API, with TRANSCRIPTION_BACKEND=queue set for
+both, from the backend directory:
+
+    python transcription_worker.py --workers-per-core 0.5
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import traceback
+
+import numpy as np
+
+from utils.processing import fn_transcribe_audio, fn_transcribe_batch, fn_transcribe_segments
+from utils.transcription_queue import TranscriptionQueue, TRANSCRIPTION_BATCH_SIZE, TRANSCRIPTION_POLL_SECONDS
+from utils.whisper_registry import whisper_registry, WHISPER_WARMUP_MODELS
+from utils.lazy import fn_lazy_import
+
+torch = fn_lazy_import("torch")
+
+# Worker processes per CPU core; each gets an equal share of the cores for torch's threads.
+TRANSCRIPTION_WORKERS_PER_CORE = float(os.getenv("TRANSCRIPTION_WORKERS_PER_CORE", "0.5"))
+
+
+def fn_worker_count(workers_per_core=TRANSCRIPTION_WORKERS_PER_CORE):
+    return max(1, round((os.cpu_count() or 1) * workers_per_core))
+
+
+def fn_process_jobs(queue, jobs):
+    """
+    Transcribes claimed jobs and stores their results.
+    Several jobs are only ever claimed together when they are short clips for the same model.
+    """
+    model_size = jobs[0]["model_size"]
+    try:
+        clips = [np.load(job["audio_path"]) for job in jobs]
+        if len(jobs) > 1:
+            for job, (text, language) in zip(jobs, fn_transcribe_batch(clips, model_size)):
+                queue.complete(job["job_id"], {"text": text, "language": language})
+        elif jobs[0]["kind"] == "segments":
+            queue.complete(jobs[0]["job_id"], fn_transcribe_segments(clips[0], model_size))
+        else:
+            text, language = fn_transcribe_audio(clips[0], model_size)
+            queue.complete(jobs[0]["job_id"], {"text": text, "language": language})
+    except Exception as e:
+        traceback.print_exc()
+        for job in jobs:
+            queue.fail(job["job_id"], repr(e))
+
+
+def fn_run_worker(model_sizes, threads, batch_size=TRANSCRIPTION_BATCH_SIZE):
+    """
+    Main loop of one worker process: warm the models, then claim and transcribe jobs until SIGTERM.
+    """
+    # Unique per process, so a restarted worker never renews the leases of the one it replaces.
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    torch.set_num_threads(threads)
+    whisper_registry.warm_up(model_sizes)
+    queue = TranscriptionQueue()
+    print(f"Transcription worker {worker_id} ready with {model_sizes} on {threads} threads")
+
+    def keep_leases():
+        while not stop.wait(queue.lease_seconds / 3):
+            queue.heartbeat(worker_id)
+
+    threading.Thread(target=keep_leases, name="transcription-heartbeat", daemon=True).start()
+
+    while not stop.is_set():
+        jobs = queue.claim(worker_id, batch_size=batch_size, model_sizes=model_sizes)
+        if not jobs:
+            stop.wait(TRANSCRIPTION_POLL_SECONDS)
+            continue
+        fn_process_jobs(queue, jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers-per-core", type=float, default=TRANSCRIPTION_WORKERS_PER_CORE)
+    parser.add_argument("--workers", type=int, help="Exact number of worker processes, overrides --workers-per-core")
+    parser.add_argument("--models", default=WHISPER_WARMUP_MODELS, help="Comma separated model sizes this service serves")
+    parser.add_argument("--batch-size", type=int, default=TRANSCRIPTION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    count = args.workers or fn_worker_count(args.workers_per_core)
+    threads = max(1, (os.cpu_count() or 1) // count)
+    model_sizes = [s.strip() for s in args.models.split(",") if s.strip()]
+    context = multiprocessing.get_context("spawn")
+
+    def start(index):
+        process = context.Process(
+            target=fn_run_worker, args=(model_sizes, threads, args.batch_size),
+            name=f"transcription-worker-{index}",
+        )
+        process.start()
+        return process
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    processes = [start(index) for index in range(count)]
+    print(f"Started {count} transcription workers")
+    while not stopping.wait(1):
+        # Replace crashed workers; their jobs return to the queue once the lease expires.
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                print(f"Transcription worker {index} exited with {process.exitcode}, restarting")
+                processes[index] = start(index)
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
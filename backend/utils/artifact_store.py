@@ -0,0 +1,59 @@
+#artifact_store.py
+
+import os
+import threading
+
+from utils.cache import SQLiteCache
+from utils.processing import fn_hash_text
+
+ARTIFACT_STORE_TTL_SECONDS = int(os.getenv("ARTIFACT_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+artifact_store = SQLiteCache("artifacts", ttl_seconds=ARTIFACT_STORE_TTL_SECONDS, max_bytes=ARTIFACT_STORE_MAX_BYTES)
+
+# Serializes read-modify-write of an entry within this process.
+_update_lock = threading.Lock()
+
+
+def fn_artifact_id(transcript, language):
+    """
+    Returns the artifact ID of a source transcript; every run over the same transcript shares it.
+    """
+    return fn_hash_text(f"{language}\n{transcript}")[:16]
+
+
+def fn_store_artifacts(transcript, language, target_lang, translation, summary, transcript_source=None):
+    """
+    Keeps the intermediate results of a pipeline run so later quizzes can start from them.
+
+    Args:
+        transcript (str): Transcript in the spoken language.
+        language (str): Detected spoken language.
+        target_lang (str): Language of `translation` and `summary`.
+        translation (str): Transcript translated to `target_lang`.
+        summary (List[Dict]): Summary generated from `translation`.
+        transcript_source (str, optional): Where the transcript came from (captions or whisper).
+
+    Returns:
+        str: The artifact ID.
+    """
+    artifact_id = fn_artifact_id(transcript, language)
+    with _update_lock:
+        entry = artifact_store.get(artifact_id) or {
+            "transcript": transcript,
+            "language": language,
+            "transcript_source": transcript_source,
+            "translations": {},
+        }
+        entry["transcript_source"] = transcript_source or entry["transcript_source"]
+        entry["translations"][target_lang] = {"transcript": translation, "summary": summary}
+        artifact_store.set(artifact_id, entry)
+    return artifact_id
+
+
+def fn_get_artifacts(artifact_id):
+    """
+    Returns {"transcript", "language", "transcript_source", "translations": {lang: {"transcript", "summary"}}},
+    or None if the ID is unknown or expired.
+    """
+    return artifact_store.get(artifact_id)
@@ -0,0 +1,300 @@
+#cache.py
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from utils.metrics import CallbackMetric
+
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(tempfile.gettempdir(), "youtube_quiz_cache.sqlite3"))
+TRANSCRIPT_CACHE_TTL_SECONDS = int(os.getenv("TRANSCRIPT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GENERATION_CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Number of distinct generations kept per key; repeat requests rotate between them.
+GENERATION_CACHE_VARIANTS = int(os.getenv("GENERATION_CACHE_VARIANTS", "1"))
+
+# A hit refreshes its entry's LRU timestamp at most this often, so most reads do not write.
+_ACCESS_TOUCH_SECONDS = 60
+# Expired entries are swept and the byte total is re-read from the table (other worker
+# processes write to it too) at most this often; in between the total is kept in memory.
+_MAINTENANCE_SECONDS = 60
+
+
+_caches = []
+
+
+class SQLiteCache:
+    """
+    Small persistent key/value store backed by one SQLite table.
+
+    Values are stored as JSON. Entries expire after `ttl_seconds` and the
+    least recently used ones are evicted once the table grows past
+    `max_bytes`. Hit and miss counters are kept per process. Listeners
+    registered with `add_removal_listener` learn which keys were dropped.
+    """
+
+    def __init__(self, table, db_path=CACHE_DB_PATH, ttl_seconds=None, max_bytes=None):
+        self.table = table
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = None
+        self._maintained_at = 0
+        self._removal_listeners = []
+        _caches.append(self)
+
+    def add_removal_listener(self, listener):
+        """
+        Registers `listener(keys)`, called with the keys this process removed (expired,
+        evicted or deleted) once the removal is committed, so data kept elsewhere
+        for those keys can be dropped with them.
+        """
+        self._removal_listeners.append(listener)
+
+    def _notify_removed(self, keys):
+        if not keys:
+            return
+        for listener in self._removal_listeners:
+            try:
+                listener(keys)
+            except Exception as e:
+                print(f"Cache removal listener failed for {self.table}: {e!r}")
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                f"SELECT value, created_at, accessed_at, size FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+            expired = row is not None and bool(self.ttl_seconds) and now - row[1] > self.ttl_seconds
+            if row is None or expired:
+                if expired:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    conn.commit()
+                    self._add_bytes(-row[3])
+                self.misses += 1
+            else:
+                if now - row[2] > _ACCESS_TOUCH_SECONDS:
+                    conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                self.hits += 1
+
+        if expired:
+            self._notify_removed([key])
+        if row is None or expired:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Stores `value` under `key` and evicts old entries if needed.
+        """
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            old = conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                f"""INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?)""",
+                (key, payload, len(payload), now, now),
+            )
+            self._add_bytes(len(payload) - (old[0] if old else 0))
+            removed = self._evict(conn, now)
+            conn.commit()
+        self._notify_removed(removed)
+
+    def delete(self, key):
+        with self._lock:
+            conn = self._connection()
+            old = conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            conn.commit()
+            if old:
+                self._add_bytes(-old[0])
+        self._notify_removed([key] if old else [])
+
+    def _add_bytes(self, delta):
+        if self._total_bytes is not None:
+            self._total_bytes += delta
+
+    def _evict(self, conn, now):
+        """
+        Returns the keys removed by the TTL sweep and the LRU eviction.
+        """
+        removed = []
+        # Both the TTL sweep and the SUM scan the whole table, so they run at most every _MAINTENANCE_SECONDS.
+        if self._total_bytes is None or now - self._maintained_at >= _MAINTENANCE_SECONDS:
+            if self.ttl_seconds:
+                cutoff = now - self.ttl_seconds
+                removed = [row[0] for row in conn.execute(f"SELECT key FROM {self.table} WHERE created_at < ?", (cutoff,))]
+                conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (cutoff,))
+            self._total_bytes = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            self._maintained_at = now
+
+        if not self.max_bytes or self._total_bytes <= self.max_bytes:
+            return removed
+
+        # Walk from least to most recently used until we are back under budget.
+        for key, size in conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC"
+        ).fetchall():
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            removed.append(key)
+            self._total_bytes -= size
+            if self._total_bytes <= self.max_bytes:
+                break
+        return removed
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current number of entries.
+        """
+        with self._lock:
+            entries, size = self._connection().execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+def _fn_cache_request_counts():
+    counts = {}
+    for cache in _caches:
+        counts[(cache.table, "hit")] = cache.hits
+        counts[(cache.table, "miss")] = cache.misses
+    return counts
+
+
+CallbackMetric(
+    "cache_requests_total", "Cache lookups by cache and result.",
+    _fn_cache_request_counts, kind="counter", labelnames=["cache", "result"],
+)
+
+
+class GenerationCache(SQLiteCache):
+    """
+    Cache of LLM generations that keeps up to `variants` results per key.
+
+    Until a key has collected all its variants every request generates a new
+    one; after that requests rotate between the stored variants so repeat
+    callers still see varied output. The rotation position is kept per process,
+    so serving a stored variant never writes to the database. New variants are
+    appended in one write transaction, so concurrent misses in other threads or
+    processes never overwrite each other's variants.
+    """
+
+    def __init__(self, table, variants=GENERATION_CACHE_VARIANTS, **kwargs):
+        super().__init__(table, **kwargs)
+        self.variants = max(1, variants)
+        self._next = {}
+
+    def get_or_generate(self, key, generate):
+        """
+        Returns a cached generation for `key` or calls `generate()` to create one.
+
+        Empty generations (failed or unparseable model output) are not stored.
+        """
+        entry = self.get(key) or {"variants": []}
+
+        if len(entry["variants"]) >= self.variants:
+            if self.variants == 1:
+                return entry["variants"][0]
+            with self._lock:
+                if len(self._next) > 10000 and key not in self._next:
+                    self._next.clear()  # only a rotation position is lost
+                index = self._next.get(key, 0) % len(entry["variants"])
+                self._next[key] = index + 1
+            return entry["variants"][index]
+
+        result = generate()
+        if result:
+            self._append_variant(key, result)
+        return result
+
+    def _append_variant(self, key, result):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            # Read, append and write under SQLite's write lock, taken up front so no other writer interleaves.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    f"SELECT value, size, created_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                fresh = row is not None and not (self.ttl_seconds and now - row[2] > self.ttl_seconds)
+                entry = json.loads(row[0]) if fresh else {"variants": []}
+                if len(entry["variants"]) >= self.variants:
+                    conn.rollback()
+                    return
+                entry["variants"].append(result)
+                payload = json.dumps(entry)
+                conn.execute(
+                    f"""INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at)
+                        VALUES (?, ?, ?, ?, ?)""",
+                    (key, payload, len(payload), now, now),
+                )
+                self._add_bytes(len(payload) - (row[1] if row else 0))
+                removed = self._evict(conn, now)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        self._notify_removed(removed)
+
+
+def fn_generation_cache_key(kind, transcript_digest, template_version, model, language, difficulty=""):
+    return f"{kind}:{template_version}:{model}:{transcript_digest}:{language}:{difficulty}"
+
+
+transcript_cache = SQLiteCache(
+    "transcripts",
+    ttl_seconds=TRANSCRIPT_CACHE_TTL_SECONDS,
+    max_bytes=TRANSCRIPT_CACHE_MAX_BYTES,
+)
+
+
+def fn_youtube_cache_key(video_id, model_size):
+    return f"youtube:{video_id}:{model_size}"
+
+
+def fn_upload_cache_key(digest, model_size):
+    return f"upload:{digest}:{model_size}"
+
+
+generation_cache = GenerationCache(
+    "generations",
+    ttl_seconds=GENERATION_CACHE_TTL_SECONDS,
+    max_bytes=GENERATION_CACHE_MAX_BYTES,
+)
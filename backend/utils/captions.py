@@ -0,0 +1,55 @@
+#captions.py
+
+import os
+
+from utils.lazy import fn_lazy_import
+
+youtube_transcript_api = fn_lazy_import("youtube_transcript_api")
+
+YOUTUBE_CAPTIONS_ENABLED = os.getenv("YOUTUBE_CAPTIONS_ENABLED", "1") == "1"
+
+
+class YouTubeCaptionProvider:
+    """
+    Fetches existing YouTube captions, preferring manual over auto-generated ones.
+
+    Any object with the same `fetch(video_id, languages)` method can be passed
+    to the controller instead, e.g. a stub in tests.
+    """
+
+    def fetch(self, video_id, languages):
+        """
+        Returns the captions of a video in one of the given languages.
+
+        Args:
+            video_id (str): The YouTube video ID.
+            languages (List[str]): Acceptable language codes, in order of preference.
+
+        Returns:
+            Dict | None: {"text", "language", "source"} where source is
+            "captions_manual" or "captions_auto", or None if no captions exist.
+        """
+        try:
+            transcript_list = youtube_transcript_api.YouTubeTranscriptApi().list(video_id)
+        except Exception as e:
+            print(f"No captions available for {video_id}: {e}")
+            return None
+
+        for source, finder in (
+            ("captions_manual", transcript_list.find_manually_created_transcript),
+            ("captions_auto", transcript_list.find_generated_transcript),
+        ):
+            try:
+                transcript = finder(languages)
+                fetched = transcript.fetch()
+            except Exception:
+                continue
+
+            text = " ".join(snippet.text.replace("\n", " ").strip() for snippet in fetched).strip()
+            if text:
+                return {"text": text, "language": transcript.language_code, "source": source}
+
+        return None
+
+
+caption_provider = YouTubeCaptionProvider()
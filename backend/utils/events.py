@@ -0,0 +1,51 @@
+#events.py
+
+import asyncio
+import json
+import threading
+import traceback
+
+
+async def fn_iter_events(fn, *args, **kwargs):
+    """
+    Runs `fn(*args, emit=..., **kwargs)` on a background thread and yields the
+    (event, data) pairs it emits, in order.
+
+    The events are handed to the event loop with call_soon_threadsafe, so an
+    open stream waits on an asyncio.Queue and never holds a threadpool thread.
+    An exception raised by `fn` ends the stream with an ("error", {"detail": ...}) event.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    end = object()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(events.put_nowait, item)
+        except RuntimeError:
+            pass  # the loop is closed (server shutting down); nobody is listening any more
+
+    def run():
+        try:
+            fn(*args, emit=lambda event, data: put((event, data)), **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            put(("error", {"detail": str(e)}))
+        finally:
+            put(end)
+
+    threading.Thread(target=run, name="event-stream", daemon=True).start()
+    while True:
+        item = await events.get()
+        if item is end:
+            return
+        yield item
+
+
+def fn_format_event(event, data, fmt="sse"):
+    """
+    Serializes one event as a Server-Sent Event or as an NDJSON line.
+    """
+    if fmt == "ndjson":
+        return json.dumps({"event": event, "data": data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
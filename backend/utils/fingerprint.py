@@ -0,0 +1,281 @@
+#fingerprint.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter as VoteCounter
+
+import numpy as np
+
+from utils.cache import CACHE_DB_PATH, TRANSCRIPT_CACHE_TTL_SECONDS, transcript_cache
+from utils.metrics import Counter
+
+AUDIO_FINGERPRINT_ENABLED = os.getenv("AUDIO_FINGERPRINT_ENABLED", "1") == "1"
+# Largest fraction of differing fingerprint bits for two recordings to count as the same audio.
+# Re-encoded copies stay below ~0.3, unrelated audio sits around 0.5 (see benchmarks/bench_fingerprint.py).
+AUDIO_FINGERPRINT_MAX_BER = float(os.getenv("AUDIO_FINGERPRINT_MAX_BER", "0.35"))
+# Share of each recording the aligned overlap must cover, so a short excerpt never reuses a long lecture's transcript.
+AUDIO_FINGERPRINT_MIN_COVERAGE = float(os.getenv("AUDIO_FINGERPRINT_MIN_COVERAGE", "0.9"))
+
+# 256 ms frames every 64 ms; the overlap keeps the hash stable when a trim shifts the frame grid.
+FINGERPRINT_FRAME_SAMPLES = 4096
+FINGERPRINT_HOP_SAMPLES = 1024
+# 17 log-spaced bands between 300 Hz and 2 kHz, where speech energy is, give 16 bits per frame.
+FINGERPRINT_BAND_EDGES_HZ = np.geomspace(300, 2000, 18)
+# Only every 4th frame goes into the lookup index; the query side uses all frames.
+FINGERPRINT_INDEX_STRIDE = 4
+# Query frames looked up in the index, spread evenly over the recording.
+FINGERPRINT_QUERY_FRAMES = 512
+FINGERPRINT_MIN_VOTES = 3
+FINGERPRINT_MAX_CANDIDATES = 5
+# Frames quieter than this, relative to the recording's loud frames (95th percentile), hash noise or
+# all-zero bits; they are never indexed and never compared.
+FINGERPRINT_SILENCE_DB = -40
+# Frames audible in both recordings needed to compare them (about 10 s), and the share of frames
+# audible in either recording that must be audible in both, so matching silence never counts.
+FINGERPRINT_MIN_VOICED_FRAMES = 150
+FINGERPRINT_MIN_VOICED_AGREEMENT = 0.8
+# Fingerprints older than their transcripts' TTL are swept at most this often, in case a removal was missed.
+_PRUNE_SECONDS = 3600
+# Frames processed per FFT block, to bound memory on long recordings.
+_FFT_BLOCK_FRAMES = 2048
+
+fingerprint_lookups = Counter(
+    "audio_fingerprint_lookups_total", "Upload fingerprint lookups by result.", ["result"]
+)
+
+_BIT_COUNTS = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+
+def fn_audio_fingerprint(samples, sample_rate=16000):
+    """
+    Computes a spectral hash of mono audio, one 16-bit value per 64 ms.
+
+    Each bit tells whether the energy difference between two neighbouring
+    bands grew or shrank since the previous frame, which survives
+    re-encoding, volume changes and added noise (Haitsma & Kalker).
+
+    Args:
+        samples (np.ndarray): Mono float32 samples.
+        sample_rate (int): Sample rate of `samples`.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: uint16 hashes, about 110 KB per hour of audio, and a
+            boolean mask of the hashes computed from audible frames.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    n_frames = 1 + (len(samples) - FINGERPRINT_FRAME_SAMPLES) // FINGERPRINT_HOP_SAMPLES
+    if n_frames < 2:
+        return np.zeros(0, dtype=np.uint16), np.zeros(0, dtype=bool)
+
+    # (FFT bin, band) matrix summing the power of each band's bins.
+    frequencies = np.fft.rfftfreq(FINGERPRINT_FRAME_SAMPLES, 1 / sample_rate)
+    band_of_bin = np.digitize(frequencies, FINGERPRINT_BAND_EDGES_HZ) - 1
+    n_bands = len(FINGERPRINT_BAND_EDGES_HZ) - 1
+    band_matrix = (band_of_bin[:, None] == np.arange(n_bands)[None, :]).astype(np.float32)
+    window = np.hanning(FINGERPRINT_FRAME_SAMPLES).astype(np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FINGERPRINT_FRAME_SAMPLES)[::FINGERPRINT_HOP_SAMPLES]
+
+    energy = np.concatenate([
+        (np.abs(np.fft.rfft(frames[start:start + _FFT_BLOCK_FRAMES] * window, axis=1)) ** 2) @ band_matrix
+        for start in range(0, n_frames, _FFT_BLOCK_FRAMES)
+    ])
+
+    band_diff = energy[:, :-1] - energy[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    weights = (1 << np.arange(bits.shape[1], dtype=np.uint32)).astype(np.uint32)
+
+    # Each hash compares two frames, so both must be audible.
+    loudness = energy.sum(axis=1)
+    floor = max(float(np.percentile(loudness, 95)) * 10 ** (FINGERPRINT_SILENCE_DB / 10), 1e-10)
+    audible = loudness > floor
+    return (bits.astype(np.uint32) @ weights).astype(np.uint16), audible[1:] & audible[:-1]
+
+
+def fn_bit_error_rate(a, b):
+    """
+    Returns the fraction of differing bits between two aligned fingerprints of equal length.
+    """
+    if len(a) == 0:
+        return 1.0
+    return float(_BIT_COUNTS[np.bitwise_xor(a, b)].sum()) / (16 * len(a))
+
+
+class FingerprintIndex:
+    """
+    SQLite index from audio fingerprints to transcript cache keys.
+
+    Every FINGERPRINT_INDEX_STRIDE-th audible hash of a stored recording goes
+    into an inverted index. A lookup lets a sample of the query's audible
+    hashes vote for (recording, time offset) pairs, then compares the best
+    candidates over their whole aligned overlap and accepts the closest one
+    within `max_ber` that covers at least `min_coverage` of both recordings.
+    Only frames audible in both recordings are compared, so long pauses
+    neither match nor dilute the bit error rate.
+
+    Fingerprints are deleted together with their transcript cache entries, and
+    any older than `ttl_seconds` are swept while adding new ones.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, max_ber=AUDIO_FINGERPRINT_MAX_BER,
+                 min_coverage=AUDIO_FINGERPRINT_MIN_COVERAGE, ttl_seconds=TRANSCRIPT_CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.max_ber = max_ber
+        self.min_coverage = min_coverage
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pruned_at = 0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS audio_fingerprints (
+                    fingerprint_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cache_key TEXT NOT NULL,
+                    model_size TEXT NOT NULL,
+                    hashes BLOB NOT NULL,
+                    voiced BLOB,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            if "voiced" not in [row[1] for row in self._conn.execute("PRAGMA table_info(audio_fingerprints)")]:
+                # Fingerprints stored before silence was masked have no mask and are no longer matched.
+                self._conn.execute("ALTER TABLE audio_fingerprints ADD COLUMN voiced BLOB")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS audio_fingerprint_hashes (
+                    hash INTEGER NOT NULL,
+                    fingerprint_id INTEGER NOT NULL,
+                    frame INTEGER NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS audio_fingerprint_hashes_hash ON audio_fingerprint_hashes (hash)"
+            )
+            # Pruning deletes hashes by recording; without this index every delete scans all of them.
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS audio_fingerprint_hashes_fingerprint ON audio_fingerprint_hashes (fingerprint_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS audio_fingerprints_cache_key ON audio_fingerprints (cache_key)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def add(self, hashes, voiced, cache_key, model_size):
+        """
+        Stores the fingerprint of a transcribed recording under its transcript cache key.
+        Recordings with less than FINGERPRINT_MIN_VOICED_FRAMES audible frames could never match and are skipped.
+        """
+        if np.count_nonzero(voiced) < FINGERPRINT_MIN_VOICED_FRAMES:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            if self.ttl_seconds and now - self._pruned_at >= _PRUNE_SECONDS:
+                stale = "SELECT fingerprint_id FROM audio_fingerprints WHERE created_at < ?"
+                conn.execute(f"DELETE FROM audio_fingerprint_hashes WHERE fingerprint_id IN ({stale})", (now - self.ttl_seconds,))
+                conn.execute("DELETE FROM audio_fingerprints WHERE created_at < ?", (now - self.ttl_seconds,))
+                self._pruned_at = now
+            cursor = conn.execute(
+                """INSERT INTO audio_fingerprints (cache_key, model_size, hashes, voiced, created_at)
+                    VALUES (?, ?, ?, ?, ?)""",
+                (cache_key, model_size, hashes.astype("<u2").tobytes(), np.packbits(voiced).tobytes(), now),
+            )
+            frames = np.flatnonzero(voiced[::FINGERPRINT_INDEX_STRIDE]) * FINGERPRINT_INDEX_STRIDE
+            conn.executemany(
+                "INSERT INTO audio_fingerprint_hashes (hash, fingerprint_id, frame) VALUES (?, ?, ?)",
+                [(int(hashes[frame]), cursor.lastrowid, int(frame)) for frame in frames],
+            )
+            conn.commit()
+
+    def lookup(self, hashes, voiced, model_size):
+        """
+        Returns the best matching stored recording, or None.
+
+        Returns:
+            Dict | None: {"cache_key", "bit_error_rate", "offset_seconds"} of the match.
+        """
+        audible = np.flatnonzero(voiced)
+        if len(audible) < FINGERPRINT_MIN_VOICED_FRAMES:
+            return None
+        query = {}
+        for frame in audible[::max(1, len(audible) // FINGERPRINT_QUERY_FRAMES)]:
+            query.setdefault(int(hashes[frame]), []).append(int(frame))
+
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                f"""SELECT h.hash, h.fingerprint_id, h.frame FROM audio_fingerprint_hashes h
+                    JOIN audio_fingerprints f ON f.fingerprint_id = h.fingerprint_id
+                    WHERE f.model_size = ? AND f.voiced IS NOT NULL AND h.hash IN ({', '.join('?' * len(query))})""",
+                [model_size, *query],
+            ).fetchall()
+
+            # A stored frame s matching query frame q votes for "query starts at s - q in the stored recording".
+            votes = VoteCounter()
+            for value, fingerprint_id, frame in rows:
+                for query_frame in query[value]:
+                    votes[(fingerprint_id, frame - query_frame)] += 1
+            candidates = [key for key, count in votes.most_common(FINGERPRINT_MAX_CANDIDATES) if count >= FINGERPRINT_MIN_VOTES]
+
+            best = None
+            for fingerprint_id, offset in candidates:
+                cache_key, blob, voiced_blob = conn.execute(
+                    "SELECT cache_key, hashes, voiced FROM audio_fingerprints WHERE fingerprint_id = ?",
+                    (fingerprint_id,),
+                ).fetchone()
+                stored = np.frombuffer(blob, dtype="<u2")
+                stored_voiced = np.unpackbits(np.frombuffer(voiced_blob, dtype=np.uint8), count=len(stored)).astype(bool)
+                ber = self._aligned_ber(hashes, voiced, stored, stored_voiced, offset)
+                if ber is not None and ber <= self.max_ber and (best is None or ber < best["bit_error_rate"]):
+                    best = {
+                        "cache_key": cache_key,
+                        "bit_error_rate": ber,
+                        "offset_seconds": offset * FINGERPRINT_HOP_SAMPLES / 16000,
+                    }
+        return best
+
+    def _aligned_ber(self, query, query_voiced, stored, stored_voiced, offset):
+        # The query's frame 0 lines up with the stored frame `offset`; the vote may be a frame off.
+        best = None
+        for shift in (offset - 1, offset, offset + 1):
+            start_q, start_s = max(0, -shift), max(0, shift)
+            overlap = min(len(query) - start_q, len(stored) - start_s)
+            if overlap <= 0 or overlap < self.min_coverage * max(len(query), len(stored)):
+                continue
+            q_voiced = query_voiced[start_q:start_q + overlap]
+            s_voiced = stored_voiced[start_s:start_s + overlap]
+            both = q_voiced & s_voiced
+            n_both = np.count_nonzero(both)
+            if n_both < FINGERPRINT_MIN_VOICED_FRAMES or n_both < FINGERPRINT_MIN_VOICED_AGREEMENT * np.count_nonzero(q_voiced | s_voiced):
+                continue
+            ber = fn_bit_error_rate(query[start_q:start_q + overlap][both], stored[start_s:start_s + overlap][both])
+            best = ber if best is None else min(best, ber)
+        return best
+
+    def delete(self, cache_key):
+        self.delete_many([cache_key])
+
+    def delete_many(self, cache_keys):
+        """
+        Deletes the fingerprints stored under any of `cache_keys`.
+        """
+        with self._lock:
+            conn = self._connection()
+            keys = [(cache_key,) for cache_key in cache_keys]
+            conn.executemany(
+                """DELETE FROM audio_fingerprint_hashes WHERE fingerprint_id IN
+                    (SELECT fingerprint_id FROM audio_fingerprints WHERE cache_key = ?)""",
+                keys,
+            )
+            conn.executemany("DELETE FROM audio_fingerprints WHERE cache_key = ?", keys)
+            conn.commit()
+
+
+fingerprint_index = FingerprintIndex()
+# A fingerprint is only useful while its transcript is cached.
+transcript_cache.add_removal_listener(fingerprint_index.delete_many)
@@ -0,0 +1,152 @@
+#jobs.py
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import CallbackMetric
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "20"))
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when a job is submitted while every worker is busy and the queue is full.
+    """
+
+
+class JobManager:
+    """
+    Runs pipeline jobs on a bounded thread pool and keeps their status in memory.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more may wait.
+    Each job function receives an `on_stage` callback used to report progress
+    and an `on_segment` callback that appends partial transcript segments.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_queue=JOB_QUEUE_DEPTH, result_ttl=JOB_RESULT_TTL_SECONDS):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quiz-job")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues `fn(*args, on_stage=..., on_segment=..., **kwargs)` and returns the new job ID.
+
+        Raises:
+            QueueFullError: If the queue is already at capacity.
+        """
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_workers + self.max_queue:
+                raise QueueFullError("Job queue is full, please retry later.")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "stage": None,
+                "result": None,
+                "error": None,
+                "partial_transcript": [],
+                "created_at": time.time(),
+                "updated_at": time.time(),
+                "version": 0,
+            }
+            self._pending += 1
+
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Queues `fn(*args, **kwargs)` on the same bounded pool without keeping a job record,
+        for requests that wait for the result themselves.
+
+        Returns:
+            Future: Resolves to the return value of `fn`.
+
+        Raises:
+            QueueFullError: If the queue is already at capacity.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise QueueFullError("Job queue is full, please retry later.")
+            self._pending += 1
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="running")
+        try:
+            result = fn(
+                *args,
+                on_stage=lambda stage: self._update(job_id, stage=stage),
+                on_segment=lambda segments: self._append_segments(job_id, segments),
+                **kwargs
+            )
+            self._update(job_id, status="completed", stage=None, result=result)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            self._release()
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated_at"] = time.time()
+            job["version"] += 1
+
+    def _append_segments(self, job_id, segments):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["partial_transcript"] = job["partial_transcript"] + list(segments)
+            job["updated_at"] = time.time()
+            job["version"] += 1
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [
+            j["job_id"] for j in self._jobs.values()
+            if j["status"] in ("completed", "failed") and j["updated_at"] < cutoff
+        ]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Returns a snapshot of the job, or None if the ID is unknown or expired.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def queue_depth(self):
+        """
+        Returns the number of queued plus running jobs.
+        """
+        with self._lock:
+            return self._pending
+
+
+job_manager = JobManager()
+
+CallbackMetric("job_queue_depth", "Pipeline jobs queued or running.", job_manager.queue_depth)
@@ -0,0 +1,138 @@
+#json_stream.py
+
+import json
+import re
+
+# A comma directly before a closing brace or bracket, which JSON does not allow.
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class JSONArrayStreamParser:
+    """
+    Incrementally extracts the objects of a JSON array from streamed text.
+
+    Feed the model output piece by piece; every top-level object of the first
+    array containing objects is returned as soon as its closing brace arrives.
+    Text around the array (markdown fences, prose, bracketed notes) is ignored,
+    as are `//` comments outside strings, and trailing commas are dropped.
+    Objects that still fail to parse are skipped and counted in `skipped`.
+    """
+
+    def __init__(self):
+        self._in_array = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_comment = False
+        self._pending_slash = False
+        self._current = []
+        self._found = 0
+        self.skipped = 0
+
+    def feed(self, text):
+        """
+        Consumes the next piece of text.
+
+        Returns:
+            List[Dict]: The objects completed by this piece, in order.
+        """
+        completed = []
+        for char in text:
+            if self._finished:
+                break
+            if not self._in_array:
+                self._in_array = char == "["
+                continue
+            obj = self._consume(char)
+            if obj is not None:
+                completed.append(obj)
+        return completed
+
+    def _consume(self, char):
+        if self._in_comment:
+            if char == "\n":
+                self._in_comment = False
+            return None
+
+        if self._in_string:
+            self._current.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            return None
+
+        if self._pending_slash:
+            self._pending_slash = False
+            if char == "/":
+                self._in_comment = True
+                return None
+            if self._depth:
+                self._current.append("/")
+
+        if char == "/":
+            self._pending_slash = True
+            return None
+
+        if self._depth == 0:
+            if char == "{":
+                self._depth = 1
+                self._current = ["{"]
+            elif char == "]":
+                # An array without objects (e.g. "[1]" in prose) is not the one we want.
+                self._finished = self._found > 0
+                self._in_array = self._finished
+            return None
+
+        self._current.append(char)
+        if char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                return self._parse("".join(self._current))
+        return None
+
+    def _parse(self, text):
+        self._current = []
+        self._found += 1
+        for candidate in (text, _fn_strip_trailing_commas(text)):
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                pass
+        self.skipped += 1
+        print("Could not parse JSON object from model output:\n", text)
+        return None
+
+    @property
+    def finished(self):
+        return self._finished
+
+
+def _fn_strip_trailing_commas(text):
+    # Only touch text outside strings.
+    parts = re.split(r'("(?:\\.|[^"\\])*")', text)
+    return "".join(part if i % 2 else _TRAILING_COMMA.sub(r"\1", part) for i, part in enumerate(parts))
+
+
+def fn_extract_json_array(text):
+    """
+    Returns the objects of the JSON array found in noisy model output.
+
+    Tolerates markdown fences, surrounding prose, `//` comments and trailing
+    commas; objects that cannot be parsed are left out.
+
+    Args:
+        text (str): Raw model output.
+
+    Returns:
+        List[Dict]: The parsed objects, possibly empty.
+    """
+    parser = JSONArrayStreamParser()
+    return [obj for obj in parser.feed(text) if isinstance(obj, dict)]
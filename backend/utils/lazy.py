@@ -0,0 +1,62 @@
+#lazy.py
+
+import importlib
+import sys
+import threading
+import types
+
+_lazy_modules = {}
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a heavy module that is only imported on first attribute access.
+
+    Setting an attribute (e.g. to swap in a stub) imports the real module and
+    sets it there, so patches behave as they would on a normal import.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_lazy_name"])
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    @property
+    def loaded(self):
+        return self.__dict__["_lazy_name"] in sys.modules
+
+
+def fn_lazy_import(name):
+    """
+    Returns a LazyModule for `name`, shared by every caller.
+    """
+    if name not in _lazy_modules:
+        _lazy_modules[name] = LazyModule(name)
+    return _lazy_modules[name]
+
+
+def fn_loaded_modules():
+    """
+    Returns {module name: imported yet} for every lazily imported module.
+    """
+    return {name: name in sys.modules for name in _lazy_modules}
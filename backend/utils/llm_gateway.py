@@ -0,0 +1,281 @@
+#llm_gateway.py
+
+import asyncio
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from utils.lazy import fn_lazy_import
+from utils.metrics import llm_request_duration_seconds, llm_requests, llm_tokens
+
+# Imported when the first completion starts the gateway.
+groq = fn_lazy_import("groq")
+httpx = fn_lazy_import("httpx")
+
+load_dotenv()
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Point at a local fake server in tests and benchmarks, e.g. http://127.0.0.1:8765
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|s|m|h)")
+
+
+def fn_parse_retry_delay(headers):
+    """
+    Returns how long the server asked us to wait, in seconds, or None.
+
+    Understands `retry-after` (seconds) and Groq's `x-ratelimit-reset-*`
+    headers, which use durations such as "7.66s" or "2m59.56s".
+    """
+    if not headers:
+        return None
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    delays = []
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(name)
+        if not value:
+            continue
+        seconds = 0.0
+        for amount, unit in _DURATION_PART.findall(value):
+            seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+        delays.append(seconds)
+    return max(delays) if delays else None
+
+
+class LLMGateway:
+    """
+    Single entry point for every Groq chat completion made by the backend.
+
+    Runs one AsyncGroq client on a dedicated event loop thread so that both
+    synchronous pipeline code (`complete`, `stream`) and async handlers (`acomplete`)
+    share one HTTP connection pool. In-flight calls are capped by a semaphore
+    that is released while a call waits to retry, 429/5xx responses and timeouts are retried with jittered exponential
+    backoff (honouring rate-limit headers) and every call's latency and token
+    usage is recorded.
+    """
+
+    def __init__(self, api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, max_concurrency=LLM_MAX_CONCURRENCY,
+                 max_connections=LLM_MAX_CONNECTIONS, timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency_seconds_total": 0.0,
+        }
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._client = groq.AsyncGroq(
+                    api_key=self.api_key or "missing-api-key",
+                    base_url=self.base_url,
+                    max_retries=0,  # retries are handled here so we can honour rate-limit headers
+                    timeout=self.timeout,
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                        timeout=self.timeout,
+                    ),
+                )
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name="llm-gateway", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    def _backoff(self, attempt, error):
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        delay = fn_parse_retry_delay(headers)
+        if delay is None:
+            delay = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+        # Full jitter so concurrent callers do not retry in lock-step.
+        return min(LLM_BACKOFF_MAX_SECONDS, delay) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, groq.APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    async def _complete(self, messages, model, timeout=None, **params):
+        timeout = timeout or self.timeout
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                # The semaphore is held per attempt, never during a backoff, so a rate-limited
+                # call does not keep a slot from healthy ones while it waits.
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(model=model, messages=messages, **params),
+                        timeout=timeout,
+                    )
+            except Exception as e:
+                if attempt < self.max_retries and self._is_retryable(e):
+                    self._record(retry=True, model=model)
+                    await asyncio.sleep(self._backoff(attempt, e))
+                    continue
+                self._record(error=True, model=model, latency=time.perf_counter() - start)
+                raise
+
+            usage = getattr(response, "usage", None)
+            self._record(
+                model=model,
+                latency=time.perf_counter() - start,
+                prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            )
+            return response
+
+    async def _stream(self, messages, model, on_delta, timeout=None, **params):
+        timeout = timeout or self.timeout
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            emitted = False
+            usage = None
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    stream = await asyncio.wait_for(
+                        self._client.chat.completions.create(model=model, messages=messages, stream=True, **params),
+                        timeout=timeout,
+                    )
+                    async for chunk in stream:
+                        if chunk.choices:
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                emitted = True
+                                on_delta(delta)
+                        # Groq reports usage in the last chunk, under x_groq.
+                        usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+            except Exception as e:
+                # Once tokens reached the caller a retry would duplicate them.
+                if not emitted and attempt < self.max_retries and self._is_retryable(e):
+                    self._record(retry=True, model=model)
+                    await asyncio.sleep(self._backoff(attempt, e))
+                    continue
+                self._record(error=True, model=model, latency=time.perf_counter() - start)
+                raise
+
+            self._record(
+                model=model,
+                latency=time.perf_counter() - start,
+                prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            )
+            return
+
+    def _record(self, error=False, retry=False, model=None, latency=0.0, prompt_tokens=0, completion_tokens=0):
+        if retry:
+            with self._stats_lock:
+                self._stats["retries"] += 1
+            llm_requests.inc(model=model, outcome="retry")
+            return
+
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["errors"] += int(error)
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["completion_tokens"] += completion_tokens
+            self._stats["latency_seconds_total"] += latency
+
+        llm_requests.inc(model=model, outcome="error" if error else "ok")
+        llm_request_duration_seconds.observe(latency, model=model)
+        llm_tokens.inc(prompt_tokens, model=model, kind="prompt")
+        llm_tokens.inc(completion_tokens, model=model, kind="completion")
+
+    def complete(self, messages, model, **params):
+        """
+        Runs a chat completion from synchronous code and returns the Groq response.
+
+        Args:
+            messages (List[Dict]): Chat messages.
+            model (str): Groq model name.
+            **params: Extra completion parameters (temperature, timeout, ...).
+        """
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._complete(messages, model, **params), loop).result()
+
+    async def acomplete(self, messages, model, **params):
+        """
+        Same as `complete`, awaitable from any event loop.
+        """
+        loop = self._ensure_started()
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._complete(messages, model, **params), loop)
+        )
+
+    def stream(self, messages, model, **params):
+        """
+        Runs a streaming chat completion from synchronous code.
+        Connection errors and rate limits are retried only until the first token arrives.
+
+        Yields:
+            str: The content deltas as they arrive.
+        """
+        loop = self._ensure_started()
+        deltas = queue.Queue()
+        end = object()
+        future = asyncio.run_coroutine_threadsafe(self._stream(messages, model, deltas.put, **params), loop)
+        future.add_done_callback(lambda _: deltas.put(end))
+        try:
+            while True:
+                delta = deltas.get()
+                if delta is end:
+                    break
+                yield delta
+            future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+llm_gateway = LLMGateway()
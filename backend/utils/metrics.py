@@ -0,0 +1,189 @@
+#metrics.py
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# Timings collected for the current HTTP request, see fn_observe_stage.
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _fn_format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter, optionally labelled.
+    """
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fn_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """
+    Cumulative histogram with fixed buckets, optionally labelled.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][index] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, dict(entry, counts=list(entry["counts"]))) for key, entry in self._values.items()]
+        lines = []
+        for key, entry in items:
+            for bound, count in zip(self.buckets, entry["counts"]):
+                labels = _fn_format_labels(self.labelnames + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _fn_format_labels(self.labelnames + ("le",), key + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {entry['count']}")
+            plain = _fn_format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {entry['sum']}")
+            lines.append(f"{self.name}_count{plain} {entry['count']}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Metric whose samples are read from `callback` at scrape time.
+
+    `callback` returns a number, or a dict mapping label value tuples to numbers.
+    """
+
+    def __init__(self, name, documentation, callback, kind="gauge", labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def _samples(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Could not collect metric {self.name}: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_fn_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+def fn_render_metrics():
+    """
+    Returns every registered metric in the Prometheus text exposition format.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+stage_duration_seconds = Histogram(
+    "quiz_stage_duration_seconds", "Duration of each pipeline stage.", ["stage"]
+)
+whisper_real_time_factor = Histogram(
+    "whisper_real_time_factor", "Transcription time divided by audio duration.",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5),
+)
+audio_seconds_transcribed = Counter(
+    "whisper_audio_seconds_total", "Seconds of audio transcribed by Whisper."
+)
+llm_request_duration_seconds = Histogram(
+    "llm_request_duration_seconds", "Latency of Groq chat completions.", ["model"]
+)
+llm_requests = Counter(
+    "llm_requests_total", "Groq chat completions by outcome.", ["model", "outcome"]
+)
+llm_tokens = Counter(
+    "llm_tokens_total", "Tokens used by Groq chat completions.", ["model", "kind"]
+)
+quiz_invalid_questions = Counter(
+    "quiz_invalid_questions_total", "Generated quiz questions rejected by schema validation."
+)
+
+
+def fn_observe_stage(stage, seconds):
+    """
+    Records a stage duration in the histogram and in the current request's timings.
+    """
+    stage_duration_seconds.observe(seconds, stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def fn_time_stage(stage):
+    """
+    Context manager timing the enclosed block as `stage`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        fn_observe_stage(stage, time.perf_counter() - start)
+
+
+def fn_format_server_timing(timings):
+    """
+    Formats stage timings (seconds) as a Server-Timing header value (milliseconds).
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,88 @@
+#pipeline.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Stage:
+    """
+    One step of a pipeline DAG.
+
+    Args:
+        name (str): Unique stage name; its result is stored under this name.
+        fn (callable): Called with one keyword argument per input stage.
+        inputs (List[str]): Names of the stages whose results `fn` needs.
+    """
+
+    def __init__(self, name, fn, inputs=()):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+
+
+def fn_run_dag(stages, on_stage=None, max_workers=4, clock_start=None):
+    """
+    Runs stages as soon as all their inputs are available, in parallel where possible.
+
+    Args:
+        stages (List[Stage]): The stages; inputs must refer to other stages in the list.
+        on_stage (callable, optional): Called with the stage name when a stage starts.
+        max_workers (int): Maximum number of stages running at once.
+        clock_start (float, optional): time.perf_counter() value timings are relative to.
+            Defaults to the moment the DAG starts.
+
+    Returns:
+        Tuple[Dict, Dict]: Stage results by name, and per-stage timings
+        {name: {"start", "end", "duration"}} in seconds.
+
+    Raises:
+        ValueError: If the stages reference unknown inputs or contain a cycle.
+        Exception: The first exception raised by a stage; pending stages are cancelled.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        unknown = [name for name in stage.inputs if name not in by_name]
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}")
+
+    clock_start = time.perf_counter() if clock_start is None else clock_start
+    results, timings = {}, {}
+    remaining = dict(by_name)
+    running = {}
+
+    def run(stage, kwargs):
+        start = time.perf_counter()
+        try:
+            return stage.fn(**kwargs)
+        finally:
+            end = time.perf_counter()
+            timings[stage.name] = {
+                "start": round(start - clock_start, 3),
+                "end": round(end - clock_start, 3),
+                "duration": round(end - start, 3),
+            }
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline-stage") as pool:
+        while remaining or running:
+            ready = [s for s in remaining.values() if all(name in results for name in s.inputs)]
+            for stage in ready:
+                del remaining[stage.name]
+                if on_stage:
+                    on_stage(stage.name)
+                kwargs = {name: results[name] for name in stage.inputs}
+                running[pool.submit(run, stage, kwargs)] = stage.name
+
+            if not running:
+                raise ValueError(f"Stages {sorted(remaining)} have cyclic dependencies")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    for pending in running:
+                        pending.cancel()
+                    raise
+
+    return results, timings
@@ -1,27 +1,43 @@
 #utills.py
 
-import groq  
 from dotenv import load_dotenv
 import os
-import whisper
 import subprocess
-import json
-import re
+import hashlib
+import tempfile
+import wave
+
+import numpy as np
+
+from utils.whisper_registry import fn_get_whisper_model
+from utils.lazy import fn_lazy_import
+from utils.llm_gateway import llm_gateway
+from utils.json_stream import JSONArrayStreamParser, fn_extract_json_array
+
+whisper = fn_lazy_import("whisper")
+torch = fn_lazy_import("torch")
 
 load_dotenv()
-groq_api_key = os.getenv('GROQ_API_KEY')
-groq_client = groq.Client(api_key=groq_api_key)
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+
+class UploadTooLargeError(ValueError):
+    """
+    Raised while streaming an upload once it exceeds UPLOAD_MAX_BYTES.
+    """
 
 def fn_generate_quiz(prompt):
     """
     Calls Groq API and returns JSON-parsed quiz if possible.
     """
-    response = groq_client.chat.completions.create(
-        model="llama-3.1-8b-instant",
+    response = llm_gateway.complete(
+        model=GROQ_MODEL,
         messages=[
             {"role": "system", "content": "You are a helpful AI that generates quiz from the given transcript."},
             {"role": "user", "content": prompt}
-        ],    
+        ],
     )
     
     if not response.choices:
@@ -29,14 +45,37 @@ def fn_generate_quiz(prompt):
 
     raw_text = response.choices[0].message.content.strip()
 
-    # Remove optional markdown fences (```json ... ```)
-    raw_text = re.sub(r"^```json|```$", "", raw_text, flags=re.MULTILINE).strip()
-
-    try:
-        return json.loads(raw_text)   # return parsed JSON directly
-    except json.JSONDecodeError:
+    # Tolerates fences, prose and comments around the array; see fn_extract_json_array.
+    questions = fn_extract_json_array(raw_text)
+    if not questions:
         print("Could not parse model output as JSON:\n", raw_text)
-        return []
+    return questions
+
+def fn_stream_quiz(prompt, on_question):
+    """
+    Streams the quiz from the Groq API and calls `on_question` with each question
+    as soon as its JSON object is complete.
+
+    Args:
+        prompt (str): The quiz prompt.
+        on_question (callable): Called with each parsed question dict, in order.
+
+    Returns:
+        List[Dict]: All parsed questions.
+    """
+    parser = JSONArrayStreamParser()
+    questions = []
+    for delta in llm_gateway.stream(
+        model=GROQ_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful AI that generates quiz from the given transcript."},
+            {"role": "user", "content": prompt}
+        ],
+    ):
+        for question in parser.feed(delta):
+            questions.append(question)
+            on_question(question)
+    return questions
 
 # The below function is created , if we want to use two different models for summary and quiz generation.
 
@@ -52,9 +91,9 @@ def fn_generate_summary(prompt):
         str: The generated text.
     """
     
-    response = groq_client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-          messages=[
+    response = llm_gateway.complete(
+        model=GROQ_MODEL,
+        messages=[
             {"role": "system", "content": "You are a helpful AI that summarizes transcripts."},
             {"role": "user", "content": prompt}
         ],
@@ -66,28 +105,95 @@ def fn_generate_summary(prompt):
 
     raw_text = response.choices[0].message.content.strip()
 
-    # Remove optional markdown fences (```json ... ```)
-    raw_text = re.sub(r"^```json|```$", "", raw_text, flags=re.MULTILINE).strip()
-
-    try:
-        return json.loads(raw_text)   # ✅ return parsed JSON directly
-    except json.JSONDecodeError:
+    summary = fn_extract_json_array(raw_text)
+    if not summary:
         print("⚠️ Could not parse model output as JSON:\n", raw_text)
-        return []   
+    return summary
 
 # The below Fn is created because in future we might use other models like assembly ai.
-def fn_transcribe_audio(audio):
+def fn_transcribe_audio(audio, model_size=None):
     """
     This function transcribes audio from the given audio file.
 
     Args:
-        audio (str): The audio to transcribe.
+        audio (str | np.ndarray): Path of the audio file, or 16 kHz mono float32 samples.
+        model_size (str, optional): Whisper model size. Defaults to WHISPER_MODEL.
     """
-    model = whisper.load_model("base")
+    if isinstance(audio, str):
+        audio = fn_load_audio_array(audio)
+    model = fn_get_whisper_model(model_size)
     result = model.transcribe(audio)
     return result["text"], result["language"]
 
 
+def fn_transcribe_batch(clips, model_size=None):
+    """
+    Transcribes several short clips with one batched decoder pass.
+    Used by transcription workers to clear bursts of short uploads.
+
+    Each clip is padded to Whisper's 30 second window, so longer audio must go
+    through fn_transcribe_audio instead. Decoding is greedy at temperature 0,
+    without transcribe()'s temperature fallback.
+
+    Args:
+        clips (List[np.ndarray]): 16 kHz mono float32 samples, at most 30 seconds each.
+        model_size (str, optional): Whisper model size. Defaults to WHISPER_MODEL.
+
+    Returns:
+        List[Tuple[str, str]]: The text and detected language of each clip, in order.
+    """
+    model = fn_get_whisper_model(model_size)
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(clip), model.dims.n_mels) for clip in clips
+    ]).to(model.device)
+    options = whisper.DecodingOptions(fp16=model.device.type == "cuda")
+    results = whisper.decode(model, mels, options)
+    return [(result.text.strip(), result.language) for result in results]
+
+
+def fn_transcribe_segments(samples, model_size=None):
+    """
+    Transcribes one chunk of audio and keeps Whisper's timestamped segments.
+    Used by the chunked transcription path; runs inside the Whisper process pool.
+
+    Args:
+        samples (np.ndarray): 16 kHz mono float32 samples.
+        model_size (str, optional): Whisper model size. Defaults to WHISPER_MODEL.
+
+    Returns:
+        Dict: {"segments": [{"start", "end", "text", "words": [{"start", "end", "word"}]}], "language": str}
+        with chunk-relative times. The word timestamps let the chunks be stitched word by word.
+    """
+    model = fn_get_whisper_model(model_size)
+    result = model.transcribe(samples, word_timestamps=True)
+    segments = [
+        {
+            "start": float(seg["start"]),
+            "end": float(seg["end"]),
+            "text": seg["text"],
+            "words": [
+                {"start": float(word["start"]), "end": float(word["end"]), "word": word["word"]}
+                for word in seg.get("words", [])
+            ],
+        }
+        for seg in result.get("segments", [])
+    ]
+    return {"segments": segments, "language": result["language"]}
+
+
+# Whisper works on 16 kHz mono internally, so we extract straight to that format
+# instead of writing 44.1 kHz stereo and letting Whisper resample it again.
+WHISPER_SAMPLE_RATE = 16000
+
+# Output options shared by every ffmpeg audio extraction.
+AUDIO_OUTPUT_ARGS = [
+    "-vn",  # Skip video
+    "-acodec", "pcm_s16le",  # WAV format
+    "-ar", str(WHISPER_SAMPLE_RATE),  # Sampling rate
+    "-ac", "1",      # Mono
+]
+
+
 def fn_extract_audio(video_path, audio):
     """
     Extracts audio from a video file using FFmpeg and saves it as a WAV file.
@@ -102,51 +208,197 @@ def fn_extract_audio(video_path, audio):
     command = [
         "ffmpeg",
         "-i", video_path,
-        "-vn",  # Skip video
-        "-acodec", "pcm_s16le",  # WAV format
-        "-ar", "44100",  # Sampling rate
-        "-ac", "2",      # Stereo
+        *AUDIO_OUTPUT_ARGS,
         audio,
         "-y"  # Overwrite if the file already exists
     ]
     subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
     return audio
 
+
+def fn_load_audio_array(audio_path):
+    """
+    Loads an audio file as the 16 kHz mono float32 array Whisper expects.
+
+    WAV files produced by fn_extract_audio are read directly with NumPy; anything
+    else is decoded and resampled by FFmpeg into memory, without a temp file.
+
+    Args:
+        audio_path (str): The file path to the audio.
+
+    Returns:
+        np.ndarray: float32 samples in [-1, 1].
+    """
+    try:
+        with wave.open(audio_path, "rb") as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) == (WHISPER_SAMPLE_RATE, 1, 2):
+                frames = wav.readframes(wav.getnframes())
+                return np.frombuffer(frames, np.int16).astype(np.float32) / 32768.0
+    except (wave.Error, EOFError):
+        pass
+
+    command = [
+        "ffmpeg", "-nostdin",
+        "-i", audio_path,
+        "-f", "s16le", "-ac", "1", "-ar", str(WHISPER_SAMPLE_RATE),
+        "-"
+    ]
+    output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+def fn_extract_audio_from_stream(fileobj, audio, max_bytes=UPLOAD_MAX_BYTES, chunk_size=UPLOAD_CHUNK_BYTES):
+    """
+    Pipes a video stream into FFmpeg's stdin and saves the audio as a WAV file,
+    so the full video is never written to disk.
+
+    Containers that keep their index at the end of the file (some MP4/MOV)
+    cannot be demuxed from a pipe; use fn_save_stream + fn_extract_audio for those.
+
+    Args:
+        fileobj: Binary file object of the video.
+        audio (str): The file path to save the extracted audio.
+        max_bytes (int): Maximum accepted size of the stream.
+
+    Returns:
+        Tuple[str, str]: The audio path and the SHA-256 hex digest of the streamed bytes.
+
+    Raises:
+        UploadTooLargeError: If the stream exceeds `max_bytes`.
+    """
+    command = ["ffmpeg", "-i", "pipe:0", *AUDIO_OUTPUT_ARGS, audio, "-y"]
+    digest = hashlib.sha256()
+    total = 0
+
+    with tempfile.TemporaryFile() as stderr:
+        # stderr goes to a file: a full stderr pipe would block ffmpeg while we are still writing stdin.
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                try:
+                    process.stdin.write(chunk)
+                except BrokenPipeError:
+                    break  # ffmpeg exited early, the return code below reports why
+            process.stdin.close()
+            returncode = process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(returncode, command, stderr=stderr.read())
+
+    return audio, digest.hexdigest()
+
+
+def fn_hash_text(text):
+    """
+    Returns the SHA-256 hex digest of a string.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fn_save_stream(fileobj, dest_path, max_bytes=UPLOAD_MAX_BYTES, chunk_size=UPLOAD_CHUNK_BYTES):
+    """
+    Streams a file object to disk in fixed-size chunks, hashing it on the way.
+
+    Args:
+        fileobj: Binary file object to read.
+        dest_path (str): Where to write the bytes.
+        max_bytes (int): Maximum accepted size; enforced while streaming.
+        chunk_size (int): Number of bytes read per iteration.
+
+    Returns:
+        str: The SHA-256 hex digest of the bytes written.
+
+    Raises:
+        UploadTooLargeError: If the stream exceeds `max_bytes`. The partial file is removed.
+    """
+    digest = hashlib.sha256()
+    total = 0
+    try:
+        with open(dest_path, "wb") as out:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.unlink(dest_path)
+        raise
+    return digest.hexdigest()
+
 # utils/processing.py
 
+def fn_score_submissions(answer_key, option_counts, answers):
+    """
+    Scores many answer vectors against one answer key in a single NumPy comparison.
+
+    Args:
+        answer_key (List[int]): Correct option index per question.
+        option_counts (List[int]): Number of options per question.
+        answers (array-like): Shape (students, questions); -1 marks an unanswered question.
+
+    Returns:
+        Dict: "correct" (bool matrix), "scores" (correct answers per student),
+        "percent_correct" per question, "option_counts" (students choosing each
+        option, per question) and "unanswered" per question.
+    """
+    key = np.asarray(answer_key, dtype=np.int64)
+    answers = np.asarray(answers, dtype=np.int64).reshape(len(answers), len(key))
+    n_options = np.asarray(option_counts, dtype=np.int64)
+
+    answered = (answers >= 0) & (answers < n_options)
+    correct = answered & (answers == key)
+    # One row per question, one column per option index.
+    option_range = np.arange(int(n_options.max()) if len(n_options) else 0)
+    chosen = (answers[:, :, None] == option_range) & answered[:, :, None]
+
+    return {
+        "correct": correct,
+        "scores": correct.sum(axis=1),
+        "percent_correct": correct.mean(axis=0) * 100 if len(answers) else np.zeros(len(key)),
+        "option_counts": chosen.sum(axis=0),
+        "unanswered": (~answered).sum(axis=0),
+    }
+
+
 def fn_verify_answers(quiz, user_answers):
     """
     Verifies user answers against the quiz.
 
     Args:
         quiz (List[Dict]): Original quiz questions.
-        user_answers (Dict[int, str]): {question_index: chosen_option}
+        user_answers (Dict[int, int]): {question_index: chosen_option}
 
     Returns:
         Dict: Results in frontend-ready format with 'details', 'score', 'total', 'percentage'
     """
-    results = []
-    correct_count = 0
+    answer_key = [q.get("correctAnswer", 0) for q in quiz]
+    answers = [user_answers.get(i, -1) for i in range(len(quiz))]
+    scored = fn_score_submissions(answer_key, [len(q["options"]) for q in quiz], [answers])
+    correct = scored["correct"][0]
 
+    results = []
     for i, q in enumerate(quiz):
-        # Get user's answer, fallback to None if missing
-        user_ans_idx = user_answers.get(i)
-        correct_ans_idx = q.get("correctAnswer", 0)
-
-        # Determine if correct
-        is_correct = user_ans_idx == correct_ans_idx
-        if is_correct:
-            correct_count += 1
-
-        # Build a frontend-ready detail object
+        user_ans_idx = answers[i]
         results.append({
             "question": q.get("question", f"Question {i + 1}"),
-            "userAnswer": q["options"][user_ans_idx] if user_ans_idx is not None else None,
-            "correctAnswer": q["options"][correct_ans_idx],
-            "isCorrect": is_correct,
+            "userAnswer": q["options"][user_ans_idx] if 0 <= user_ans_idx < len(q["options"]) else None,
+            "correctAnswer": q["options"][answer_key[i]],
+            "isCorrect": bool(correct[i]),
             "explanation": q.get("explanation", "No explanation provided.")
         })
 
+    correct_count = int(scored["scores"][0])
     total_questions = len(quiz)
     percentage = round((correct_count / total_questions) * 100) if total_questions > 0 else 0
 
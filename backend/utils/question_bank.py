@@ -0,0 +1,207 @@
+#question_bank.py
+
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from utils.cache import CACHE_DB_PATH
+from utils.metrics import Counter
+from utils.processing import fn_hash_text
+
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "1") == "1"
+# Questions kept per video and difficulty before background top-ups stop.
+QUESTION_BANK_TARGET_SIZE = int(os.getenv("QUESTION_BANK_TARGET_SIZE", "15"))
+# A bank is only topped up once each of its questions has been served this many times.
+QUESTION_BANK_TOP_UP_AFTER_SERVES = int(os.getenv("QUESTION_BANK_TOP_UP_AFTER_SERVES", "2"))
+QUESTION_BANK_TTL_SECONDS = int(os.getenv("QUESTION_BANK_TTL_SECONDS", str(30 * 24 * 3600)))
+# Estimated Jaccard similarity above which a new question counts as a near-duplicate of a banked one.
+QUESTION_BANK_DUPLICATE_THRESHOLD = float(os.getenv("QUESTION_BANK_DUPLICATE_THRESHOLD", "0.6"))
+
+# MinHash over the content words of the question and its correct option.
+MINHASH_PERMUTATIONS = 64
+_MINHASH_PRIME = 4294967311  # smallest prime above 2**32
+# Fixed seed: signatures are stored, so every process must use the same permutations.
+_minhash_rng = np.random.default_rng(1729)
+_MINHASH_A = _minhash_rng.integers(1, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_MINHASH_B = _minhash_rng.integers(0, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+_STOPWORDS = frozenset(
+    "a an the of to in on for and or is are was were be been by with as at from that this these those "
+    "what which who whom whose when where why how does do did can could would should will it its "
+    "according video lecture speaker following main primary".split()
+)
+
+question_bank_requests = Counter(
+    "question_bank_requests_total", "Quiz requests by whether the question bank could serve them.", ["result"]
+)
+question_bank_duplicates = Counter(
+    "question_bank_duplicates_total", "Generated questions dropped as near-duplicates of banked ones."
+)
+
+
+def fn_question_shingles(question):
+    """
+    Returns the normalized content words of a question and its correct option.
+    """
+    text = question["question"]
+    options = question.get("options") or []
+    if 0 <= question.get("correctAnswer", -1) < len(options):
+        text += " " + str(options[question["correctAnswer"]])
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    # Crude plural folding so "cells" and "cell" match.
+    return {w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in _STOPWORDS}
+
+
+def fn_minhash(shingles):
+    """
+    Returns the MinHash signature (MINHASH_PERMUTATIONS uint64 values) of a set of strings.
+    The share of equal positions in two signatures estimates the Jaccard similarity of the sets.
+    """
+    if not shingles:
+        return np.full(MINHASH_PERMUTATIONS, _MINHASH_PRIME, dtype=np.uint64)
+    hashes = np.array([zlib.crc32(s.encode()) for s in shingles], dtype=np.uint64)
+    return ((np.outer(hashes, _MINHASH_A) + _MINHASH_B) % _MINHASH_PRIME).min(axis=0)
+
+
+class QuestionBank:
+    """
+    Validated quiz questions collected per video across generations.
+
+    Each question is tagged with the difficulty it was generated for. New
+    questions whose MinHash signature is too close to a banked question of
+    the same video and difficulty are dropped, so sampling never serves the
+    same question twice in different words. The other difficulties are not
+    compared: a basic and a hard question about the same fact are both kept.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, ttl_seconds=QUESTION_BANK_TTL_SECONDS,
+                 duplicate_threshold=QUESTION_BANK_DUPLICATE_THRESHOLD):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.duplicate_threshold = duplicate_threshold
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS question_bank (
+                    bank_key TEXT NOT NULL,
+                    question_id TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    served INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (bank_key, question_id)
+                )"""
+            )
+            self._conn.commit()
+        return self._conn
+
+    def add(self, bank_key, difficulty, questions, served=0):
+        """
+        Banks the questions that are not near-duplicates of banked ones of `difficulty`.
+
+        Args:
+            bank_key (str): The video's bank key.
+            difficulty (str): Difficulty the questions were generated for.
+            questions (List[dict]): Validated questions.
+            served (int): Times the questions have already been served, 1 for a quiz returned to the caller.
+
+        Returns:
+            int: The number of questions added.
+        """
+        now = time.time()
+        added = 0
+        with self._lock:
+            conn = self._connection()
+            if self.ttl_seconds:
+                conn.execute("DELETE FROM question_bank WHERE created_at < ?", (now - self.ttl_seconds,))
+            signatures = [
+                np.frombuffer(row[0], dtype=np.uint64)
+                for row in conn.execute(
+                    "SELECT signature FROM question_bank WHERE bank_key = ? AND difficulty = ?", (bank_key, difficulty)
+                )
+            ]
+            for question in questions:
+                # The ID covers the difficulty, so the same question may be banked for several difficulties.
+                question_id = fn_hash_text(f"{difficulty}:{question['question']}")[:16]
+                signature = fn_minhash(fn_question_shingles(question))
+                if signatures and (np.stack(signatures) == signature).mean(axis=1).max() >= self.duplicate_threshold:
+                    question_bank_duplicates.inc()
+                    continue
+                conn.execute(
+                    """INSERT OR IGNORE INTO question_bank
+                        (bank_key, question_id, difficulty, question, signature, served, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (bank_key, question_id, difficulty,
+                     json.dumps(question), signature.tobytes(), served, now),
+                )
+                signatures.append(signature)
+                added += 1
+            conn.commit()
+        return added
+
+    def sample(self, bank_key, difficulty, count):
+        """
+        Returns `count` banked questions of `difficulty` in random order, preferring
+        the least served ones, or None when the bank holds fewer.
+        """
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                """SELECT question_id, question FROM question_bank
+                    WHERE bank_key = ? AND difficulty = ? AND created_at >= ?
+                    ORDER BY served, RANDOM() LIMIT ?""",
+                (bank_key, difficulty, time.time() - self.ttl_seconds if self.ttl_seconds else 0, count),
+            ).fetchall()
+            if len(rows) < count:
+                return None
+            conn.executemany(
+                "UPDATE question_bank SET served = served + 1 WHERE bank_key = ? AND question_id = ?",
+                [(bank_key, question_id) for question_id, _ in rows],
+            )
+            conn.commit()
+        questions = [json.loads(question) for _, question in rows]
+        random.shuffle(questions)
+        return questions
+
+    def questions(self, bank_key, difficulty):
+        """
+        Returns the text of every banked question of `difficulty`.
+        """
+        with self._lock:
+            return [
+                json.loads(row[0])["question"] for row in self._connection().execute(
+                    "SELECT question FROM question_bank WHERE bank_key = ? AND difficulty = ?", (bank_key, difficulty)
+                )
+            ]
+
+    def least_served(self, bank_key, difficulty):
+        """
+        Returns how often the least served question of `difficulty` has been served (0 for an empty bank).
+        """
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COALESCE(MIN(served), 0) FROM question_bank WHERE bank_key = ? AND difficulty = ?",
+                (bank_key, difficulty),
+            ).fetchone()[0]
+
+    def count(self, bank_key, difficulty):
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM question_bank WHERE bank_key = ? AND difficulty = ?", (bank_key, difficulty)
+            ).fetchone()[0]
+
+
+question_bank = QuestionBank()
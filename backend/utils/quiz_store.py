@@ -0,0 +1,44 @@
+#quiz_store.py
+
+import json
+import os
+
+from utils.cache import SQLiteCache
+from utils.processing import fn_hash_text
+
+QUIZ_STORE_TTL_SECONDS = int(os.getenv("QUIZ_STORE_TTL_SECONDS", str(90 * 24 * 3600)))
+QUIZ_STORE_MAX_BYTES = int(os.getenv("QUIZ_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+quiz_store = SQLiteCache("quizzes", ttl_seconds=QUIZ_STORE_TTL_SECONDS, max_bytes=QUIZ_STORE_MAX_BYTES)
+
+
+def fn_store_quiz(quiz):
+    """
+    Stores a generated quiz with its compact answer key and returns its ID.
+
+    The ID is derived from the quiz content, so storing the same quiz twice
+    returns the same ID.
+
+    Args:
+        quiz (List[Dict]): Validated quiz questions.
+
+    Returns:
+        str: The quiz ID, or None for an empty quiz.
+    """
+    if not quiz:
+        return None
+    quiz_id = fn_hash_text(json.dumps(quiz, sort_keys=True))[:16]
+    if quiz_store.get(quiz_id) is None:
+        quiz_store.set(quiz_id, {
+            "quiz": quiz,
+            "answer_key": [q["correctAnswer"] for q in quiz],
+            "option_counts": [len(q["options"]) for q in quiz],
+        })
+    return quiz_id
+
+
+def fn_get_stored_quiz(quiz_id):
+    """
+    Returns {"quiz", "answer_key", "option_counts"} for a stored quiz, or None if unknown or expired.
+    """
+    return quiz_store.get(quiz_id)
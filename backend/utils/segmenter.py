@@ -0,0 +1,153 @@
+#segmenter.py
+
+import os
+
+import numpy as np
+
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "300"))
+TRANSCRIBE_CHUNK_OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP_SECONDS", "1.0"))
+# How far around each target boundary we look for the quietest frame.
+TRANSCRIBE_SILENCE_SEARCH_SECONDS = float(os.getenv("TRANSCRIBE_SILENCE_SEARCH_SECONDS", "15"))
+
+FRAME_SECONDS = 0.03
+
+
+def fn_frame_energy(samples, sample_rate):
+    """
+    Returns the RMS energy of consecutive 30 ms frames.
+    """
+    frame = max(1, int(sample_rate * FRAME_SECONDS))
+    usable = len(samples) - len(samples) % frame
+    if usable == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:usable].reshape(-1, frame)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def fn_split_audio(samples, sample_rate, chunk_seconds=TRANSCRIBE_CHUNK_SECONDS,
+                   overlap_seconds=TRANSCRIBE_CHUNK_OVERLAP_SECONDS,
+                   search_seconds=TRANSCRIBE_SILENCE_SEARCH_SECONDS):
+    """
+    Splits audio into chunks of roughly `chunk_seconds`, cutting at the quietest
+    frame near each target boundary so words are not split in half.
+
+    Args:
+        samples (np.ndarray): Mono float32 samples.
+        sample_rate (int): Sample rate of `samples`.
+
+    Returns:
+        List[Dict]: Chunks in order, each with the "begin" and "cut" sample offsets of
+        the audio it is responsible for, the "start" and "end" offsets of the audio it
+        is transcribed from, and that "samples" slice. Neighbouring chunks share
+        `overlap_seconds` of audio on each side of a cut, so a word spoken across the
+        cut is heard whole by both of them.
+    """
+    total = len(samples)
+    chunk = int(chunk_seconds * sample_rate)
+    if total <= chunk:
+        return [{"index": 0, "begin": 0, "cut": total, "start": 0, "end": total, "samples": samples}]
+
+    energy = fn_frame_energy(samples, sample_rate)
+    frame = max(1, int(sample_rate * FRAME_SECONDS))
+    search = int(search_seconds / FRAME_SECONDS)
+
+    cuts = []
+    target = chunk
+    while target < total - chunk // 4:
+        centre = target // frame
+        lo, hi = max(0, centre - search), min(len(energy), centre + search + 1)
+        cut = (lo + int(np.argmin(energy[lo:hi]))) * frame if hi > lo else target
+        if cuts and cut <= cuts[-1]:
+            cut = target
+        cuts.append(cut)
+        target = cut + chunk
+
+    overlap = int(overlap_seconds * sample_rate)
+    bounds = [0] + cuts + [total]
+    chunks = []
+    for index in range(len(bounds) - 1):
+        begin, cut = bounds[index], bounds[index + 1]
+        start, end = max(0, begin - overlap), min(total, cut + overlap)
+        chunks.append(
+            {"index": index, "begin": begin, "cut": cut, "start": start, "end": end, "samples": samples[start:end]}
+        )
+    return chunks
+
+
+class SegmentStitcher:
+    """
+    Reassembles per-chunk transcription results in order.
+
+    Results may arrive in any order; `add` returns the segments that became
+    final, i.e. all segments of the contiguous prefix of finished chunks.
+    Timestamps are shifted to absolute seconds. Each word is kept from the
+    chunk whose [begin, cut) range holds its midpoint, and never when it
+    starts before the end of what was already stitched, so words heard by two
+    chunks in their overlap appear once. Segments without word timestamps
+    are kept or dropped as a whole by the same rule.
+    """
+
+    def __init__(self, chunks, sample_rate):
+        self.chunks = chunks
+        self.sample_rate = sample_rate
+        self.pending = {}
+        self.next_index = 0
+        self.segments = []
+        self.languages = []
+
+    def add(self, index, result):
+        self.pending[index] = result
+        released = []
+        while self.next_index in self.pending:
+            released.extend(self._release(self.next_index, self.pending.pop(self.next_index)))
+            self.next_index += 1
+        return released
+
+    def _owns(self, start, end, begin, cut):
+        # A small tolerance absorbs Whisper's timestamp jitter against the previous end.
+        if self.segments and start < self.segments[-1]["end"] - 0.05:
+            return False
+        return begin <= (start + end) / 2 < cut
+
+    def _release(self, index, result):
+        chunk = self.chunks[index]
+        offset = chunk["start"] / self.sample_rate
+        begin = chunk["begin"] / self.sample_rate if index else float("-inf")
+        cut = chunk["cut"] / self.sample_rate if index < len(self.chunks) - 1 else float("inf")
+        self.languages.append((result["language"], chunk["cut"] - chunk["begin"]))
+
+        released = []
+        for segment in result["segments"]:
+            if segment.get("words"):
+                words = [
+                    (word["start"] + offset, word["end"] + offset, word["word"]) for word in segment["words"]
+                    if self._owns(word["start"] + offset, word["end"] + offset, begin, cut)
+                ]
+                if not words:
+                    continue
+                start, end, text = words[0][0], words[-1][1], "".join(word for _, _, word in words).strip()
+            else:
+                start, end, text = segment["start"] + offset, segment["end"] + offset, segment["text"].strip()
+                if not self._owns(start, end, begin, cut):
+                    continue
+            if not text:
+                continue
+            stitched = {"start": round(start, 2), "end": round(end, 2), "text": text}
+            self.segments.append(stitched)
+            released.append(stitched)
+        return released
+
+    def done(self):
+        return self.next_index == len(self.chunks)
+
+    def text(self):
+        return " ".join(segment["text"] for segment in self.segments)
+
+    def language(self):
+        """
+        Returns the language detected for most of the audio.
+        """
+        weights = {}
+        for language, length in self.languages:
+            weights[language] = weights.get(language, 0) + length
+        return max(weights, key=weights.get) if weights else None
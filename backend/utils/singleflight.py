@@ -0,0 +1,113 @@
+#singleflight.py
+
+import threading
+
+from utils.metrics import Counter
+
+coalesced_requests = Counter(
+    "coalesced_requests_total", "Requests that attached to an identical in-flight computation.", ["flight"]
+)
+
+
+class _Flight:
+    def __init__(self, replay):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.listeners = []
+        self.replay = frozenset(replay)
+        # (callback name, args, kwargs) of the calls to the `replay` callbacks so far.
+        self.history = []
+
+
+class _Listener:
+    def __init__(self, callbacks):
+        self.callbacks = callbacks
+        # Held while a late joiner replays the history, so live calls cannot overtake it.
+        self.lock = threading.Lock()
+
+    def call(self, name, args, kwargs):
+        if name in self.callbacks:
+            with self.lock:
+                self.callbacks[name](*args, **kwargs)
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time.
+
+    Callers arriving while a computation for the same key is in flight wait
+    for it and receive the same result (or exception) instead of starting
+    their own. Nothing is kept once the computation finishes; caching is
+    left to the caches further down.
+
+    Args:
+        name (str): Label of this group in the coalesced_requests_total metric.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, replay=(), **callbacks):
+        """
+        Returns fn(**callbacks) for the first caller of `key` and shares it with concurrent callers.
+
+        Callbacks (e.g. on_stage, on_segment) of every attached caller are
+        fanned out, so callers that join late still see the remaining progress.
+        Calls to the callbacks named in `replay` (e.g. on_question) are also
+        recorded and replayed, in order, to callers that join late, so they
+        receive everything those callbacks reported.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether this call was coalesced.
+        """
+        listener = _Listener({name: cb for name, cb in callbacks.items() if cb is not None})
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(replay)
+            flight.listeners.append(listener)
+            if not leader:
+                listener.lock.acquire()
+                history = list(flight.history)
+
+        if not leader:
+            coalesced_requests.inc(flight=self.name)
+            try:
+                for name, args, kwargs in history:
+                    if name in listener.callbacks:
+                        listener.callbacks[name](*args, **kwargs)
+            finally:
+                listener.lock.release()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(**{name: self._fan_out(flight, name) for name in callbacks})
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _fan_out(self, flight, name):
+        def call(*args, **kwargs):
+            with self._lock:
+                if name in flight.replay:
+                    flight.history.append((name, args, kwargs))
+                targets = list(flight.listeners)
+            for listener in targets:
+                listener.call(name, args, kwargs)
+        return call
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,105 @@
+#tokens.py
+
+import math
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional, we fall back to a character based estimate
+    tiktoken = None
+
+# Largest prompt we send to each model in one call. These are well under the
+# context windows because Groq also enforces per-minute token limits.
+MODEL_PROMPT_TOKEN_LIMITS = {
+    "llama-3.1-8b-instant": 6000,
+    "llama-3.3-70b-versatile": 12000,
+}
+DEFAULT_PROMPT_TOKEN_LIMIT = 6000
+# Overrides the per-model table for every model when set.
+LLM_MAX_PROMPT_TOKENS = os.getenv("LLM_MAX_PROMPT_TOKENS")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+_encoding = None
+
+
+def fn_count_tokens(text):
+    """
+    Returns the number of tokens in `text`.
+
+    Uses tiktoken's cl100k_base encoding when installed (close to Llama's
+    tokenizer for English), otherwise estimates one token per four characters.
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def fn_prompt_token_limit(model):
+    """
+    Returns the largest prompt, in tokens, we send to `model` in one call.
+    """
+    if LLM_MAX_PROMPT_TOKENS:
+        return int(LLM_MAX_PROMPT_TOKENS)
+    return MODEL_PROMPT_TOKEN_LIMITS.get(model, DEFAULT_PROMPT_TOKEN_LIMIT)
+
+
+def fn_split_sentences(text):
+    return [s for s in _SENTENCE_END.split(text.strip()) if s]
+
+
+def _fn_word_tokens(word):
+    """
+    Returns the tokens `word` adds to a text, with its leading space.
+    Tokenizers split at spaces, so the word costs the same alone as inside a sentence.
+    """
+    if tiktoken is not None:
+        return fn_count_tokens(" " + word)
+    # The character estimate without rounding up every word; sums to the estimate of the joined text.
+    return (len(word) + 1) / 4
+
+
+def fn_chunk_text(text, max_tokens):
+    """
+    Splits text into chunks of at most `max_tokens`, cutting at sentence boundaries.
+    Sentences that are longer than `max_tokens` on their own are cut between words.
+
+    Returns:
+        List[str]: The chunks, in order.
+    """
+    # (text, tokens) of every sentence, or of every run of words of a sentence too long on its own.
+    pieces = []
+    for sentence in fn_split_sentences(text):
+        sentence_tokens = fn_count_tokens(sentence)
+        if sentence_tokens <= max_tokens:
+            pieces.append((sentence, sentence_tokens))
+            continue
+        # Words are counted once and summed, so an unpunctuated caption track
+        # (one huge "sentence") is cut in linear time.
+        current, current_tokens = [], 0
+        for word in sentence.split():
+            word_tokens = _fn_word_tokens(word)
+            if current and current_tokens + word_tokens > max_tokens:
+                pieces.append((" ".join(current), math.ceil(current_tokens)))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            pieces.append((" ".join(current), math.ceil(current_tokens)))
+
+    chunks, current, current_tokens = [], [], 0
+    for piece, piece_tokens in pieces:
+        piece_tokens += 1
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
@@ -0,0 +1,322 @@
+#transcription_queue.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from utils.cache import CACHE_DB_PATH
+from utils.metrics import CallbackMetric
+from utils.workspace import fn_scratch_dir
+
+# "local" transcribes in the API process (or its WHISPER_PROCESS_WORKERS pool);
+# "queue" hands audio to transcription_worker.py processes through the SQLite queue.
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "local")
+TRANSCRIPTION_QUEUE_DB_PATH = os.getenv("TRANSCRIPTION_QUEUE_DB_PATH", CACHE_DB_PATH)
+# A running job whose worker has not sent a heartbeat for this long is handed to another worker.
+TRANSCRIPTION_JOB_LEASE_SECONDS = float(os.getenv("TRANSCRIPTION_JOB_LEASE_SECONDS", "120"))
+TRANSCRIPTION_MAX_ATTEMPTS = int(os.getenv("TRANSCRIPTION_MAX_ATTEMPTS", "3"))
+# Seconds of audio a job is moved ahead for every second it waits, so long recordings are not starved.
+TRANSCRIPTION_PRIORITY_AGING = float(os.getenv("TRANSCRIPTION_PRIORITY_AGING", "10"))
+TRANSCRIPTION_WAIT_TIMEOUT_SECONDS = float(os.getenv("TRANSCRIPTION_WAIT_TIMEOUT_SECONDS", "10800"))
+TRANSCRIPTION_POLL_SECONDS = float(os.getenv("TRANSCRIPTION_POLL_SECONDS", "0.1"))
+# Largest number of short clips a worker decodes in one batched pass.
+TRANSCRIPTION_BATCH_SIZE = int(os.getenv("TRANSCRIPTION_BATCH_SIZE", "8"))
+# Only clips that fit in a single Whisper window can share a decoder batch.
+TRANSCRIPTION_BATCH_MAX_SECONDS = 30
+
+
+class TranscriptionError(RuntimeError):
+    """
+    Raised when a transcription job failed on the worker or was not finished in time.
+    """
+
+
+class TranscriptionQueue:
+    """
+    Priority queue of transcription jobs shared by API and worker processes
+    through one SQLite table.
+
+    Jobs are ordered by the length of the recording they belong to, so short
+    clips run before long lectures, minus an aging bonus for the time already
+    waited. Workers claim jobs under a lease kept alive by heartbeats; jobs of
+    a worker that disappears are retried up to `max_attempts` times.
+    """
+
+    def __init__(self, db_path=TRANSCRIPTION_QUEUE_DB_PATH, lease_seconds=TRANSCRIPTION_JOB_LEASE_SECONDS,
+                 max_attempts=TRANSCRIPTION_MAX_ATTEMPTS, aging=TRANSCRIPTION_PRIORITY_AGING):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.aging = aging
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            # Autocommit mode, so claims can take the write lock with BEGIN IMMEDIATE.
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS transcription_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    audio_path TEXT NOT NULL,
+                    audio_seconds REAL NOT NULL,
+                    model_size TEXT NOT NULL,
+                    rank REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    heartbeat_at REAL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS transcription_jobs_rank ON transcription_jobs (status, rank)"
+            )
+        return self._conn
+
+    def enqueue(self, kind, audio_path, audio_seconds, model_size, priority_seconds=None):
+        """
+        Adds a job and returns its ID.
+
+        Args:
+            kind (str): "text" for fn_transcribe_audio, "segments" for fn_transcribe_segments.
+            audio_path (str): .npy file with 16 kHz mono float32 samples, readable by the workers.
+            audio_seconds (float): Length of this job's audio.
+            model_size (str): Whisper model size.
+            priority_seconds (float, optional): Length of the whole recording, used for ordering.
+                Defaults to `audio_seconds`; chunks of one lecture share the lecture's length.
+        """
+        now = time.time()
+        priority = audio_seconds if priority_seconds is None else priority_seconds
+        # priority - waited * aging, with the part that depends on "now" dropped since it is the same for every row.
+        rank = priority + now * self.aging
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._connection().execute(
+                """INSERT INTO transcription_jobs
+                    (job_id, kind, audio_path, audio_seconds, model_size, rank, status, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)""",
+                (job_id, kind, audio_path, audio_seconds, model_size, rank, now),
+            )
+        return job_id
+
+    def claim(self, worker, batch_size=TRANSCRIPTION_BATCH_SIZE, model_sizes=None):
+        """
+        Claims the most urgent queued job for `worker`. When it is a short clip,
+        further short clips for the same model are claimed with it, up to
+        `batch_size`, so they can be decoded in one batch.
+
+        Args:
+            worker (str): ID of the claiming worker.
+            model_sizes (List[str], optional): Only claim jobs for these models.
+
+        Returns:
+            List[Dict]: The claimed jobs, empty if nothing is queued.
+        """
+        now = time.time()
+        model_filter, model_args = "", []
+        if model_sizes:
+            model_filter = f" AND model_size IN ({', '.join('?' * len(model_sizes))})"
+            model_args = list(model_sizes)
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_leases(conn, now)
+                first = conn.execute(
+                    f"SELECT * FROM transcription_jobs WHERE status = 'queued'{model_filter} ORDER BY rank LIMIT 1",
+                    model_args,
+                ).fetchone()
+                if first is None:
+                    conn.execute("COMMIT")
+                    return []
+
+                jobs = [first]
+                if first["kind"] == "text" and first["audio_seconds"] <= TRANSCRIPTION_BATCH_MAX_SECONDS and batch_size > 1:
+                    jobs += conn.execute(
+                        """SELECT * FROM transcription_jobs
+                            WHERE status = 'queued' AND kind = 'text' AND model_size = ?
+                            AND audio_seconds <= ? AND job_id != ?
+                            ORDER BY rank LIMIT ?""",
+                        (first["model_size"], TRANSCRIPTION_BATCH_MAX_SECONDS, first["job_id"], batch_size - 1),
+                    ).fetchall()
+
+                conn.executemany(
+                    """UPDATE transcription_jobs
+                        SET status = 'running', worker = ?, heartbeat_at = ?, attempts = attempts + 1
+                        WHERE job_id = ?""",
+                    [(worker, now, job["job_id"]) for job in jobs],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [dict(job) for job in jobs]
+
+    def _expire_leases(self, conn, now):
+        cutoff = now - self.lease_seconds
+        conn.execute(
+            """UPDATE transcription_jobs SET status = 'failed', worker = NULL,
+                error = 'Transcription worker stopped responding too many times'
+                WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?""",
+            (cutoff, self.max_attempts),
+        )
+        expired = conn.execute(
+            """UPDATE transcription_jobs SET status = 'queued', worker = NULL
+                WHERE status = 'running' AND heartbeat_at < ?""",
+            (cutoff,),
+        ).rowcount
+        if expired:
+            print(f"Re-queued {expired} transcription jobs of unresponsive workers")
+
+    def heartbeat(self, worker):
+        """
+        Extends the lease of every job `worker` is running.
+        """
+        with self._lock:
+            self._connection().execute(
+                "UPDATE transcription_jobs SET heartbeat_at = ? WHERE worker = ? AND status = 'running'",
+                (time.time(), worker),
+            )
+
+    def complete(self, job_id, result):
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # Cancelled jobs were deleted, so their results are simply dropped here.
+        with self._lock:
+            self._connection().execute(
+                """UPDATE transcription_jobs SET status = ?, result = ?, error = ?, worker = NULL
+                    WHERE job_id = ? AND status = 'running'""",
+                (status, result, error, job_id),
+            )
+
+    def cancel(self, job_ids):
+        """
+        Removes jobs whose results are no longer wanted, queued or not.
+        """
+        if not job_ids:
+            return
+        with self._lock:
+            self._connection().execute(
+                f"DELETE FROM transcription_jobs WHERE job_id IN ({', '.join('?' * len(job_ids))})",
+                list(job_ids),
+            )
+
+    def as_completed(self, job_ids, timeout=TRANSCRIPTION_WAIT_TIMEOUT_SECONDS, poll=TRANSCRIPTION_POLL_SECONDS):
+        """
+        Yields (job_id, result) as the jobs finish and removes them from the queue.
+        Jobs still pending when the caller stops iterating are cancelled.
+
+        Raises:
+            TranscriptionError: If a job failed or did not finish within `timeout`.
+        """
+        pending = set(job_ids)
+        deadline = time.monotonic() + timeout
+        try:
+            while pending:
+                with self._lock:
+                    rows = self._connection().execute(
+                        f"""SELECT job_id, status, result, error FROM transcription_jobs
+                            WHERE job_id IN ({', '.join('?' * len(pending))}) AND status IN ('done', 'failed')""",
+                        list(pending),
+                    ).fetchall()
+                for row in rows:
+                    pending.discard(row["job_id"])
+                    self.cancel([row["job_id"]])
+                    if row["status"] == "failed":
+                        raise TranscriptionError(row["error"])
+                    yield row["job_id"], json.loads(row["result"])
+                if not rows and pending:
+                    if time.monotonic() > deadline:
+                        raise TranscriptionError(f"{len(pending)} transcription jobs did not finish within {timeout:.0f}s")
+                    time.sleep(poll)
+        finally:
+            self.cancel(list(pending))
+
+    def depth(self, status=None):
+        """
+        Returns the number of queued plus running jobs, or of jobs in `status`.
+        """
+        statuses = [status] if status else ["queued", "running"]
+        with self._lock:
+            return self._connection().execute(
+                f"SELECT COUNT(*) FROM transcription_jobs WHERE status IN ({', '.join('?' * len(statuses))})",
+                statuses,
+            ).fetchone()[0]
+
+
+transcription_queue = TranscriptionQueue()
+
+CallbackMetric(
+    "transcription_queue_depth", "Transcription jobs waiting for a worker.",
+    lambda: transcription_queue.depth("queued") if TRANSCRIPTION_BACKEND == "queue" else 0,
+)
+
+
+def _fn_spool_samples(samples):
+    # Workers run on the same host, so the request's workspace is a fine hand-off point.
+    path = os.path.join(fn_scratch_dir(), f"transcribe-{uuid.uuid4().hex}.npy")
+    np.save(path, np.ascontiguousarray(samples, dtype=np.float32))
+    return path
+
+
+def _fn_remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def fn_queue_transcribe(samples, model_size, sample_rate):
+    """
+    Transcribes samples on a transcription worker and waits for the result.
+
+    Returns:
+        Tuple[str, str]: The transcript text and the detected language.
+    """
+    seconds = len(samples) / sample_rate
+    path = _fn_spool_samples(samples)
+    try:
+        job_id = transcription_queue.enqueue("text", path, seconds, model_size)
+        for _, result in transcription_queue.as_completed([job_id]):
+            return result["text"], result["language"]
+    finally:
+        _fn_remove(path)
+
+
+def fn_queue_map_segments(chunks, model_size, sample_rate):
+    """
+    Queues every chunk of one recording for fn_transcribe_segments and yields
+    (index, result) as each finishes. The chunks are ordered by the length of
+    the whole recording, not of the chunk.
+    """
+    total_seconds = sum(len(samples) for samples in chunks) / sample_rate
+    paths = []
+    try:
+        job_ids = []
+        for samples in chunks:
+            paths.append(_fn_spool_samples(samples))
+            job_ids.append(transcription_queue.enqueue(
+                "segments", paths[-1], len(samples) / sample_rate, model_size, priority_seconds=total_seconds,
+            ))
+        indices = {job_id: index for index, job_id in enumerate(job_ids)}
+        for job_id, result in transcription_queue.as_completed(job_ids):
+            yield indices[job_id], result
+    finally:
+        for path in paths:
+            _fn_remove(path)
@@ -0,0 +1,118 @@
+#translation.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cache import SQLiteCache
+from utils.lazy import fn_lazy_import
+from utils.processing import fn_hash_text
+from utils.tokens import fn_split_sentences
+
+deep_translator = fn_lazy_import("deep_translator")
+
+# Google Translate rejects requests over 5000 characters.
+TRANSLATION_BATCH_CHARS = int(os.getenv("TRANSLATION_BATCH_CHARS", "4500"))
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+TRANSLATION_CACHE_TTL_SECONDS = int(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+TRANSLATION_CACHE_MAX_BYTES = int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class GoogleTranslatorBackend:
+    """
+    Translates text with deep_translator's GoogleTranslator.
+
+    Any object with the same `translate(text, source, target)` method can be
+    installed with fn_set_translator_backend, e.g. an offline stub in tests.
+    """
+
+    def translate(self, text, source, target):
+        return deep_translator.GoogleTranslator(source=source, target=target).translate(text)
+
+
+translation_cache = SQLiteCache(
+    "translations",
+    ttl_seconds=TRANSLATION_CACHE_TTL_SECONDS,
+    max_bytes=TRANSLATION_CACHE_MAX_BYTES,
+)
+_backend = GoogleTranslatorBackend()
+
+
+def fn_set_translator_backend(backend):
+    """
+    Replaces the translator used by fn_translate_text and returns the previous one.
+    """
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+
+def fn_batch_sentences(text, max_chars=TRANSLATION_BATCH_CHARS):
+    """
+    Groups sentences into batches of at most `max_chars` characters.
+    Sentences longer than `max_chars` are cut between words.
+
+    Returns:
+        List[str]: The batches, in order.
+    """
+    pieces = []
+    for sentence in fn_split_sentences(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+
+    batches, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            batches.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        batches.append(current)
+    return batches
+
+
+def fn_translate_batch(batch, source_lang, target_lang, backend=None):
+    """
+    Translates one batch, using the per-segment cache keyed by (hash, source, target).
+    """
+    key = f"{fn_hash_text(batch)}:{source_lang}:{target_lang}"
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    translated = (backend or _backend).translate(batch, source_lang, target_lang)
+    if translated:
+        translation_cache.set(key, translated)
+    return translated or batch
+
+
+def fn_translate_text(text, source_lang, target_lang, backend=None):
+    """
+    Translates text of any length: splits it at sentence boundaries into
+    size-bounded batches, translates them concurrently and reassembles them in order.
+
+    Args:
+        text (str): The text to translate.
+        source_lang (str): The source language code (e.g., 'en').
+        target_lang (str): The target language code (e.g., 'es').
+        backend: Optional translator overriding the installed one.
+
+    Returns:
+        str: The translated text.
+    """
+    batches = fn_batch_sentences(text)
+    if not batches:
+        return text
+    if len(batches) == 1:
+        return fn_translate_batch(batches[0], source_lang, target_lang, backend)
+
+    with ThreadPoolExecutor(max_workers=min(TRANSLATION_CONCURRENCY, len(batches))) as pool:
+        translated = list(pool.map(
+            lambda batch: fn_translate_batch(batch, source_lang, target_lang, backend), batches
+        ))
+    return " ".join(translated)
@@ -0,0 +1,222 @@
+#upload_stream.py
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from utils.processing import UPLOAD_MAX_BYTES, UploadTooLargeError
+
+# The other form fields (language, difficulty) are tiny; cap them so a huge field cannot fill memory.
+UPLOAD_MAX_FIELD_BYTES = 64 * 1024
+# Request chunks (tens of KB each) buffered between the event loop and the thread consuming the file.
+_PIPE_MAX_CHUNKS = 32
+# Uploads written out at once. The consumers run on their own threads so an upload never takes one of
+# the shared threadpool threads the other endpoints need; further uploads wait with their body unread.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "8"))
+_upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+
+class UploadFormError(ValueError):
+    """
+    Raised when an upload request is not a multipart form with a file part.
+    """
+
+
+class _UploadPipe:
+    """
+    Read-only file object over the file part of a request that is still arriving.
+    The event loop feeds it, the consumer thread reads it; reads block until data arrives.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._chunks = asyncio.Queue(maxsize=_PIPE_MAX_CHUNKS)
+        self._buffer = b""
+        self._eof = False
+        # Set once the consumer stops reading, so feeding never waits on a full queue nobody drains.
+        self.abandoned = False
+
+    async def feed(self, item):
+        """
+        Queues a chunk (bytes), the end of the file (None) or an exception. Waits on the
+        event loop while the queue is full, which stops reading the request body.
+        """
+        if not self.abandoned:
+            await self._chunks.put(item)
+
+    def abandon(self):
+        """
+        Called on the event loop once the consumer stopped reading: drops the queued
+        chunks so a waiting `feed` returns, and ignores later ones.
+        """
+        self.abandoned = True
+        while not self._chunks.empty():
+            self._chunks.get_nowait()
+
+    def fail(self, error):
+        """
+        Replaces whatever is queued with `error`, which the next read raises. Does not
+        wait, so it also works while the request is being cancelled.
+        """
+        if not self.abandoned:
+            self.abandon()
+            self._chunks.put_nowait(error)
+
+    def read(self, size=-1):
+        if size < 0:
+            return b"".join(iter(lambda: self.read(1 << 20), b""))
+        if not self._buffer and not self._eof:
+            item = asyncio.run_coroutine_threadsafe(self._chunks.get(), self._loop).result()
+            if isinstance(item, BaseException):
+                raise item
+            if item is None:
+                self._eof = True
+            else:
+                self._buffer = item
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+async def fn_receive_upload(request, consume, form_model, release=None, max_bytes=UPLOAD_MAX_BYTES, file_field="file"):
+    """
+    Parses a multipart/form-data request body as it arrives and streams its file part
+    into `consume`, which runs on the upload pool while the rest of the body is still
+    being received. Nothing is buffered in memory or spooled to disk on the way, and an
+    upload larger than `max_bytes` is refused from its Content-Length before it is read,
+    or as soon as the streamed bytes pass the limit.
+
+    Args:
+        request (Request): The incoming request.
+        consume (Callable): Called with a file object of the file part; returns what it stored.
+        form_model (Type[BaseModel]): Model validating the other form fields.
+        release (Callable, optional): Called with the result of `consume` when the request fails after it returned.
+        max_bytes (int): Largest accepted file part.
+        file_field (str): Name of the file field.
+
+    Returns:
+        Tuple[BaseModel, Any]: The validated form fields and the result of `consume`.
+
+    Raises:
+        UploadTooLargeError: If the upload exceeds `max_bytes`.
+        UploadFormError: If the body is not a multipart form with a `file_field` part.
+        RequestValidationError: If the other fields do not validate against `form_model`.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + UPLOAD_MAX_FIELD_BYTES:
+        raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise UploadFormError("Expected a multipart/form-data body")
+
+    fields = {}
+    part = {"headers": {}, "header": b"", "name": None, "is_file": False, "value": bytearray()}
+    state = {"file_started": False, "file_ended": False, "field_bytes": 0}
+    pending = []
+
+    def on_part_begin():
+        part.update(headers={}, header=b"", name=None, is_file=False, value=bytearray())
+
+    def on_header_field(data, start, end):
+        part["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        name = part["header"].lower()
+        part["headers"][name] = part["headers"].get(name, b"") + data[start:end]
+
+    def on_header_end():
+        part["header"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = disposition.get(b"name", b"").decode("latin-1")
+        part["is_file"] = part["name"] == file_field and not state["file_started"]
+        state["file_started"] |= part["is_file"]
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            pending.append(data[start:end])
+            return
+        state["field_bytes"] += end - start
+        if state["field_bytes"] > UPLOAD_MAX_FIELD_BYTES:
+            raise UploadFormError(f"Form fields exceed {UPLOAD_MAX_FIELD_BYTES} bytes")
+        part["value"] += data[start:end]
+
+    def on_part_end():
+        if part["is_file"]:
+            state["file_ended"] = True
+        elif part["name"]:
+            fields[part["name"]] = part["value"].decode("utf-8", errors="replace")
+
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    loop = asyncio.get_running_loop()
+    pipe = _UploadPipe(loop)
+
+    def run_consume():
+        try:
+            return consume(pipe)
+        finally:
+            loop.call_soon_threadsafe(pipe.abandon)
+
+    task = None
+    received = 0
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except FormParserError as e:
+                raise UploadFormError(f"Invalid multipart body: {e}") from e
+            if state["file_started"] and task is None:
+                task = asyncio.wrap_future(_upload_pool.submit(run_consume))
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                received += len(data)
+                if received > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+                await pipe.feed(data)
+            if state["file_ended"] and not pipe.abandoned:
+                await pipe.feed(None)
+                pipe.abandoned = True  # nothing more to feed
+            if task is not None and task.done():
+                # The consumer failed (e.g. workspace quota); awaiting it raises its error.
+                if task.cancelled() or task.exception() is not None:
+                    break
+        if task is None:
+            raise UploadFormError(f"Missing file field '{file_field}'")
+        if not state["file_ended"] and not task.done():
+            raise UploadFormError("Upload ended before the file part was complete")
+        result = await task
+    except BaseException as e:
+        if task is not None and not task.done():
+            # Wake the consumer with the error; it removes what it stored so far.
+            pipe.fail(e)
+        if task is not None and isinstance(e, Exception):
+            try:
+                result = await task
+            except Exception:
+                pass
+            else:
+                if release is not None:
+                    release(result)
+        raise
+
+    try:
+        return form_model(**fields), result
+    except ValidationError as e:
+        if release is not None:
+            release(result)
+        raise RequestValidationError(e.errors()) from e
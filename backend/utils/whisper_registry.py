@@ -0,0 +1,118 @@
+#whisper_registry.py
+
+import os
+import threading
+from collections import OrderedDict
+
+from utils.lazy import fn_lazy_import
+from utils.metrics import fn_time_stage
+
+# Imported on the first model load, so workers that never transcribe skip torch entirely.
+whisper = fn_lazy_import("whisper")
+
+# Approximate resident size (MB) of each Whisper checkpoint once loaded on CPU.
+# Used only for the memory budget, so rough numbers are good enough.
+WHISPER_MODEL_SIZES_MB = {
+    "tiny": 150,
+    "base": 300,
+    "small": 950,
+    "medium": 3000,
+    "large": 6000,
+}
+
+DEFAULT_WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_MEMORY_BUDGET_MB = int(os.getenv("WHISPER_MEMORY_BUDGET_MB", "1500"))
+# Comma separated list of model sizes to load at startup, e.g. "base,tiny".
+WHISPER_WARMUP_MODELS = os.getenv("WHISPER_WARMUP_MODELS", DEFAULT_WHISPER_MODEL)
+WHISPER_WARMUP_ON_STARTUP = os.getenv("WHISPER_WARMUP_ON_STARTUP", "1") == "1"
+
+
+class WhisperModelRegistry:
+    """
+    Process-wide cache of loaded Whisper models.
+
+    Each size is loaded at most once per process and shared by every caller.
+    When the total estimated size exceeds the memory budget, the least
+    recently used models are evicted.
+    """
+
+    def __init__(self, memory_budget_mb=WHISPER_MEMORY_BUDGET_MB):
+        self.memory_budget_mb = memory_budget_mb
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+
+    def get(self, size=None):
+        """
+        Returns the Whisper model for the given size, loading it on first use.
+
+        Args:
+            size (str, optional): Whisper model size. Defaults to WHISPER_MODEL.
+
+        Returns:
+            whisper.Whisper: The loaded model.
+        """
+        size = size or DEFAULT_WHISPER_MODEL
+
+        with self._lock:
+            if size in self._models:
+                self._models.move_to_end(size)
+                return self._models[size]
+            loading_lock = self._loading_locks.setdefault(size, threading.Lock())
+
+        # Only one thread loads a given size; the others wait and reuse it.
+        with loading_lock:
+            with self._lock:
+                if size in self._models:
+                    self._models.move_to_end(size)
+                    return self._models[size]
+
+            with fn_time_stage("whisper_model_load"):
+                model = whisper.load_model(size)
+
+            with self._lock:
+                self._models[size] = model
+                self._models.move_to_end(size)
+                self._evict(keep=size)
+            return model
+
+    def _evict(self, keep):
+        """
+        Drops least recently used models until the budget is respected.
+        The model that was just requested is never evicted.
+        """
+        while self.loaded_size_mb() > self.memory_budget_mb and len(self._models) > 1:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+            print(f"Evicted Whisper model '{oldest}' to stay within {self.memory_budget_mb} MB")
+
+    def loaded_size_mb(self):
+        return sum(WHISPER_MODEL_SIZES_MB.get(size, 0) for size in self._models)
+
+    def loaded_models(self):
+        with self._lock:
+            return list(self._models)
+
+    def warm_up(self, sizes=None):
+        """
+        Loads the given model sizes ahead of the first request.
+
+        Args:
+            sizes (List[str], optional): Sizes to load. Defaults to WHISPER_WARMUP_MODELS.
+        """
+        if sizes is None:
+            sizes = [s.strip() for s in WHISPER_WARMUP_MODELS.split(",") if s.strip()]
+        for size in sizes:
+            self.get(size)
+
+
+whisper_registry = WhisperModelRegistry()
+
+
+def fn_get_whisper_model(size=None):
+    """
+    Returns the shared Whisper model for the given size.
+    """
+    return whisper_registry.get(size)
@@ -0,0 +1,117 @@
+#workers.py
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from utils.whisper_registry import WHISPER_WARMUP_ON_STARTUP
+
+# Number of processes dedicated to Whisper, one per default job worker so transcription never holds
+# the API process's GIL. 0 runs transcription in the calling thread.
+WHISPER_PROCESS_WORKERS = int(os.getenv("WHISPER_PROCESS_WORKERS", "2"))
+# Without a process pool, chunks of one long recording are transcribed on this many threads
+# sharing the loaded model; torch releases the GIL while it computes.
+TRANSCRIBE_THREAD_WORKERS = int(os.getenv("TRANSCRIBE_THREAD_WORKERS", "2"))
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _fn_init_worker(warm_up):
+    """
+    Runs once in every new pool process. Loads the WHISPER_WARMUP_MODELS when `warm_up`
+    is set, so no request pays for the torch import and model load.
+    """
+    if not warm_up:
+        return
+    from utils.whisper_registry import whisper_registry
+    try:
+        whisper_registry.warm_up()
+    except Exception as e:
+        # The worker stays usable; the model is loaded again on its first job.
+        print(f"Whisper warm-up failed in worker {os.getpid()}: {e}")
+
+
+def fn_get_process_pool():
+    """
+    Returns the shared process pool used for CPU-bound transcription,
+    or None when WHISPER_PROCESS_WORKERS is 0.
+
+    Each worker process keeps its own warm Whisper model registry.
+    """
+    global _process_pool
+    if WHISPER_PROCESS_WORKERS <= 0:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            # "spawn" avoids forking a process that already holds torch threads and locks.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=WHISPER_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_fn_init_worker,
+                initargs=(WHISPER_WARMUP_ON_STARTUP,),
+            )
+        return _process_pool
+
+
+def fn_start_process_pool():
+    """
+    Creates the process pool and starts all of its workers, which warm up in the background.
+
+    Returns:
+        bool: False when WHISPER_PROCESS_WORKERS is 0 and there is no pool.
+    """
+    pool = fn_get_process_pool()
+    if pool is None:
+        return False
+    # Workers are spawned on demand; one no-op task per worker starts them all now.
+    for _ in range(WHISPER_PROCESS_WORKERS):
+        pool.submit(os.getpid)
+    return True
+
+
+def fn_run_in_process_pool(fn, *args):
+    """
+    Runs `fn(*args)` on the process pool if one is configured, otherwise inline.
+    """
+    pool = fn_get_process_pool()
+    if pool is None:
+        return fn(*args)
+    return pool.submit(fn, *args).result()
+
+
+def fn_map_in_process_pool(fn, items):
+    """
+    Runs `fn(*args)` for every args tuple in `items` and yields (index, result)
+    as each one completes. Without a process pool they run on TRANSCRIBE_THREAD_WORKERS
+    threads, or inline and in order when that is 1 or less.
+    """
+    pool = fn_get_process_pool()
+    threads = None
+    if pool is None:
+        if TRANSCRIBE_THREAD_WORKERS <= 1 or len(items) <= 1:
+            for index, args in enumerate(items):
+                yield index, fn(*args)
+            return
+        pool = threads = ThreadPoolExecutor(
+            max_workers=min(TRANSCRIBE_THREAD_WORKERS, len(items)), thread_name_prefix="transcribe-chunk"
+        )
+
+    futures = {pool.submit(fn, *args): index for index, args in enumerate(items)}
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        if threads is not None:
+            threads.shutdown(wait=False)
+
+
+def fn_shutdown_pools():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
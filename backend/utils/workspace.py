@@ -0,0 +1,222 @@
+#workspace.py
+
+import contextvars
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from utils.metrics import CallbackMetric
+
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "youtube_quiz_workspaces"))
+# Disk space one request may use for downloads, videos and extracted audio.
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_BYTES", str(4 * 1024 * 1024 * 1024)))
+# Disk space all workspaces of this process may use together; new requests are refused beyond it.
+WORKSPACE_TOTAL_QUOTA_BYTES = int(os.getenv("WORKSPACE_TOTAL_QUOTA_BYTES", str(16 * 1024 * 1024 * 1024)))
+# Workspaces of other live processes are only swept once they are this old.
+WORKSPACE_ORPHAN_MAX_AGE_SECONDS = int(os.getenv("WORKSPACE_ORPHAN_MAX_AGE_SECONDS", str(6 * 3600)))
+
+# Workspace of the request running in the current thread, see WorkspaceManager.workspace.
+current_workspace = contextvars.ContextVar("current_workspace", default=None)
+
+
+class WorkspaceQuotaError(RuntimeError):
+    """
+    Raised when a workspace outgrows its quota or no disk space is left for a new one.
+    """
+
+
+def _fn_dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _fn_pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Workspace:
+    """
+    Scratch directory owned by a single request or job.
+    """
+
+    def __init__(self, path, quota_bytes):
+        self.path = path
+        self.quota_bytes = quota_bytes
+
+    def new_path(self, suffix=""):
+        """
+        Returns a unique, not yet existing path inside the workspace.
+        """
+        return os.path.join(self.path, uuid.uuid4().hex + suffix)
+
+    def used_bytes(self):
+        return _fn_dir_size(self.path)
+
+    def remaining_bytes(self):
+        return max(0, self.quota_bytes - self.used_bytes())
+
+    def check_quota(self):
+        """
+        Raises:
+            WorkspaceQuotaError: If the files in the workspace exceed its quota.
+        """
+        used = self.used_bytes()
+        if used > self.quota_bytes:
+            raise WorkspaceQuotaError(f"Request uses {used} bytes of disk, above the {self.quota_bytes} byte quota")
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class WorkspaceManager:
+    """
+    Creates one scratch directory per request under `root` and removes it when
+    the request ends, whether it succeeds, fails or is cancelled.
+
+    Directories are named "<pid>-<id>" so a restarted process can tell its own
+    leftovers (and those of dead processes) from workspaces still in use.
+    """
+
+    def __init__(self, root=WORKSPACE_ROOT, quota_bytes=WORKSPACE_QUOTA_BYTES,
+                 total_quota_bytes=WORKSPACE_TOTAL_QUOTA_BYTES, orphan_max_age=WORKSPACE_ORPHAN_MAX_AGE_SECONDS):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.total_quota_bytes = total_quota_bytes
+        self.orphan_max_age = orphan_max_age
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def create(self):
+        """
+        Creates a new workspace.
+
+        Raises:
+            WorkspaceQuotaError: If the active workspaces already use the total quota.
+        """
+        used = self.usage_bytes()
+        if used >= self.total_quota_bytes:
+            raise WorkspaceQuotaError(f"Workspaces use {used} bytes of disk, retry once running requests finish")
+
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f"{os.getpid()}-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        workspace = Workspace(path, self.quota_bytes)
+        with self._lock:
+            self._active[path] = workspace
+        return workspace
+
+    def release(self, workspace):
+        """
+        Deletes the workspace and everything in it.
+        """
+        with self._lock:
+            self._active.pop(workspace.path, None)
+        workspace.cleanup()
+
+    @contextmanager
+    def workspace(self, workspace=None):
+        """
+        Context manager making `workspace` (a new one by default) the current
+        workspace of this thread and releasing it on exit.
+        """
+        workspace = workspace or self.create()
+        token = current_workspace.set(workspace)
+        try:
+            yield workspace
+        finally:
+            current_workspace.reset(token)
+            self.release(workspace)
+
+    def usage_bytes(self):
+        with self._lock:
+            workspaces = list(self._active.values())
+        return sum(workspace.used_bytes() for workspace in workspaces)
+
+    def active_count(self):
+        with self._lock:
+            return len(self._active)
+
+    def sweep_orphans(self):
+        """
+        Removes workspaces left behind by crashed or restarted processes.
+
+        A directory is an orphan when its process is gone, when it carries this
+        process's PID but is not active (PIDs repeat across container restarts),
+        or when it is older than `orphan_max_age`.
+
+        Returns:
+            int: The number of directories removed.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+
+        removed = 0
+        now = time.time()
+        with self._lock:
+            active = set(self._active)
+        for entry in os.scandir(self.root):
+            if entry.path in active:
+                continue
+            pid_text = entry.name.split("-", 1)[0]
+            pid = int(pid_text) if pid_text.isdigit() else None
+            try:
+                age = now - entry.stat().st_mtime
+            except OSError:
+                continue
+            if pid is None or pid == os.getpid() or not _fn_pid_alive(pid) or age > self.orphan_max_age:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.unlink(entry.path)
+                removed += 1
+        if removed:
+            print(f"Removed {removed} orphaned workspaces from {self.root}")
+        return removed
+
+    def release_all(self):
+        """
+        Deletes every active workspace, used at shutdown.
+        """
+        with self._lock:
+            workspaces = list(self._active.values())
+        for workspace in workspaces:
+            self.release(workspace)
+
+
+workspace_manager = WorkspaceManager()
+
+CallbackMetric("workspace_disk_bytes", "Disk used by active request workspaces.", workspace_manager.usage_bytes)
+CallbackMetric("workspace_active", "Request workspaces currently in use.", workspace_manager.active_count)
+
+
+def fn_scratch_dir():
+    """
+    Returns the current workspace's directory, or the system temp dir outside of a workspace.
+    """
+    workspace = current_workspace.get()
+    return workspace.path if workspace else tempfile.gettempdir()
+
+
+def fn_check_workspace_quota():
+    """
+    Raises WorkspaceQuotaError if the current workspace is over its quota.
+    """
+    workspace = current_workspace.get()
+    if workspace:
+        workspace.check_quota()
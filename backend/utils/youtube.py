@@ -0,0 +1,42 @@
+#youtube.py
+
+from urllib.parse import urlparse, parse_qs
+
+
+def fn_extract_video_id(youtube_url):
+    """
+    Extracts the canonical video ID from a YouTube URL.
+
+    Supports watch?v=, youtu.be/, /shorts/, /embed/ and /live/ links.
+
+    Args:
+        youtube_url (str): The YouTube URL.
+
+    Returns:
+        str: The video ID, or None if the URL is not a recognised YouTube link.
+    """
+    if not youtube_url:
+        return None
+
+    url = youtube_url.strip()
+    if "://" not in url:
+        url = "https://" + url
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+
+    if host.endswith("youtu.be"):
+        video_id = parsed.path.lstrip("/").split("/")[0]
+    elif host.endswith("youtube.com") or host.endswith("youtube-nocookie.com"):
+        query_id = parse_qs(parsed.query).get("v")
+        if query_id:
+            video_id = query_id[0]
+        else:
+            parts = [p for p in parsed.path.split("/") if p]
+            if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                video_id = parts[1]
+            else:
+                video_id = None
+    else:
+        video_id = None
+
+    return video_id or None